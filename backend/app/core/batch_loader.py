@@ -0,0 +1,77 @@
+"""Coalesce concurrent lookups by key into one batched query"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    """
+    Collects keys requested in the same event-loop tick and fetches them at once.
+
+    Concurrent loads of the same key share one result, and distinct keys go
+    out together in a single fetch. Nothing is kept once a batch resolves,
+    so results are never staler than a direct query.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], Awaitable[Dict[str, Any]]]):
+        """
+        Initialize the loader.
+
+        Args:
+            fetch: Coroutine taking a list of keys and returning a dict of
+                the values found, keyed the same way
+        """
+        self._fetch = fetch
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        # The loop keeps only weak references to tasks, so hold in-flight
+        # fetches until they finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: str) -> Optional[Any]:
+        """
+        Load one key, batched with any other loads in this tick.
+
+        Args:
+            key: Key to load
+
+        Returns:
+            The fetched value, or None if the fetch did not return the key
+        """
+        loop = asyncio.get_running_loop()
+        if not self._pending:
+            # Runs after every task already scheduled for this tick
+            loop.call_soon(self._dispatch)
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        return await future
+
+    def _dispatch(self) -> None:
+        """Hand the keys collected so far to a fetch"""
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._resolve(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        """Fetch a batch and settle every waiting load, whatever goes wrong"""
+        try:
+            results = await self._fetch(list(batch))
+            for key, futures in batch.items():
+                value = results.get(key)
+                for future in futures:
+                    if not future.done():
+                        future.set_result(value)
+        except BaseException as e:
+            logger.error(f"Batch fetch of {len(batch)} keys failed: {e!r}")
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        if isinstance(e, asyncio.CancelledError):
+                            future.cancel()
+                        else:
+                            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
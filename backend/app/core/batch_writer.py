@@ -0,0 +1,133 @@
+"""Buffered background inserts for high-volume, append-only collections"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+# Queue marker that tells the flush task to finish
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    Buffers documents in memory and inserts them with one insert_many.
+
+    A batch is flushed once it reaches max_batch documents or max_delay
+    seconds after its first document arrived, whichever comes first.
+    Documents still buffered when the process dies are lost, so this is
+    only for append-only logs that can tolerate that window.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        max_batch: int = 200,
+        max_delay: float = 0.05,
+        max_queue: int = 10_000
+    ):
+        """
+        Initialize the writer.
+
+        Args:
+            collection_name: Collection the documents are inserted into
+            max_batch: Maximum documents per insert_many
+            max_delay: Maximum seconds a document waits before being flushed
+            max_queue: Maximum buffered documents before writers wait
+        """
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db: Optional[AsyncIOMotorDatabase] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        """Whether the background flush task is active"""
+        return self._task is not None and not self._task.done()
+
+    def start(self, db: AsyncIOMotorDatabase) -> None:
+        """
+        Start the background flush task.
+
+        Args:
+            db: Motor database instance
+        """
+        if self.running:
+            return
+        self._db = db
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Batch writer started for {self.collection_name}")
+
+    async def stop(self) -> None:
+        """Flush anything still buffered and stop the background task"""
+        if not self.running:
+            return
+        # New writes go straight to the database from here on
+        self._closing = True
+        # Queued behind every buffered document, so those are flushed first
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"Batch writer stopped for {self.collection_name}")
+
+    async def write(self, db: AsyncIOMotorDatabase, document: Dict[str, Any]) -> None:
+        """
+        Queue a document for insertion, or insert it directly if not running.
+
+        Args:
+            db: Motor database instance used when the writer is not running
+            document: Document to insert
+        """
+        if self.running and not self._closing:
+            await self._queue.put(document)
+        else:
+            await db[self.collection_name].insert_one(document)
+
+    async def _run(self) -> None:
+        """Collect documents into batches and flush them until stopped"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            document = await self._queue.get()
+            if document is _STOP:
+                break
+            batch = [document]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    document = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if document is _STOP:
+                    stopping = True
+                    break
+                batch.append(document)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """Insert a batch, logging rather than raising on failure"""
+        if not batch:
+            return
+        try:
+            await self._db[self.collection_name].insert_many(batch, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} documents to {self.collection_name}: {e}")
+
+
+# Scan logs are written on every ID verification
+scan_log_writer = BatchWriter("id_scan_logs")
+
+# Push notification audit logs: one per direct send and one per fan-out
+# chunk of a broadcast, so the scan log's defaults suit them too
+notification_log_writer = BatchWriter("notification_logs")
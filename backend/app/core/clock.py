@@ -0,0 +1,87 @@
+"""Cheap UTC timestamps for hot write paths"""
+
+import time
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone
+from typing import Optional
+
+# Resolution shared by calls in the same burst; far finer than created_at needs
+_RESOLUTION = 0.001  # seconds
+
+_now_cache = [0.0, datetime(1970, 1, 1)]
+
+# Timestamp taken when the current request started, set by
+# RequestClockMiddleware
+_request_now: ContextVar[Optional[datetime]] = ContextVar("request_now", default=None)
+
+
+def utcnow_cached() -> datetime:
+    """
+    Current naive UTC datetime, reused for calls within the same millisecond.
+
+    Returns:
+        Same value as datetime.utcnow(), at millisecond resolution
+    """
+    now = time.time()
+    if now - _now_cache[0] > _RESOLUTION:
+        _now_cache[0] = now
+        # Naive like every datetime stored and compared in this app
+        _now_cache[1] = datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None)
+    return _now_cache[1]
+
+
+def start_request_clock() -> Token:
+    """
+    Fix the current time for the rest of this request.
+
+    Returns:
+        Token to pass to reset_request_clock when the request finishes
+    """
+    return _request_now.set(utcnow_cached())
+
+
+def reset_request_clock(token: Token) -> None:
+    """
+    Clear the time fixed by start_request_clock.
+
+    Args:
+        token: Token returned by start_request_clock
+    """
+    _request_now.reset(token)
+
+
+def request_now() -> datetime:
+    """
+    Naive UTC time the current request started.
+
+    Every write in one request gets the same timestamp. Outside a request
+    (background tasks, scripts) this falls back to utcnow_cached.
+
+    Returns:
+        Naive UTC datetime
+    """
+    now = _request_now.get()
+    return now if now is not None else utcnow_cached()
+
+
+class RequestClockMiddleware:
+    """
+    Plain ASGI middleware fixing request_now() for each HTTP request.
+
+    Written against raw ASGI rather than @app.middleware("http"), which
+    wraps every request in an extra task and response stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = start_request_clock()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_request_clock(token)
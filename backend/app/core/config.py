@@ -1,6 +1,7 @@
-from pydantic_settings import BaseSettings
-from pydantic import field_validator
-from typing import List
+from pydantic_settings import BaseSettings, PydanticBaseSettingsSource
+from pydantic import Field, field_validator
+from functools import lru_cache
+from typing import List, Tuple, Type
 import secrets
 
 
@@ -17,9 +18,21 @@ class Settings(BaseSettings):
     # Database
     MONGO_URL: str = "mongodb://localhost:27017"
     DB_NAME: str = "aisj_connect"
+    MONGO_MIN_POOL_SIZE: int = 20
+    MONGO_MAX_POOL_SIZE: int = 200
+    MONGO_MAX_IDLE_MS: int = 30000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 2000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_RETRY_WRITES: bool = True
+    MONGO_COMPRESSORS: str = "zstd,zlib"  # In preference order
+
+    # Data retention in days; TTL indexes expire older documents
+    NOTIFICATION_RETENTION_DAYS: int = 180
+    NOTIFICATION_RECEIPT_RETENTION_DAYS: int = 90
+    EMERGENCY_CHECK_IN_RETENTION_DAYS: int = 365
 
     # Security
-    SECRET_KEY: str = secrets.token_urlsafe(32)  # Generate secure default
+    SECRET_KEY: str = Field(default=None, validate_default=True)  # Generated if unset
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
@@ -32,6 +45,14 @@ class Settings(BaseSettings):
     RATE_LIMIT_REQUESTS: int = 100
     RATE_LIMIT_PERIOD: int = 60  # seconds
 
+    @field_validator('SECRET_KEY', mode='before')
+    @classmethod
+    def default_secret_key(cls, v: str) -> str:
+        """Generate a secure SECRET_KEY only when none is configured"""
+        if v is None:
+            return secrets.token_urlsafe(32)
+        return v
+
     @field_validator('SECRET_KEY')
     @classmethod
     def validate_secret_key(cls, v: str) -> str:
@@ -54,10 +75,34 @@ class Settings(BaseSettings):
             raise ValueError(f'ENVIRONMENT must be one of {allowed}')
         return v
 
+    @classmethod
+    def settings_customise_sources(
+        cls,
+        settings_cls: Type[BaseSettings],
+        init_settings: PydanticBaseSettingsSource,
+        env_settings: PydanticBaseSettingsSource,
+        dotenv_settings: PydanticBaseSettingsSource,
+        file_secret_settings: PydanticBaseSettingsSource,
+    ) -> Tuple[PydanticBaseSettingsSource, ...]:
+        """
+        Read only the sources the app configures.
+
+        No secrets_dir is set, so the file secret source is dropped. Remote
+        secret stores added here later should resolve fields on first access
+        rather than fetching everything at startup.
+        """
+        return init_settings, env_settings, dotenv_settings
+
     class Config:
         env_file = ".env"
         case_sensitive = True
         extra = "ignore"
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide Settings instance, built on first use"""
+    return Settings()
+
+
+settings = get_settings()
@@ -1,35 +1,76 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo import IndexModel, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 from app.core.config import settings
+import asyncio
 import logging
-from typing import Optional
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
+SECONDS_PER_DAY = 60 * 60 * 24
+
+# At most one open pass per student, backing the check in request_pass;
+# statuses match ACTIVE_OR_PENDING_STATUSES
+ONE_OPEN_PASS_INDEX = IndexModel(
+    [('student_id', ASCENDING)],
+    name='one_open_pass_per_student',
+    unique=True,
+    partialFilterExpression={'status': {'$in': ['active', 'pending', 'approved']}}
+)
+
+# Passes created before location_ids existed, and the update giving them
+# [origin, destination] so location filters match them too
+_MISSING_LOCATION_IDS = {'location_ids': {'$exists': False}}
+_SET_LOCATION_IDS = [
+    {'$set': {'location_ids': ['$origin_location_id', '$destination_location_id']}}
+]
+
 class Database:
     """Database connection manager for MongoDB"""
 
     client: Optional[AsyncIOMotorClient] = None
     db: Optional[AsyncIOMotorDatabase] = None
 
+    # Seconds to wait for schema initialization to finish on shutdown
+    INIT_SHUTDOWN_TIMEOUT = 30
+
+    def __init__(self):
+        self._init_task: Optional[asyncio.Task] = None
+        # Set once indexes and seed data are in place
+        self.ready = asyncio.Event()
+
     async def connect(self) -> None:
-        """Connect to MongoDB and initialize database"""
+        """Connect to MongoDB and start database initialization"""
         try:
-            self.client = AsyncIOMotorClient(settings.MONGO_URL)
+            # Keep a warm pool so early requests skip the TCP/TLS handshake.
+            # An emergency alert makes every client check in at once, so the
+            # pool is sized for that burst; a short wait-queue timeout fails
+            # fast instead of piling up requests behind an exhausted pool,
+            # and retryable writes absorb a failover mid-burst. Compression
+            # shrinks the many small check-in payloads on the wire.
+            self.client = AsyncIOMotorClient(
+                settings.MONGO_URL,
+                minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+                maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+                maxIdleTimeMS=settings.MONGO_MAX_IDLE_MS,
+                waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                retryWrites=settings.MONGO_RETRY_WRITES,
+                compressors=settings.MONGO_COMPRESSORS
+            )
             self.db = self.client[settings.DB_NAME]
             logger.info(f"Connected to MongoDB: {settings.DB_NAME}")
 
-            # Verify connection
-            await self.client.admin.command('ping')
-            logger.info("Database connection verified")
-
-            # Create indexes for all collections
-            await self._create_indexes()
-
-            # Insert initial seed data
-            await self._seed_initial_data()
+            # Motor connects lazily, so the first real query pays the
+            # connection-establishment cost; only verify eagerly in debug
+            if settings.DEBUG:
+                await self.client.admin.command('ping')
+                logger.info("Database connection verified")
 
-            logger.info("Database initialization complete")
+            # Index builds can take a long time on large collections, so run
+            # them off the startup path and let the API start serving now
+            self._init_task = asyncio.create_task(self._initialize_schema())
 
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
@@ -37,149 +78,323 @@ class Database:
 
     async def close(self) -> None:
         """Close MongoDB connection"""
+        if self._init_task and not self._init_task.done():
+            try:
+                await asyncio.wait_for(self._init_task, timeout=self.INIT_SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Database initialization did not finish before shutdown")
+
         if self.client:
             self.client.close()
             logger.info("Closed MongoDB connection")
 
+    def pool_stats(self) -> dict:
+        """Connection pool limits and the servers the client currently sees"""
+        if not self.client:
+            return {"connected": False}
+        pool_options = self.client.options.pool_options
+        topology = self.client.topology_description
+        return {
+            "connected": True,
+            "topology_type": topology.topology_type_name,
+            "servers": [
+                {"address": f"{host}:{port}", "type": server.server_type_name}
+                for (host, port), server in topology.server_descriptions().items()
+            ],
+            "min_pool_size": pool_options.min_pool_size,
+            "max_pool_size": pool_options.max_pool_size,
+            "wait_queue_timeout": pool_options.wait_queue_timeout,
+        }
+
+    async def _initialize_schema(self) -> None:
+        """Create indexes and seed initial data in the background"""
+        try:
+            # Create indexes for all collections
+            await self._create_indexes()
+
+            # Bring existing documents up to the current schema
+            await self._backfill_pass_location_ids()
+
+            # Insert initial seed data
+            await self._seed_initial_data()
+
+            self.ready.set()
+            logger.info("Database initialization complete")
+
+        except Exception as e:
+            logger.error(f"Database initialization failed: {e}")
+
     async def _create_indexes(self) -> None:
-        """Create indexes for all collections"""
+        """Create indexes for all collections concurrently"""
         logger.info("Creating indexes...")
 
-        # Users indexes
-        await self.db.users.create_indexes([
-            IndexModel([('email', ASCENDING)], unique=True),
-            IndexModel([('role', ASCENDING)]),
-            IndexModel([('status', ASCENDING)]),
-        ])
-
-        # Students indexes
-        await self.db.students.create_indexes([
-            IndexModel([('user_id', ASCENDING)]),
-            IndexModel([('student_id', ASCENDING)], unique=True),
-            IndexModel([('grade', ASCENDING)]),
-            IndexModel([('division', ASCENDING)]),
-        ])
-
-        # Staff indexes
-        await self.db.staff.create_indexes([
-            IndexModel([('user_id', ASCENDING)]),
-            IndexModel([('employee_id', ASCENDING)], unique=True),
-        ])
-
-        # Parent-Student Relations indexes
-        await self.db.parent_student_relations.create_indexes([
-            IndexModel([('parent_user_id', ASCENDING)]),
-            IndexModel([('student_id', ASCENDING)]),
-            IndexModel([('parent_user_id', ASCENDING), ('student_id', ASCENDING)], unique=True),
-        ])
-
-        # Digital IDs indexes
-        await self.db.digital_ids.create_indexes([
-            IndexModel([('user_id', ASCENDING)], unique=True),
-            IndexModel([('qr_code', ASCENDING)], unique=True),
-            IndexModel([('barcode', ASCENDING)], unique=True),
-            IndexModel([('is_active', ASCENDING)]),
-        ])
-
-        # ID Scan Logs indexes
-        await self.db.id_scan_logs.create_indexes([
-            IndexModel([('digital_id_id', ASCENDING)]),
-            IndexModel([('scanned_at', DESCENDING)]),
-        ])
-
-        # Locations indexes
-        await self.db.locations.create_indexes([
-            IndexModel([('type', ASCENDING)]),
-            IndexModel([('building', ASCENDING)]),
-            IndexModel([('is_active', ASCENDING)]),
-        ])
-
-        # Passes indexes
-        await self.db.passes.create_indexes([
-            IndexModel([('student_id', ASCENDING)]),
-            IndexModel([('status', ASCENDING)]),
-            IndexModel([('requested_at', DESCENDING)]),
-            IndexModel([('origin_location_id', ASCENDING)]),
-            IndexModel([('destination_location_id', ASCENDING)]),
-        ])
-
-        # Encounter Groups indexes
-        await self.db.encounter_groups.create_indexes([
-            IndexModel([('is_active', ASCENDING)]),
-        ])
-
-        # Emergency Alerts indexes
-        await self.db.emergency_alerts.create_indexes([
-            IndexModel([('type', ASCENDING)]),
-            IndexModel([('triggered_at', DESCENDING)]),
-            IndexModel([('resolved_at', ASCENDING)]),
-        ])
-
-        # Emergency Check-ins indexes
-        await self.db.emergency_check_ins.create_indexes([
-            IndexModel([('alert_id', ASCENDING)]),
-            IndexModel([('user_id', ASCENDING)]),
-            IndexModel([('status', ASCENDING)]),
-            IndexModel([('alert_id', ASCENDING), ('user_id', ASCENDING)], unique=True),
-        ])
-
-        # Notifications indexes
-        await self.db.notifications.create_indexes([
-            IndexModel([('status', ASCENDING)]),
-            IndexModel([('scheduled_at', ASCENDING)]),
-            IndexModel([('created_at', DESCENDING)]),
-        ])
-
-        # Notification Receipts indexes
-        await self.db.notification_receipts.create_indexes([
-            IndexModel([('notification_id', ASCENDING)]),
-            IndexModel([('user_id', ASCENDING)]),
-            IndexModel([('delivery_status', ASCENDING)]),
-            IndexModel([('notification_id', ASCENDING), ('user_id', ASCENDING)], unique=True),
-        ])
-
-        # Visitors indexes
-        await self.db.visitors.create_indexes([
-            IndexModel([('last_name', ASCENDING), ('first_name', ASCENDING)]),
-            IndexModel([('id_number', ASCENDING)]),
-            IndexModel([('is_on_watchlist', ASCENDING)]),
-        ])
-
-        # Visitor Logs indexes
-        await self.db.visitor_logs.create_indexes([
-            IndexModel([('visitor_id', ASCENDING)]),
-            IndexModel([('checked_in_at', DESCENDING)]),
-            IndexModel([('checked_out_at', ASCENDING)]),
-            IndexModel([('host_user_id', ASCENDING)]),
-        ])
-
-        # Visitor Pre-registrations indexes
-        await self.db.visitor_pre_registrations.create_indexes([
-            IndexModel([('expected_date', ASCENDING)]),
-            IndexModel([('access_code', ASCENDING)], unique=True, sparse=True),
-        ])
-
-        # Audit Logs indexes
-        await self.db.audit_logs.create_indexes([
-            IndexModel([('user_id', ASCENDING)]),
-            IndexModel([('action', ASCENDING)]),
-            IndexModel([('entity_type', ASCENDING), ('entity_id', ASCENDING)]),
-            IndexModel([('created_at', DESCENDING)]),
-        ])
-
-        # App Settings indexes
-        await self.db.app_settings.create_indexes([
-            IndexModel([('key', ASCENDING)], unique=True),
-        ])
-
-        logger.info("Indexes created successfully")
+        index_specs = {
+            # Users indexes
+            'users': [
+                IndexModel([('email', ASCENDING)], unique=True),
+                IndexModel([('role', ASCENDING)]),
+                IndexModel([('status', ASCENDING)]),
+            ],
+
+            # Students indexes
+            'students': [
+                IndexModel([('user_id', ASCENDING)]),
+                IndexModel([('student_id', ASCENDING)], unique=True),
+                IndexModel([('grade', ASCENDING)]),
+                IndexModel([('division', ASCENDING)]),
+            ],
+
+            # Staff indexes
+            'staff': [
+                IndexModel([('user_id', ASCENDING)]),
+                IndexModel([('employee_id', ASCENDING)], unique=True),
+            ],
+
+            # Parent-Student Relations indexes
+            'parent_student_relations': [
+                IndexModel([('parent_user_id', ASCENDING)]),
+                IndexModel([('student_id', ASCENDING)]),
+                IndexModel([('parent_user_id', ASCENDING), ('student_id', ASCENDING)], unique=True),
+            ],
+
+            # Digital IDs indexes
+            'digital_ids': [
+                IndexModel([('user_id', ASCENDING)], unique=True),
+                IndexModel([('qr_code', ASCENDING)], unique=True),
+                IndexModel([('barcode', ASCENDING)], unique=True),
+                IndexModel([('is_active', ASCENDING)]),
+                # Only pending photos are ever queried by status
+                IndexModel(
+                    [('photo_status', ASCENDING)],
+                    name='photo_status_pending',
+                    partialFilterExpression={'photo_status': 'pending'}
+                ),
+            ],
+
+            # ID Scan Logs indexes (newest-first history per ID and per scanner,
+            # sorted by the index rather than in memory)
+            'id_scan_logs': [
+                IndexModel([('digital_id_id', ASCENDING), ('scanned_at', DESCENDING)]),
+                IndexModel([('scanned_by', ASCENDING), ('scanned_at', DESCENDING)]),
+                IndexModel([('scanned_at', DESCENDING)]),
+            ],
+
+            # Locations indexes
+            'locations': [
+                IndexModel([('type', ASCENDING)]),
+                IndexModel([('building', ASCENDING)]),
+                IndexModel([('is_active', ASCENDING)]),
+            ],
+
+            # Passes indexes
+            'passes': [
+                # student_id-only lookups use the student_id compounds below
+                IndexModel([('status', ASCENDING)]),
+                IndexModel([('student_id', ASCENDING), ('status', ASCENDING)]),
+                IndexModel([('requested_at', DESCENDING)]),
+                IndexModel([('origin_location_id', ASCENDING)]),
+                # Also serves destination-only lookups via its prefix
+                IndexModel([('destination_location_id', ASCENDING), ('status', ASCENDING)]),
+                IndexModel([('location_ids', ASCENDING), ('status', ASCENDING)]),
+                # Equality-Sort-Range compounds for the repository queries:
+                # active passes by departure, overtime sweep, student history
+                IndexModel([('status', ASCENDING), ('departed_at', DESCENDING)]),
+                IndexModel([('status', ASCENDING), ('is_overtime', ASCENDING), ('departed_at', ASCENDING)]),
+                IndexModel([('student_id', ASCENDING), ('requested_at', DESCENDING)]),
+                ONE_OPEN_PASS_INDEX,
+            ],
+
+            # Encounter Groups indexes
+            'encounter_groups': [
+                IndexModel([('is_active', ASCENDING)]),
+            ],
+
+            # Emergency Alerts indexes
+            'emergency_alerts': [
+                IndexModel([('type', ASCENDING)]),
+                IndexModel([('triggered_at', DESCENDING)]),
+                IndexModel([('resolved_at', ASCENDING)]),
+            ],
+
+            # Emergency Check-ins indexes
+            'emergency_check_ins': [
+                IndexModel([('alert_id', ASCENDING)]),
+                IndexModel([('user_id', ASCENDING)]),
+                IndexModel([('status', ASCENDING)]),
+                IndexModel([('alert_id', ASCENDING), ('user_id', ASCENDING)], unique=True),
+                # Per-alert status counts and newest-first check-in listing
+                IndexModel([('alert_id', ASCENDING), ('status', ASCENDING), ('checked_in_at', DESCENDING)]),
+                # Expire old check-ins; the alerts themselves are kept
+                IndexModel(
+                    [('checked_in_at', ASCENDING)],
+                    expireAfterSeconds=settings.EMERGENCY_CHECK_IN_RETENTION_DAYS * SECONDS_PER_DAY
+                ),
+            ],
+
+            # Notifications indexes
+            'notifications': [
+                IndexModel([('status', ASCENDING)]),
+                IndexModel([('scheduled_at', ASCENDING)]),
+                IndexModel([('created_at', DESCENDING)]),
+                # Due pending notifications, and a creator's newest first
+                IndexModel([('status', ASCENDING), ('scheduled_at', ASCENDING)]),
+                IndexModel([('created_by', ASCENDING), ('created_at', DESCENDING)]),
+                # Expire sent notifications; unsent ones have no sent_at
+                IndexModel(
+                    [('sent_at', ASCENDING)],
+                    expireAfterSeconds=settings.NOTIFICATION_RETENTION_DAYS * SECONDS_PER_DAY
+                ),
+            ],
+
+            # Notification Receipts indexes
+            'notification_receipts': [
+                IndexModel([('notification_id', ASCENDING)]),
+                IndexModel([('user_id', ASCENDING)]),
+                IndexModel([('delivery_status', ASCENDING)]),
+                IndexModel([('notification_id', ASCENDING), ('user_id', ASCENDING)], unique=True),
+                IndexModel([('notification_id', ASCENDING), ('delivery_status', ASCENDING)]),
+                # A user's unread receipts, newest delivery first
+                IndexModel([('user_id', ASCENDING), ('read_at', ASCENDING), ('delivered_at', DESCENDING)]),
+                # Expire delivered receipts
+                IndexModel(
+                    [('delivered_at', ASCENDING)],
+                    expireAfterSeconds=settings.NOTIFICATION_RECEIPT_RETENTION_DAYS * SECONDS_PER_DAY
+                ),
+            ],
+
+            # Visitors indexes
+            'visitors': [
+                IndexModel([('last_name', ASCENDING), ('first_name', ASCENDING)]),
+                IndexModel([('id_number', ASCENDING)]),
+                IndexModel([('email', ASCENDING)]),
+                IndexModel([('is_on_watchlist', ASCENDING)]),
+            ],
+
+            # Visitor Logs indexes
+            'visitor_logs': [
+                IndexModel([('checked_in_at', DESCENDING)]),
+                IndexModel([('checked_out_at', ASCENDING)]),
+                # A visitor's or host's visits, newest first; the visitor
+                # prefix also serves the open-visit lookup at check-in
+                IndexModel([('visitor_id', ASCENDING), ('checked_in_at', DESCENDING)]),
+                IndexModel([('host_user_id', ASCENDING), ('checked_in_at', DESCENDING)]),
+                # At most one open visit per visitor, for check_in_if_absent
+                IndexModel(
+                    [('visitor_id', ASCENDING)],
+                    name='one_open_visit_per_visitor',
+                    unique=True,
+                    partialFilterExpression={'checked_out_at': {'$type': 'null'}}
+                ),
+            ],
+
+            # Visitor Pre-registrations indexes
+            'visitor_pre_registrations': [
+                IndexModel([('expected_date', ASCENDING)]),
+                IndexModel([('access_code', ASCENDING)], unique=True, sparse=True),
+                # Pending arrivals per host and per day, by expected date
+                IndexModel([('host_user_id', ASCENDING), ('status', ASCENDING), ('expected_date', ASCENDING)]),
+                IndexModel([('status', ASCENDING), ('expected_date', ASCENDING)]),
+            ],
+
+            # Audit Logs indexes
+            'audit_logs': [
+                IndexModel([('user_id', ASCENDING)]),
+                IndexModel([('action', ASCENDING)]),
+                IndexModel([('entity_type', ASCENDING), ('entity_id', ASCENDING)]),
+                IndexModel([('created_at', DESCENDING)]),
+            ],
+
+            # App Settings indexes
+            'app_settings': [
+                IndexModel([('key', ASCENDING)], unique=True),
+            ],
+
+            # Device Tokens indexes
+            'device_tokens': [
+                # Active tokens for a batch of users ($in on user_id)
+                IndexModel([('user_id', ASCENDING), ('is_active', ASCENDING)]),
+            ],
+        }
+
+        # Collections are independent, so dispatch every collection's
+        # work at once instead of paying one round-trip per collection
+        collection_names = list(index_specs)
+        results = await asyncio.gather(
+            *(self._create_missing_indexes(name, index_specs[name]) for name in collection_names),
+            return_exceptions=True
+        )
+        created = 0
+        for name, result in zip(collection_names, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to create indexes on {name}: {result}")
+            else:
+                created += result
+
+        logger.info(f"Indexes ready ({created} created)")
+
+    async def _create_missing_indexes(self, collection_name: str, models: List[IndexModel]) -> int:
+        """
+        Create only the indexes a collection does not already have.
+
+        Args:
+            collection_name: Collection to index
+            models: Desired indexes
+
+        Returns:
+            Number of indexes created
+        """
+        collection = self.db[collection_name]
+        existing = set((await collection.index_information()).keys())
+        missing = [model for model in models if model.document['name'] not in existing]
+        if not missing:
+            return 0
+
+        try:
+            await collection.create_indexes(missing)
+            return len(missing)
+        except OperationFailure as e:
+            # The server rejects the whole batch if any index fails; retry one
+            # at a time so a single bad index does not take the others with it
+            logger.warning(f"Batch index build on {collection_name} failed, retrying individually: {e}")
+
+        created = 0
+        for model in missing:
+            try:
+                await collection.create_indexes([model])
+                created += 1
+            except OperationFailure as e:
+                logger.error(f"Failed to create index {model.document['name']} on {collection_name}: {e}")
+        return created
+
+    async def _backfill_pass_location_ids(self) -> None:
+        """Add location_ids to passes created before the field existed"""
+        try:
+            result = await self.db.passes.update_many(_MISSING_LOCATION_IDS, _SET_LOCATION_IDS)
+            if result.modified_count:
+                logger.info(f"Backfilled location_ids on {result.modified_count} passes")
+        except Exception as e:
+            logger.error(f"Failed to backfill pass location_ids: {e}")
 
     async def _seed_initial_data(self) -> None:
         """Insert initial seed data"""
         logger.info("Seeding initial data...")
 
-        # Check if locations already exist
-        existing_locations = await self.db.locations.count_documents({})
+        # Locations and settings are seeded independently of each other
+        results = await asyncio.gather(
+            self._seed_locations(),
+            self._seed_settings(),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Failed to seed initial data: {result}")
+
+        logger.info("Initial data seeding complete")
+
+    async def _seed_locations(self) -> None:
+        """Insert default locations if none exist"""
+        # Collection metadata is enough to tell whether anything is there
+        existing_locations = await self.db.locations.estimated_document_count()
         if existing_locations == 0:
             # Insert common location types
             locations = [
@@ -232,44 +447,49 @@ class Database:
                     "is_active": True
                 },
             ]
-            await self.db.locations.insert_many(locations)
+            await self.db.locations.insert_many(locations, ordered=False)
             logger.info("Inserted default locations")
 
-        # Check if app settings already exist
-        existing_settings = await self.db.app_settings.count_documents({})
-        if existing_settings == 0:
-            # Insert default app settings
-            settings_data = [
-                {
-                    "key": "default_pass_time_limit",
-                    "value": 5,
-                    "description": "Default pass duration in minutes"
-                },
-                {
-                    "key": "max_daily_passes",
-                    "value": 5,
-                    "description": "Maximum passes per student per day"
-                },
-                {
-                    "key": "enable_encounter_prevention",
-                    "value": True,
-                    "description": "Enable encounter prevention feature"
-                },
-                {
-                    "key": "emergency_sms_enabled",
-                    "value": True,
-                    "description": "Send SMS for emergency alerts"
-                },
-                {
-                    "key": "visitor_badge_required",
-                    "value": True,
-                    "description": "Require visitor badges"
-                },
-            ]
-            await self.db.app_settings.insert_many(settings_data)
-            logger.info("Inserted default app settings")
-
-        logger.info("Initial data seeding complete")
+    async def _seed_settings(self) -> None:
+        """Insert any default app settings that are missing"""
+        settings_data = [
+            {
+                "key": "default_pass_time_limit",
+                "value": 5,
+                "description": "Default pass duration in minutes"
+            },
+            {
+                "key": "max_daily_passes",
+                "value": 5,
+                "description": "Maximum passes per student per day"
+            },
+            {
+                "key": "enable_encounter_prevention",
+                "value": True,
+                "description": "Enable encounter prevention feature"
+            },
+            {
+                "key": "emergency_sms_enabled",
+                "value": True,
+                "description": "Send SMS for emergency alerts"
+            },
+            {
+                "key": "visitor_badge_required",
+                "value": True,
+                "description": "Require visitor badges"
+            },
+        ]
+        # Upsert by key so reseeding is idempotent without a pre-check and
+        # never overwrites a value an administrator has changed
+        result = await self.db.app_settings.bulk_write(
+            [
+                UpdateOne({"key": doc["key"]}, {"$setOnInsert": doc}, upsert=True)
+                for doc in settings_data
+            ],
+            ordered=False
+        )
+        if result.upserted_count:
+            logger.info(f"Inserted {result.upserted_count} default app settings")
 
 # Global database instance
 db = Database()
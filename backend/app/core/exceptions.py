@@ -1,8 +1,12 @@
 """Custom exception classes for the application"""
 
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
 from fastapi import HTTPException, status
 
+# Shared read-only default so exceptions raised without details don't allocate
+_EMPTY_DETAILS: Mapping[str, Any] = MappingProxyType({})
+
 
 class AppException(Exception):
     """Base application exception"""
@@ -15,7 +19,7 @@ class AppException(Exception):
     ):
         self.message = message
         self.status_code = status_code
-        self.details = details or {}
+        self.details = details if details is not None else _EMPTY_DETAILS
         super().__init__(self.message)
 
 
@@ -0,0 +1,54 @@
+"""Queue-fed logging so request handlers never wait on log output"""
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: int, fmt: str) -> None:
+    """
+    Route all log records through a queue drained by a background thread.
+
+    The root logger's QueueHandler still merges the message arguments
+    (and any traceback text) on the calling thread before enqueueing the
+    record. Building the formatted line and writing it happen on the
+    listener thread, so the event loop never blocks on the stream lock
+    or on I/O.
+
+    Args:
+        level: Root logger level
+        fmt: Format string for the output handler
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    # Nothing reads these record attributes, so skip collecting them
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter(fmt))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [QueueHandler(log_queue)]
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out any queued records and stop the listener thread"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
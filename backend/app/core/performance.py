@@ -4,55 +4,81 @@ Database indexes, caching, and query optimization for AISJ Connect.
 """
 
 import logging
-from functools import lru_cache
-from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta
+import math
+import re
+import threading
+import time
+from collections import deque
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Deque, List, Mapping, NamedTuple, Tuple
+from datetime import datetime
+from bson import ObjectId
+from cachetools import TLRUCache
+from pymongo import IndexModel
+from app.core.batch_loader import BatchLoader
 
 logger = logging.getLogger(__name__)
 
 
-# In-memory cache for frequently accessed data
-_cache: Dict[str, Any] = {}
-_cache_timestamps: Dict[str, datetime] = {}
+class _CacheEntry(NamedTuple):
+    """Cached value together with the TTL it was stored with."""
+    value: Any
+    ttl: float
+
+
+def _entry_expiry(key: str, entry: _CacheEntry, now: float) -> float:
+    """Compute a cache entry's expiry time from its own TTL."""
+    return now + entry.ttl
+
+
+# In-memory cache for frequently accessed data. Expiry is measured on the
+# monotonic clock: no datetime allocation per access, immune to wall-clock jumps
+_cache: TLRUCache = TLRUCache(maxsize=10_000, ttu=_entry_expiry, timer=time.monotonic)
+_cache_lock = threading.Lock()
 
 
 class CacheManager:
-    """Simple in-memory cache manager with TTL support."""
+    """
+    Simple in-memory cache manager with TTL support.
+
+    The cache lives in process memory, so each Uvicorn worker keeps its own
+    copy; values cached here are not shared or invalidated across workers.
+    """
 
     DEFAULT_TTL = 300  # 5 minutes
 
     @staticmethod
     def get(key: str) -> Optional[Any]:
         """Get a value from cache if not expired."""
-        if key not in _cache:
-            return None
-
-        timestamp = _cache_timestamps.get(key)
-        if timestamp and datetime.utcnow() - timestamp > timedelta(seconds=CacheManager.DEFAULT_TTL):
-            # Expired
-            del _cache[key]
-            del _cache_timestamps[key]
-            return None
-
-        return _cache[key]
+        # Reads expire stale entries, so they mutate the cache too
+        with _cache_lock:
+            entry = _cache.get(key)
+        return entry.value if entry is not None else None
 
     @staticmethod
     def set(key: str, value: Any, ttl: int = None) -> None:
         """Set a value in cache with optional TTL."""
-        _cache[key] = value
-        _cache_timestamps[key] = datetime.utcnow()
+        entry = _CacheEntry(value, ttl if ttl is not None else CacheManager.DEFAULT_TTL)
+        with _cache_lock:
+            _cache[key] = entry
 
     @staticmethod
     def delete(key: str) -> None:
         """Delete a value from cache."""
-        _cache.pop(key, None)
-        _cache_timestamps.pop(key, None)
+        with _cache_lock:
+            _cache.pop(key, None)
 
     @staticmethod
     def clear() -> None:
         """Clear all cache."""
-        _cache.clear()
-        _cache_timestamps.clear()
+        with _cache_lock:
+            _cache.clear()
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Report current entry count against the LRU bound."""
+        with _cache_lock:
+            return {"size": len(_cache), "maxsize": _cache.maxsize}
 
 
 # Database index definitions for optimal query performance
@@ -76,7 +102,11 @@ DATABASE_INDEXES = {
         {"keys": [("created_at", -1)]},
         {"keys": [("student_id", 1), ("status", 1)]},
         {"keys": [("origin_location_id", 1)]},
-        {"keys": [("destination_location_id", 1)]},
+        {"keys": [("destination_location_id", 1), ("status", 1)]},
+        {"keys": [("location_ids", 1), ("status", 1)]},
+        {"keys": [("status", 1), ("departed_at", -1)]},
+        {"keys": [("status", 1), ("is_overtime", 1), ("departed_at", 1)]},
+        {"keys": [("student_id", 1), ("requested_at", -1)]},
     ],
     "locations": [
         {"keys": [("name", 1)]},
@@ -114,8 +144,8 @@ DATABASE_INDEXES = {
         {"keys": [("check_out_time", 1)]},
     ],
     "id_scan_logs": [
-        {"keys": [("digital_id_id", 1)]},
-        {"keys": [("scanned_by", 1)]},
+        {"keys": [("digital_id_id", 1), ("scanned_at", -1)]},
+        {"keys": [("scanned_by", 1), ("scanned_at", -1)]},
         {"keys": [("scanned_at", -1)]},
     ],
     "audit_logs": [
@@ -126,21 +156,34 @@ DATABASE_INDEXES = {
 }
 
 
+# IndexModels are built once at import; ensure_indexes only dispatches them
+_INDEX_MODELS: Mapping[str, Tuple[IndexModel, ...]] = MappingProxyType({
+    collection_name: tuple(
+        IndexModel(
+            index_def["keys"],
+            unique=index_def.get("unique", False),
+            background=True
+        )
+        for index_def in indexes
+    )
+    for collection_name, indexes in DATABASE_INDEXES.items()
+})
+
+
 async def ensure_indexes(db) -> None:
-    """Create all database indexes for optimal performance."""
+    """Create all database indexes for optimal performance.
+
+    Issues a single createIndexes command per collection rather than one
+    round-trip per index.
+    """
     logger.info("Creating database indexes...")
 
-    for collection_name, indexes in DATABASE_INDEXES.items():
-        collection = db[collection_name]
-        for index_def in indexes:
-            try:
-                await collection.create_index(
-                    index_def["keys"],
-                    unique=index_def.get("unique", False),
-                    background=True
-                )
-            except Exception as e:
-                logger.warning(f"Index creation warning for {collection_name}: {e}")
+    for collection_name, models in _INDEX_MODELS.items():
+        try:
+            await db[collection_name].create_indexes(list(models))
+            logger.info(f"Ensured {len(models)} indexes on {collection_name}")
+        except Exception as e:
+            logger.warning(f"Index creation warning for {collection_name}: {e}")
 
     logger.info("Database indexes created successfully")
 
@@ -165,10 +208,14 @@ def build_user_filter(
     if status:
         filter_dict["status"] = status
     if search:
+        # Escaped so user input matches literally, and anchored to a prefix.
+        # A case-insensitive regex gets no index bounds, so role and status
+        # are what narrow the scan
+        pattern = f"^{re.escape(search)}"
         filter_dict["$or"] = [
-            {"first_name": {"$regex": search, "$options": "i"}},
-            {"last_name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
+            {"first_name": {"$regex": pattern, "$options": "i"}},
+            {"last_name": {"$regex": pattern, "$options": "i"}},
+            {"email": {"$regex": pattern, "$options": "i"}},
         ]
 
     return filter_dict
@@ -192,10 +239,9 @@ def build_pass_filter(
         else:
             filter_dict["status"] = status
     if location_id:
-        filter_dict["$or"] = [
-            {"origin_location_id": location_id},
-            {"destination_location_id": location_id}
-        ]
+        # location_ids holds [origin, destination], so one indexed equality
+        # replaces an $or across the two location fields
+        filter_dict["location_ids"] = location_id
     if date_from or date_to:
         filter_dict["created_at"] = {}
         if date_from:
@@ -206,55 +252,292 @@ def build_pass_filter(
     return filter_dict
 
 
+class QuerySpec(NamedTuple):
+    """Filter plus the projection and index hint to run it with."""
+    filter: dict
+    projection: Optional[dict]
+    hint: Optional[List[tuple]]
+
+
+# Fields a pass listing needs; everything else stays on the server
+PASS_LIST_PROJECTION = {
+    "student_id": 1,
+    "status": 1,
+    "created_at": 1,
+    "origin_location_id": 1,
+    "destination_location_id": 1,
+}
+
+# Secrets and large fields never returned by user listings
+USER_SAFE_PROJECTION = {"password_hash": 0, "refresh_tokens": 0}
+
+STUDENT_STATUS_HINT = [("student_id", 1), ("status", 1)]
+
+
+def build_user_query(
+    role: Optional[str] = None,
+    status: Optional[str] = None,
+    search: Optional[str] = None
+) -> QuerySpec:
+    """Build a user query that strips password hashes and refresh tokens."""
+    return QuerySpec(
+        build_user_filter(role=role, status=status, search=search),
+        USER_SAFE_PROJECTION,
+        None,
+    )
+
+
+def build_pass_query(
+    student_id: Optional[str] = None,
+    status: Optional[str] = None,
+    location_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    for_list: bool = False
+) -> QuerySpec:
+    """
+    Build a pass query with an optional listing projection and index hint.
+
+    Args:
+        student_id: Filter by student
+        status: Status or list of statuses
+        location_id: Filter by origin or destination location
+        date_from: Earliest creation time
+        date_to: Latest creation time
+        for_list: Project only the fields a listing view needs
+
+    Returns:
+        QuerySpec of (filter, projection, hint)
+    """
+    filter_dict = build_pass_filter(
+        student_id=student_id,
+        status=status,
+        location_id=location_id,
+        date_from=date_from,
+        date_to=date_to,
+    )
+    projection = PASS_LIST_PROJECTION if for_list else None
+    # Pin the compound index so the planner doesn't pick a single-field one
+    hint = STUDENT_STATUS_HINT if student_id and status else None
+    return QuerySpec(filter_dict, projection, hint)
+
+
 # Cached location lookup
-@lru_cache(maxsize=100)
-def get_cached_location_names() -> dict:
-    """Cache location ID to name mapping."""
-    return {}  # Populated on first use
+LOCATION_CACHE_TTL = 3600  # 1 hour
 
 
 async def warm_location_cache(db) -> None:
     """Pre-load location data into cache."""
-    locations = await db.locations.find({}).to_list(length=100)
-    location_map = {str(loc["_id"]): loc["name"] for loc in locations}
-    CacheManager.set("locations", location_map, ttl=3600)
+    locations = await db.locations.find({}, {"_id": 1, "name": 1}).to_list(length=None)
+    location_map = {str(loc["_id"]): loc.get("name") for loc in locations}
+    CacheManager.set("locations", location_map, ttl=LOCATION_CACHE_TTL)
     logger.info(f"Location cache warmed with {len(locations)} entries")
 
 
+async def get_location_name(db, location_id: str) -> Optional[str]:
+    """Get a location name, loading and caching just that location on a miss."""
+    location_map = CacheManager.get("locations")
+    if location_map and location_id in location_map:
+        return location_map[location_id]
+
+    cache_key = f"location_name:{location_id}"
+    name = CacheManager.get(cache_key)
+    if name is not None:
+        return name
+
+    if not ObjectId.is_valid(location_id):
+        return None
+
+    location = await db.locations.find_one({"_id": ObjectId(location_id)}, {"name": 1})
+    if not location:
+        return None
+
+    name = location.get("name")
+    CacheManager.set(cache_key, name, ttl=LOCATION_CACHE_TTL)
+    return name
+
+
+def location_capacity_cache_key(location_id: str) -> str:
+    """Cache key for a location's max_capacity."""
+    return f"location_capacity:{location_id}"
+
+
+# Cached location documents and the active-location listing
+LOCATION_DOC_CACHE_TTL = 60  # seconds
+ACTIVE_LOCATIONS_CACHE_KEY = "locations:active"
+
+
+def location_doc_cache_key(location_id: str) -> str:
+    """Cache key for a whole location document."""
+    return f"location:{location_id}"
+
+
+def invalidate_location_cache(location_id: str) -> None:
+    """Drop cached data for a location after it is created or edited."""
+    CacheManager.delete("locations")
+    CacheManager.delete(ACTIVE_LOCATIONS_CACHE_KEY)
+    CacheManager.delete(f"location_name:{location_id}")
+    CacheManager.delete(location_capacity_cache_key(location_id))
+    CacheManager.delete(location_doc_cache_key(location_id))
+
+
+# Cached user lookup
+USER_CACHE_TTL = 30  # seconds
+
+
+def user_cache_key(user_id: str) -> str:
+    """Cache key for a user document."""
+    return f"user:{user_id}"
+
+
+# Coalesces cache misses from concurrent requests into one $in query
+_user_loader: Optional[BatchLoader] = None
+_user_loader_db = None
+
+
+def _get_user_loader(db) -> BatchLoader:
+    """Return the user loader bound to this database handle."""
+    global _user_loader, _user_loader_db
+    if _user_loader is None or _user_loader_db is not db:
+        async def fetch(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+            users = await db.users.find(
+                {"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}}
+            ).to_list(length=len(user_ids))
+            return {str(user["_id"]): user for user in users}
+
+        _user_loader, _user_loader_db = BatchLoader(fetch), db
+    return _user_loader
+
+
+async def get_user_cached(db, user_id: str) -> Optional[Dict[str, Any]]:
+    """Get a user by ID, cached briefly since it is read on every request."""
+    cache_key = user_cache_key(user_id)
+    user = CacheManager.get(cache_key)
+    if user is None:
+        if not ObjectId.is_valid(user_id):
+            return None
+        user = await _get_user_loader(db).load(user_id)
+        if user is None:
+            return None
+        user["_id"] = str(user["_id"])
+        CacheManager.set(cache_key, user, ttl=USER_CACHE_TTL)
+    # Callers may modify the document, so hand out a copy
+    return dict(user)
+
+
+def invalidate_user_cache(user_id: str) -> None:
+    """Drop a cached user after it is edited."""
+    CacheManager.delete(user_cache_key(user_id))
+
+
+# Cached app settings
+SETTING_CACHE_TTL = 30  # seconds
+
+
+def setting_cache_key(key: str) -> str:
+    """Cache key for an app setting."""
+    return f"app_setting:{key}"
+
+
+async def get_setting_cached(db, key: str, default: Any) -> Any:
+    """Get an app setting value, cached briefly since settings rarely change."""
+    cache_key = setting_cache_key(key)
+    # Wrapped so a missing setting is cached too; {} means not set
+    entry = CacheManager.get(cache_key)
+    if entry is None:
+        setting = await db.app_settings.find_one({"key": key}, {"value": 1})
+        entry = {"value": setting["value"]} if setting and "value" in setting else {}
+        CacheManager.set(cache_key, entry, ttl=SETTING_CACHE_TTL)
+    return entry.get("value", default)
+
+
+def invalidate_setting_cache(key: str) -> None:
+    """Drop a cached app setting after it is changed."""
+    CacheManager.delete(setting_cache_key(key))
+
+
 # Performance monitoring
+class _EndpointMetrics:
+    """Running aggregates plus a bounded window of recent samples."""
+
+    __slots__ = ("count", "total", "min", "max", "samples")
+
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+
+    def add(self, duration_ms: float) -> None:
+        self.count += 1
+        self.total += duration_ms
+        if duration_ms < self.min:
+            self.min = duration_ms
+        if duration_ms > self.max:
+            self.max = duration_ms
+        self.samples.append(duration_ms)
+
+
+def _percentile(sorted_samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sample list."""
+    index = max(0, math.ceil(fraction * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
 class PerformanceMonitor:
     """Simple performance monitoring for API endpoints."""
 
-    _metrics: Dict[str, List[float]] = {}
+    # Keep only the last 1000 measurements per endpoint for percentiles
+    MAX_SAMPLES = 1000
+
+    _metrics: Dict[str, _EndpointMetrics] = {}
+    _lock = threading.Lock()
 
     @classmethod
     def record(cls, endpoint: str, duration_ms: float) -> None:
         """Record endpoint response time."""
-        if endpoint not in cls._metrics:
-            cls._metrics[endpoint] = []
-
-        # Keep only last 1000 measurements
-        if len(cls._metrics[endpoint]) >= 1000:
-            cls._metrics[endpoint] = cls._metrics[endpoint][-500:]
-
-        cls._metrics[endpoint].append(duration_ms)
+        with cls._lock:
+            metrics = cls._metrics.get(endpoint)
+            if metrics is None:
+                metrics = cls._metrics[endpoint] = _EndpointMetrics(cls.MAX_SAMPLES)
+            metrics.add(duration_ms)
 
     @classmethod
     def get_stats(cls, endpoint: str = None) -> dict:
-        """Get performance statistics."""
+        """
+        Get performance statistics.
+
+        count/avg/min/max cover every recorded request; percentiles are
+        computed on demand from the most recent samples.
+        """
         if endpoint:
-            times = cls._metrics.get(endpoint, [])
-            if not times:
-                return {"endpoint": endpoint, "count": 0}
+            with cls._lock:
+                metrics = cls._metrics.get(endpoint)
+                if metrics is None or not metrics.count:
+                    return {"endpoint": endpoint, "count": 0}
+                count, total = metrics.count, metrics.total
+                min_ms, max_ms = metrics.min, metrics.max
+                recent = sorted(metrics.samples)
             return {
                 "endpoint": endpoint,
-                "count": len(times),
-                "avg_ms": sum(times) / len(times),
-                "min_ms": min(times),
-                "max_ms": max(times),
+                "count": count,
+                "avg_ms": total / count,
+                "min_ms": min_ms,
+                "max_ms": max_ms,
+                "p50_ms": _percentile(recent, 0.50),
+                "p95_ms": _percentile(recent, 0.95),
             }
 
+        with cls._lock:
+            endpoints = list(cls._metrics.keys())
         return {
             endpoint: cls.get_stats(endpoint)
-            for endpoint in cls._metrics.keys()
+            for endpoint in endpoints
         }
+
+    @classmethod
+    def reset(cls) -> None:
+        """Discard all recorded metrics."""
+        with cls._lock:
+            cls._metrics.clear()
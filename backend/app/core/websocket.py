@@ -1,75 +1,112 @@
 """WebSocket/Socket.IO Manager for Real-Time Communications"""
 
 import socketio
+import asyncio
+import orjson
+import hashlib
 import logging
-from typing import Dict, Set, Optional
+import sys
+import time
+from functools import lru_cache
+from typing import Dict, List, Set, Optional, Tuple
 from datetime import datetime
-import jwt
+from jose import ExpiredSignatureError, JWTError, jwt
+from cachetools import TTLCache
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+class _OrjsonSerializer:
+    """json-module stand-in so Socket.IO encodes packets with orjson"""
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        # orjson output is already compact; stdlib kwargs like separators
+        # are accepted and ignored. Datetimes are encoded natively, str()
+        # covers ObjectIds, and non-str dict keys are stringified like the
+        # stdlib does.
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
 # Create Socket.IO server with ASGI support
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    json=_OrjsonSerializer,
     cors_allowed_origins=settings.ALLOWED_ORIGINS,
-    logger=True,
-    engineio_logger=True if settings.DEBUG else False
+    logger=settings.DEBUG,
+    engineio_logger=settings.DEBUG
 )
 
 
+@lru_cache(maxsize=100_000)
+def _user_room(user_id: str) -> str:
+    """Room name for a user's sessions, built once per user"""
+    return f'user:{user_id}'
+
+
+@lru_cache(maxsize=32)
+def _role_room(role: str) -> str:
+    """Room name for a role's sessions, built once per role"""
+    return f'role:{role}'
+
+
 class ConnectionManager:
     """Manages WebSocket connections and rooms"""
 
     def __init__(self):
-        # Map of user_id to set of session IDs
-        self.user_connections: Dict[str, Set[str]] = {}
+        # Map of user_id to session IDs. Most users have one or two
+        # sessions, and a small tuple is a fraction of the size of a set.
+        self.user_connections: Dict[str, Tuple[str, ...]] = {}
         # Map of session_id to user_id
         self.session_users: Dict[str, str] = {}
-        # Map of room name to set of session IDs
-        self.rooms: Dict[str, Set[str]] = {}
+        # Room membership lives in Socket.IO's own manager (sio.manager.rooms)
 
     async def connect(self, sid: str, user_id: str) -> None:
         """Register a new connection"""
-        if user_id not in self.user_connections:
-            self.user_connections[user_id] = set()
-        self.user_connections[user_id].add(sid)
+        # One shared key object per user across both maps
+        user_id = sys.intern(user_id)
+        sessions = self.user_connections.get(user_id, ())
+        if sid not in sessions:
+            self.user_connections[user_id] = sessions + (sid,)
         self.session_users[sid] = user_id
-        logger.info(f"User {user_id} connected with session {sid}")
+        logger.info("User %s connected with session %s", user_id, sid)
 
     async def disconnect(self, sid: str) -> Optional[str]:
         """Remove a connection"""
         user_id = self.session_users.pop(sid, None)
         if user_id and user_id in self.user_connections:
-            self.user_connections[user_id].discard(sid)
-            if not self.user_connections[user_id]:
+            remaining = tuple(s for s in self.user_connections[user_id] if s != sid)
+            if remaining:
+                self.user_connections[user_id] = remaining
+            else:
                 del self.user_connections[user_id]
 
-        # Remove from all rooms
-        for room_sessions in self.rooms.values():
-            room_sessions.discard(sid)
-
-        logger.info(f"Session {sid} disconnected (user: {user_id})")
+        # Socket.IO drops the session from its rooms on disconnect
+        logger.info("Session %s disconnected (user: %s)", sid, user_id)
         return user_id
 
     async def join_room(self, sid: str, room: str) -> None:
         """Add a session to a room"""
-        if room not in self.rooms:
-            self.rooms[room] = set()
-        self.rooms[room].add(sid)
         await sio.enter_room(sid, room)
-        logger.info(f"Session {sid} joined room {room}")
+        logger.info("Session %s joined room %s", sid, room)
+
+    async def join_rooms(self, sid: str, rooms: List[str]) -> None:
+        """Add a session to several rooms at once"""
+        await asyncio.gather(*(sio.enter_room(sid, room) for room in rooms))
+        logger.info("Session %s joined rooms %s", sid, rooms)
 
     async def leave_room(self, sid: str, room: str) -> None:
         """Remove a session from a room"""
-        if room in self.rooms:
-            self.rooms[room].discard(sid)
         await sio.leave_room(sid, room)
-        logger.info(f"Session {sid} left room {room}")
+        logger.info("Session %s left room %s", sid, room)
 
     def get_user_sessions(self, user_id: str) -> Set[str]:
         """Get all sessions for a user"""
-        return self.user_connections.get(user_id, set())
+        return set(self.user_connections.get(user_id, ()))
 
     def is_user_online(self, user_id: str) -> bool:
         """Check if a user has any active connections"""
@@ -79,34 +116,82 @@ class ConnectionManager:
         """Get the number of online users"""
         return len(self.user_connections)
 
+    def get_rooms(self) -> Dict[str, Set[str]]:
+        """Get application rooms and their session IDs"""
+        namespace_rooms = sio.manager.rooms.get('/', {})
+        # Skip Socket.IO's internal rooms: None holds every session and each
+        # session also has a private room named after its sid
+        return {
+            room: set(sessions)
+            for room, sessions in namespace_rooms.items()
+            if room is not None and room not in self.session_users
+        }
+
 
 # Global connection manager instance
 manager = ConnectionManager()
 
 
+# Recently verified token payloads, keyed by a digest of the token so raw
+# tokens are never held in memory. Absorbs reconnect storms where the same
+# token is verified many times within a few seconds.
+_verified_tokens: TTLCache = TTLCache(maxsize=10_000, ttl=5)
+
+
+def _token_cache_key(token: str) -> bytes:
+    """Derive the verification cache key for a token"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
 def verify_socket_token(token: str) -> Optional[dict]:
     """Verify JWT token for socket connections"""
+    key = _token_cache_key(token)
+    payload = _verified_tokens.get(key)
+    if payload is not None:
+        # Signature was already checked; only expiry can have changed
+        exp = payload.get('exp')
+        if exp is None or exp > time.time():
+            return payload
+        _verified_tokens.pop(key, None)
+        logger.warning("Socket auth failed: Token expired")
+        return None
+
     try:
         payload = jwt.decode(
             token,
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
+        _verified_tokens[key] = payload
         return payload
-    except jwt.ExpiredSignatureError:
+    except ExpiredSignatureError:
         logger.warning("Socket auth failed: Token expired")
         return None
-    except jwt.InvalidTokenError as e:
-        logger.warning(f"Socket auth failed: {e}")
+    except JWTError as e:
+        logger.warning("Socket auth failed: %s", e)
         return None
 
 
+# Bursts of events within one tick share a formatted timestamp
+_TIMESTAMP_RESOLUTION = 0.01  # seconds
+_timestamp_cache = {'t': 0.0, 's': ''}
+
+
+def _now_iso() -> str:
+    """Current UTC time in ISO format, reformatted at most once per tick"""
+    t = time.time()
+    if t - _timestamp_cache['t'] > _TIMESTAMP_RESOLUTION:
+        _timestamp_cache['t'] = t
+        _timestamp_cache['s'] = datetime.utcfromtimestamp(t).isoformat()
+    return _timestamp_cache['s']
+
+
 # Socket.IO Event Handlers
 
 @sio.event
 async def connect(sid, environ, auth):
     """Handle new socket connection"""
-    logger.info(f"New socket connection attempt: {sid}")
+    logger.info("New socket connection attempt: %s", sid)
 
     # Extract token from auth
     token = None
@@ -114,43 +199,43 @@ async def connect(sid, environ, auth):
         token = auth.get('token')
 
     if not token:
-        logger.warning(f"Connection rejected: No token provided for {sid}")
+        logger.warning("Connection rejected: No token provided for %s", sid)
         return False
 
     # Verify token
     payload = verify_socket_token(token)
     if not payload:
-        logger.warning(f"Connection rejected: Invalid token for {sid}")
+        logger.warning("Connection rejected: Invalid token for %s", sid)
         return False
 
     user_id = payload.get('sub')
     user_role = payload.get('role')
 
     if not user_id:
-        logger.warning(f"Connection rejected: No user_id in token for {sid}")
+        logger.warning("Connection rejected: No user_id in token for %s", sid)
         return False
 
     # Register connection
     await manager.connect(sid, user_id)
 
     # Auto-join role-based rooms
-    await manager.join_room(sid, f"role:{user_role}")
-    await manager.join_room(sid, f"user:{user_id}")
+    rooms = [_role_room(user_role), _user_room(user_id)]
 
     # Staff and Admin auto-join hall monitor room
     if user_role in ['STAFF', 'ADMIN']:
-        await manager.join_room(sid, 'hall_monitor')
-        await manager.join_room(sid, 'emergency_alerts')
+        rooms += ['hall_monitor', 'emergency_alerts']
+
+    await manager.join_rooms(sid, rooms)
 
     # Emit successful connection
     await sio.emit('connected', {
         'message': 'Successfully connected',
         'user_id': user_id,
         'role': user_role,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }, to=sid)
 
-    logger.info(f"User {user_id} ({user_role}) connected successfully")
+    logger.info("User %s (%s) connected successfully", user_id, user_role)
     return True
 
 
@@ -158,7 +243,7 @@ async def connect(sid, environ, auth):
 async def disconnect(sid):
     """Handle socket disconnection"""
     user_id = await manager.disconnect(sid)
-    logger.info(f"Socket disconnected: {sid} (user: {user_id})")
+    logger.info("Socket disconnected: %s (user: %s)", sid, user_id)
 
 
 @sio.event
@@ -180,21 +265,33 @@ async def leave_room(sid, data):
 
 
 # Real-time Event Emitters
+#
+# Events bound for several rooms are emitted once with a list of rooms, so
+# Socket.IO encodes the packet once and each session receives it once even
+# when it belongs to more than one of the rooms.
+
+FRONT_DESK_ROOMS = [_role_room('ADMIN'), _role_room('STAFF')]
+
+
+def _pass_rooms(pass_data: dict) -> List[str]:
+    """Rooms that follow a pass: hall monitors and the pass's student"""
+    rooms = ['hall_monitor']
+    student_id = pass_data.get('student_id')
+    if student_id:
+        rooms.append(_user_room(student_id))
+    return rooms
+
 
 async def emit_pass_created(pass_data: dict):
     """Emit when a new pass is created"""
     event_data = {
         'type': 'pass_created',
         'pass': pass_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
-    # Notify hall monitors
-    await sio.emit('pass_created', event_data, room='hall_monitor')
-    # Notify the student
-    student_id = pass_data.get('student_id')
-    if student_id:
-        await sio.emit('pass_created', event_data, room=f'user:{student_id}')
-    logger.info(f"Emitted pass_created event for pass {pass_data.get('_id')}")
+    # Notify hall monitors and the student with a single encode
+    await sio.emit('pass_created', event_data, room=_pass_rooms(pass_data))
+    logger.info("Emitted pass_created event for pass %s", pass_data.get('_id'))
 
 
 async def emit_pass_approved(pass_data: dict):
@@ -202,15 +299,11 @@ async def emit_pass_approved(pass_data: dict):
     event_data = {
         'type': 'pass_approved',
         'pass': pass_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
-    # Notify hall monitors
-    await sio.emit('pass_approved', event_data, room='hall_monitor')
-    # Notify the student
-    student_id = pass_data.get('student_id')
-    if student_id:
-        await sio.emit('pass_approved', event_data, room=f'user:{student_id}')
-    logger.info(f"Emitted pass_approved event for pass {pass_data.get('_id')}")
+    # Notify hall monitors and the student with a single encode
+    await sio.emit('pass_approved', event_data, room=_pass_rooms(pass_data))
+    logger.info("Emitted pass_approved event for pass %s", pass_data.get('_id'))
 
 
 async def emit_pass_rejected(pass_data: dict, reason: Optional[str] = None):
@@ -219,15 +312,11 @@ async def emit_pass_rejected(pass_data: dict, reason: Optional[str] = None):
         'type': 'pass_rejected',
         'pass': pass_data,
         'reason': reason,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
-    # Notify the student
-    student_id = pass_data.get('student_id')
-    if student_id:
-        await sio.emit('pass_rejected', event_data, room=f'user:{student_id}')
-    # Notify hall monitors
-    await sio.emit('pass_rejected', event_data, room='hall_monitor')
-    logger.info(f"Emitted pass_rejected event for pass {pass_data.get('_id')}")
+    # Notify hall monitors and the student with a single encode
+    await sio.emit('pass_rejected', event_data, room=_pass_rooms(pass_data))
+    logger.info("Emitted pass_rejected event for pass %s", pass_data.get('_id'))
 
 
 async def emit_pass_completed(pass_data: dict):
@@ -235,11 +324,11 @@ async def emit_pass_completed(pass_data: dict):
     event_data = {
         'type': 'pass_completed',
         'pass': pass_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     # Notify hall monitors
     await sio.emit('pass_completed', event_data, room='hall_monitor')
-    logger.info(f"Emitted pass_completed event for pass {pass_data.get('_id')}")
+    logger.info("Emitted pass_completed event for pass %s", pass_data.get('_id'))
 
 
 async def emit_pass_overtime(pass_data: dict, minutes_overtime: int):
@@ -248,17 +337,11 @@ async def emit_pass_overtime(pass_data: dict, minutes_overtime: int):
         'type': 'pass_overtime',
         'pass': pass_data,
         'minutes_overtime': minutes_overtime,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
-    # Notify hall monitors
-    await sio.emit('pass_overtime', event_data, room='hall_monitor')
-    # Notify the student
-    student_id = pass_data.get('student_id')
-    if student_id:
-        await sio.emit('pass_overtime', event_data, room=f'user:{student_id}')
-    # Notify admins
-    await sio.emit('pass_overtime', event_data, room='role:ADMIN')
-    logger.info(f"Emitted pass_overtime event for pass {pass_data.get('_id')} ({minutes_overtime} mins)")
+    # Notify hall monitors, the student and admins with a single encode
+    await sio.emit('pass_overtime', event_data, room=_pass_rooms(pass_data) + [_role_room('ADMIN')])
+    logger.info("Emitted pass_overtime event for pass %s (%s mins)", pass_data.get('_id'), minutes_overtime)
 
 
 async def emit_emergency_triggered(alert_data: dict):
@@ -266,11 +349,11 @@ async def emit_emergency_triggered(alert_data: dict):
     event_data = {
         'type': 'emergency_triggered',
         'alert': alert_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     # Broadcast to all connected users
     await sio.emit('emergency_triggered', event_data)
-    logger.info(f"Emitted emergency_triggered event: {alert_data.get('alert_type')}")
+    logger.info("Emitted emergency_triggered event: %s", alert_data.get('alert_type'))
 
 
 async def emit_emergency_updated(alert_data: dict):
@@ -278,11 +361,11 @@ async def emit_emergency_updated(alert_data: dict):
     event_data = {
         'type': 'emergency_updated',
         'alert': alert_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     # Broadcast to all connected users
     await sio.emit('emergency_updated', event_data)
-    logger.info(f"Emitted emergency_updated event: {alert_data.get('status')}")
+    logger.info("Emitted emergency_updated event: %s", alert_data.get('status'))
 
 
 async def emit_emergency_ended(alert_data: dict):
@@ -290,11 +373,11 @@ async def emit_emergency_ended(alert_data: dict):
     event_data = {
         'type': 'emergency_ended',
         'alert': alert_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     # Broadcast to all connected users
     await sio.emit('emergency_ended', event_data)
-    logger.info(f"Emitted emergency_ended event")
+    logger.info("Emitted emergency_ended event")
 
 
 async def emit_checkin_update(checkin_data: dict):
@@ -302,11 +385,11 @@ async def emit_checkin_update(checkin_data: dict):
     event_data = {
         'type': 'checkin_update',
         'checkin': checkin_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     # Notify emergency coordinators
     await sio.emit('checkin_update', event_data, room='emergency_alerts')
-    logger.info(f"Emitted checkin_update event")
+    logger.info("Emitted checkin_update event")
 
 
 async def emit_visitor_checkin(visitor_data: dict):
@@ -314,12 +397,11 @@ async def emit_visitor_checkin(visitor_data: dict):
     event_data = {
         'type': 'visitor_checkin',
         'visitor': visitor_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     # Notify front desk / admin
-    await sio.emit('visitor_checkin', event_data, room='role:ADMIN')
-    await sio.emit('visitor_checkin', event_data, room='role:STAFF')
-    logger.info(f"Emitted visitor_checkin event")
+    await sio.emit('visitor_checkin', event_data, room=FRONT_DESK_ROOMS)
+    logger.info("Emitted visitor_checkin event")
 
 
 async def emit_visitor_checkout(visitor_data: dict):
@@ -327,24 +409,23 @@ async def emit_visitor_checkout(visitor_data: dict):
     event_data = {
         'type': 'visitor_checkout',
         'visitor': visitor_data,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     # Notify front desk / admin
-    await sio.emit('visitor_checkout', event_data, room='role:ADMIN')
-    await sio.emit('visitor_checkout', event_data, room='role:STAFF')
-    logger.info(f"Emitted visitor_checkout event")
+    await sio.emit('visitor_checkout', event_data, room=FRONT_DESK_ROOMS)
+    logger.info("Emitted visitor_checkout event")
 
 
 async def emit_to_user(user_id: str, event: str, data: dict):
     """Emit an event to a specific user"""
-    await sio.emit(event, data, room=f'user:{user_id}')
-    logger.info(f"Emitted {event} to user {user_id}")
+    await sio.emit(event, data, room=_user_room(user_id))
+    logger.info("Emitted %s to user %s", event, user_id)
 
 
 async def broadcast_to_role(role: str, event: str, data: dict):
     """Broadcast an event to all users with a specific role"""
-    await sio.emit(event, data, room=f'role:{role}')
-    logger.info(f"Broadcast {event} to role {role}")
+    await sio.emit(event, data, room=_role_room(role))
+    logger.info("Broadcast %s to role %s", event, role)
 
 
 # Get connection stats
@@ -353,5 +434,5 @@ def get_connection_stats() -> dict:
     return {
         'online_users': manager.get_online_user_count(),
         'total_connections': len(manager.session_users),
-        'rooms': {room: len(sessions) for room, sessions in manager.rooms.items()}
+        'rooms': {room: len(sessions) for room, sessions in manager.get_rooms().items()}
     }
@@ -1,9 +1,12 @@
 """Base repository pattern for database operations"""
 
-from typing import Generic, TypeVar, Optional, List, Dict, Any
+from typing import Generic, TypeVar, Optional, List, Dict, Any, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
-from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
+from app.core.clock import request_now
+from functools import lru_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,6 +14,41 @@ logger = logging.getLogger(__name__)
 T = TypeVar('T')
 
 
+@lru_cache(maxsize=4096)
+def _oid(id: str) -> ObjectId:
+    """Convert an ID string to an ObjectId, reusing recent conversions"""
+    return ObjectId(id)
+
+
+def _lookup_by_id_string(
+    collection: str,
+    local_field: str,
+    as_field: str,
+    fields: Dict[str, int]
+) -> Dict[str, Any]:
+    """
+    Build a $lookup stage joining on a field that stores an ObjectId as a string.
+
+    Args:
+        collection: Collection to join
+        local_field: Field holding the referenced document's ID string
+        as_field: Output array field
+        fields: Fields to keep from the joined document
+
+    Returns:
+        $lookup pipeline stage
+    """
+    return {"$lookup": {
+        "from": collection,
+        "let": {"ref": {"$convert": {"input": f"${local_field}", "to": "objectId", "onError": None, "onNull": None}}},
+        "pipeline": [
+            {"$match": {"$expr": {"$eq": ["$_id", "$$ref"]}}},
+            {"$project": {**fields, "_id": {"$toString": "$_id"}}}
+        ],
+        "as": as_field
+    }}
+
+
 class BaseRepository(Generic[T]):
     """Base repository class with common CRUD operations"""
 
@@ -26,37 +64,77 @@ class BaseRepository(Generic[T]):
         self.collection = db[collection_name]
         self.collection_name = collection_name
 
-    async def find_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+    async def find_by_id(
+        self,
+        id: str,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
         """
         Find a document by its ID.
 
         Args:
             id: Document ID as string
+            projection: Fields to return (default: whole document)
 
         Returns:
             Document dict or None if not found
         """
+        if not ObjectId.is_valid(id):
+            return None
         try:
-            document = await self.collection.find_one({"_id": ObjectId(id)})
+            document = await self.collection.find_one({"_id": _oid(id)}, projection)
             if document:
                 document["_id"] = str(document["_id"])
             return document
-        except Exception as e:
+        except PyMongoError as e:
             logger.error(f"Error finding document by id {id} in {self.collection_name}: {e}")
             return None
 
-    async def find_one(self, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def find_by_ids(
+        self,
+        ids: List[str],
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Find several documents by ID in one query.
+
+        Args:
+            ids: Document IDs as strings; invalid IDs are ignored
+            projection: Fields to return (default: whole documents)
+
+        Returns:
+            Documents keyed by their string ID; missing IDs are absent
+        """
+        object_ids = [_oid(id) for id in set(ids) if ObjectId.is_valid(id)]
+        if not object_ids:
+            return {}
+        try:
+            documents = {}
+            async for doc in self.collection.find({"_id": {"$in": object_ids}}, projection):
+                doc["_id"] = str(doc["_id"])
+                documents[doc["_id"]] = doc
+            return documents
+        except PyMongoError as e:
+            logger.error(f"Error finding documents by ids in {self.collection_name}: {e}")
+            return {}
+
+    async def find_one(
+        self,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
         """
         Find a single document matching the query.
 
         Args:
             query: MongoDB query dict
+            projection: Fields to return (default: whole document)
 
         Returns:
             Document dict or None if not found
         """
         try:
-            document = await self.collection.find_one(query)
+            document = await self.collection.find_one(query, projection)
             if document and "_id" in document:
                 document["_id"] = str(document["_id"])
             return document
@@ -69,7 +147,9 @@ class BaseRepository(Generic[T]):
         query: Dict[str, Any],
         limit: int = 100,
         skip: int = 0,
-        sort: Optional[List[tuple]] = None
+        sort: Optional[List[tuple]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        hint: Optional[List[tuple]] = None
     ) -> List[Dict[str, Any]]:
         """
         Find multiple documents matching the query.
@@ -79,20 +159,113 @@ class BaseRepository(Generic[T]):
             limit: Maximum number of documents to return
             skip: Number of documents to skip
             sort: List of (field, direction) tuples for sorting
+            projection: Fields to return (default: whole documents)
+            hint: Key pattern of the index the query should use; if the
+                server rejects it (e.g. the index is missing) the query is
+                retried without it
 
         Returns:
             List of document dicts
         """
         try:
-            cursor = self.collection.find(query).skip(skip).limit(limit)
-            if sort:
-                cursor = cursor.sort(sort)
-
-            documents = await cursor.to_list(length=limit)
-            for doc in documents:
-                if "_id" in doc:
-                    doc["_id"] = str(doc["_id"])
-            return documents
+            try:
+                return await self._find_documents(query, limit, skip, sort, projection, hint)
+            except OperationFailure as e:
+                if not hint:
+                    raise
+                logger.warning(f"Index hint {hint} rejected on {self.collection_name}, retrying without it: {e}")
+                return await self._find_documents(query, limit, skip, sort, projection, None)
+        except Exception as e:
+            logger.error(f"Error finding documents in {self.collection_name}: {e}")
+            return []
+
+    async def _find_documents(
+        self,
+        query: Dict[str, Any],
+        limit: int,
+        skip: int,
+        sort: Optional[List[tuple]],
+        projection: Optional[Dict[str, Any]],
+        hint: Optional[List[tuple]]
+    ) -> List[Dict[str, Any]]:
+        """Run one find for find_many and collect the documents"""
+        cursor = self.collection.find(query, projection).skip(skip).limit(limit)
+        if sort:
+            cursor = cursor.sort(sort)
+        if hint:
+            cursor = cursor.hint(hint)
+
+        # Convert ids as documents stream in rather than in a second pass
+        documents = []
+        async for doc in cursor:
+            if "_id" in doc:
+                doc["_id"] = str(doc["_id"])
+            documents.append(doc)
+        return documents
+
+    async def iter_many(
+        self,
+        query: Dict[str, Any],
+        sort: Optional[List[tuple]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream documents matching the query without building a list.
+
+        Unlike find_many, errors propagate to the caller, since documents
+        may already have been consumed when one occurs.
+
+        Args:
+            query: MongoDB query dict
+            sort: List of (field, direction) tuples for sorting
+            projection: Fields to return (default: whole documents)
+            batch_size: Documents fetched per round trip
+
+        Yields:
+            Document dicts
+        """
+        cursor = self.collection.find(query, projection).batch_size(batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        async for doc in cursor:
+            if "_id" in doc:
+                doc["_id"] = str(doc["_id"])
+            yield doc
+
+    async def find_many_projected(
+        self,
+        query: Dict[str, Any],
+        limit: int = 100,
+        skip: int = 0,
+        sort: Optional[List[tuple]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find multiple documents with _id already converted to a string.
+
+        Same contract as find_many, but runs as an aggregation so MongoDB
+        stringifies _id server-side instead of looping over results here.
+
+        Args:
+            query: MongoDB query dict
+            limit: Maximum number of documents to return
+            skip: Number of documents to skip
+            sort: List of (field, direction) tuples for sorting
+
+        Returns:
+            List of document dicts
+        """
+        pipeline: List[Dict[str, Any]] = [{"$match": query}]
+        if sort:
+            pipeline.append({"$sort": dict(sort)})
+        if skip:
+            pipeline.append({"$skip": skip})
+        pipeline.append({"$limit": limit})
+        pipeline.append({"$addFields": {"_id": {"$toString": "$_id"}}})
+
+        try:
+            return await self.collection.aggregate(pipeline).to_list(length=limit)
         except Exception as e:
             logger.error(f"Error finding documents in {self.collection_name}: {e}")
             return []
@@ -113,6 +286,39 @@ class BaseRepository(Generic[T]):
             logger.error(f"Error counting documents in {self.collection_name}: {e}")
             return 0
 
+    async def count_facets(
+        self,
+        query: Dict[str, Any],
+        facets: Dict[str, Optional[Dict[str, Any]]]
+    ) -> Dict[str, int]:
+        """
+        Count several subsets of a query in one aggregation round trip.
+
+        Args:
+            query: MongoDB query dict shared by every facet
+            facets: Map of result name to an extra filter, or None to count
+                every document matching query
+
+        Returns:
+            Dict of result name to count
+        """
+        pipeline = [
+            {"$match": query},
+            {"$facet": {
+                name: ([{"$match": extra}] if extra else []) + [{"$count": "n"}]
+                for name, extra in facets.items()
+            }}
+        ]
+        try:
+            results = await self.collection.aggregate(pipeline).to_list(length=1)
+        except Exception as e:
+            logger.error(f"Error counting documents in {self.collection_name}: {e}")
+            return {name: 0 for name in facets}
+
+        # $count emits nothing for an empty facet, leaving an empty list
+        counts = results[0] if results else {}
+        return {name: counts[name][0]["n"] if counts.get(name) else 0 for name in facets}
+
     async def insert_one(self, data: Dict[str, Any]) -> str:
         """
         Insert a single document.
@@ -125,7 +331,7 @@ class BaseRepository(Generic[T]):
         """
         try:
             # Add timestamps
-            now = datetime.utcnow()
+            now = request_now()
             data.setdefault("created_at", now)
             data.setdefault("updated_at", now)
 
@@ -147,15 +353,15 @@ class BaseRepository(Generic[T]):
             List of inserted document IDs as strings
         """
         try:
-            # Add timestamps to all documents
-            now = datetime.utcnow()
-            for data in data_list:
-                data.setdefault("created_at", now)
-                data.setdefault("updated_at", now)
+            # Add timestamps to all documents; values already set win
+            now = request_now()
+            timestamps = {"created_at": now, "updated_at": now}
+            documents = [{**timestamps, **data} for data in data_list]
 
-            result = await self.collection.insert_many(data_list)
+            # Unordered lets the server apply the batch without serializing
+            result = await self.collection.insert_many(documents, ordered=False)
             logger.info(f"Inserted {len(result.inserted_ids)} documents in {self.collection_name}")
-            return [str(id) for id in result.inserted_ids]
+            return list(map(str, result.inserted_ids))
         except Exception as e:
             logger.error(f"Error inserting documents in {self.collection_name}: {e}")
             raise
@@ -179,10 +385,10 @@ class BaseRepository(Generic[T]):
         """
         try:
             # Update timestamp
-            data["updated_at"] = datetime.utcnow()
+            data["updated_at"] = request_now()
 
             result = await self.collection.update_one(
-                {"_id": ObjectId(id)},
+                {"_id": _oid(id)},
                 {"$set": data},
                 upsert=upsert
             )
@@ -192,6 +398,46 @@ class BaseRepository(Generic[T]):
             logger.error(f"Error updating document {id} in {self.collection_name}: {e}")
             raise
 
+    async def update_if(
+        self,
+        id: str,
+        condition: Dict[str, Any],
+        data: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically update a document only while it still matches a condition.
+
+        Used for state transitions, so the legality check and the write
+        happen in one round trip without a read beforehand.
+
+        Args:
+            id: Document ID as string
+            condition: Extra filter the document must match, e.g. its status
+            data: Update data
+            projection: Fields to return (default: whole document)
+
+        Returns:
+            Updated document, or None if not found or the condition failed
+        """
+        if not ObjectId.is_valid(id):
+            return None
+        try:
+            data["updated_at"] = request_now()
+
+            doc = await self.collection.find_one_and_update(
+                {"_id": _oid(id), **condition},
+                {"$set": data},
+                projection=projection,
+                return_document=ReturnDocument.AFTER
+            )
+            if doc:
+                doc["_id"] = str(doc["_id"])
+            return doc
+        except Exception as e:
+            logger.error(f"Error updating document {id} in {self.collection_name}: {e}")
+            raise
+
     async def update_many(
         self,
         query: Dict[str, Any],
@@ -209,7 +455,7 @@ class BaseRepository(Generic[T]):
         """
         try:
             # Update timestamp
-            data["updated_at"] = datetime.utcnow()
+            data["updated_at"] = request_now()
 
             result = await self.collection.update_many(
                 query,
@@ -232,7 +478,7 @@ class BaseRepository(Generic[T]):
             True if document was deleted, False otherwise
         """
         try:
-            result = await self.collection.delete_one({"_id": ObjectId(id)})
+            result = await self.collection.delete_one({"_id": _oid(id)})
             logger.info(f"Deleted document {id} from {self.collection_name}: deleted={result.deleted_count}")
             return result.deleted_count > 0
         except Exception as e:
@@ -268,8 +514,9 @@ class BaseRepository(Generic[T]):
             True if at least one matching document exists
         """
         try:
-            count = await self.collection.count_documents(query, limit=1)
-            return count > 0
+            # Stops at the first match and returns only its _id
+            document = await self.collection.find_one(query, projection={"_id": 1})
+            return document is not None
         except Exception as e:
             logger.error(f"Error checking existence in {self.collection_name}: {e}")
             return False
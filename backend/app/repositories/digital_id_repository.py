@@ -2,8 +2,10 @@
 
 from typing import Optional, List, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.batch_writer import scan_log_writer
 from app.repositories.base_repository import BaseRepository
-from datetime import datetime
+from bson import ObjectId
+from app.core.clock import utcnow_cached
 import logging
 
 logger = logging.getLogger(__name__)
@@ -61,7 +63,7 @@ class DigitalIDRepository(BaseRepository):
         Returns:
             List of active digital ID documents
         """
-        return await self.find_many({"is_active": True}, limit=limit)
+        return await self.find_many_projected({"is_active": True}, limit=limit)
 
     async def find_pending_photo_approvals(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
@@ -73,7 +75,7 @@ class DigitalIDRepository(BaseRepository):
         Returns:
             List of digital IDs pending photo approval
         """
-        return await self.find_many({"photo_status": "pending"}, limit=limit)
+        return await self.find_many_projected({"photo_status": "pending"}, limit=limit)
 
     async def activate_id(self, id: str) -> bool:
         """
@@ -113,7 +115,7 @@ class DigitalIDRepository(BaseRepository):
         return await self.update_one(id, {
             "photo_status": "approved",
             "photo_approved_by": approved_by,
-            "photo_approved_at": datetime.utcnow()
+            "photo_approved_at": utcnow_cached()
         })
 
     async def reject_photo(self, id: str, rejected_by: str, reason: str = None) -> bool:
@@ -131,7 +133,7 @@ class DigitalIDRepository(BaseRepository):
         update_data = {
             "photo_status": "rejected",
             "photo_rejected_by": rejected_by,
-            "photo_rejected_at": datetime.utcnow()
+            "photo_rejected_at": utcnow_cached()
         }
         if reason:
             update_data["photo_rejection_reason"] = reason
@@ -160,7 +162,7 @@ class IDScanLogRepository(BaseRepository):
         Returns:
             List of scan log documents
         """
-        return await self.find_many(
+        return await self.find_many_projected(
             {"digital_id_id": digital_id_id},
             limit=limit,
             sort=[("scanned_at", -1)]
@@ -181,7 +183,7 @@ class IDScanLogRepository(BaseRepository):
         Returns:
             List of scan log documents
         """
-        return await self.find_many(
+        return await self.find_many_projected(
             {"scanned_by": scanned_by},
             limit=limit,
             sort=[("scanned_at", -1)]
@@ -206,11 +208,18 @@ class IDScanLogRepository(BaseRepository):
         Returns:
             Created scan log ID
         """
+        # The write is buffered, so assign the ID here rather than waiting
+        # for the insert to report it
+        now = utcnow_cached()
         scan_data = {
+            "_id": ObjectId(),
             "digital_id_id": digital_id_id,
             "scanned_by": scanned_by,
             "scan_type": scan_type,
             "location": location,
-            "scanned_at": datetime.utcnow()
+            "scanned_at": now,
+            "created_at": now,
+            "updated_at": now,
         }
-        return await self.insert_one(scan_data)
+        await scan_log_writer.write(self.db, scan_data)
+        return str(scan_data["_id"])
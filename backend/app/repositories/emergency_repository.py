@@ -1,14 +1,21 @@
 """Emergency repository for emergency alert database operations"""
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.clock import request_now
 from app.repositories.base_repository import BaseRepository
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fixed filters and sorts, built once rather than per call; never mutate
+_ACTIVE_ALERT_QUERY = {"resolved_at": None, "is_drill": False}
+_ACTIVE_DRILL_QUERY = {"resolved_at": None, "is_drill": True}
+_NEWEST_ALERT_FIRST = [("triggered_at", -1)]
+
 
 class EmergencyAlertRepository(BaseRepository):
     """Repository for emergency_alerts collection operations"""
@@ -23,10 +30,7 @@ class EmergencyAlertRepository(BaseRepository):
         Returns:
             Active emergency alert document or None
         """
-        return await self.find_one({
-            "resolved_at": None,
-            "is_drill": False
-        })
+        return await self.find_one(_ACTIVE_ALERT_QUERY)
 
     async def find_active_drill(self) -> Optional[Dict[str, Any]]:
         """
@@ -35,10 +39,7 @@ class EmergencyAlertRepository(BaseRepository):
         Returns:
             Active drill document or None
         """
-        return await self.find_one({
-            "resolved_at": None,
-            "is_drill": True
-        })
+        return await self.find_one(_ACTIVE_DRILL_QUERY)
 
     async def find_recent_alerts(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
@@ -50,11 +51,7 @@ class EmergencyAlertRepository(BaseRepository):
         Returns:
             List of recent alert documents
         """
-        return await self.find_many(
-            {},
-            limit=limit,
-            sort=[("triggered_at", -1)]
-        )
+        return await self.find_many({}, limit=limit, sort=_NEWEST_ALERT_FIRST)
 
     async def find_alerts_by_type(
         self,
@@ -74,7 +71,7 @@ class EmergencyAlertRepository(BaseRepository):
         return await self.find_many(
             {"type": alert_type},
             limit=limit,
-            sort=[("triggered_at", -1)]
+            sort=_NEWEST_ALERT_FIRST
         )
 
     async def resolve_alert(
@@ -92,7 +89,7 @@ class EmergencyAlertRepository(BaseRepository):
             resolution_notes: Optional resolution notes
 
         Returns:
-            True if resolved successfully
+            True if resolved successfully, False if not found or already resolved
         """
         update_data = {
             "resolved_at": datetime.utcnow(),
@@ -101,7 +98,7 @@ class EmergencyAlertRepository(BaseRepository):
         if resolution_notes:
             update_data["resolution_notes"] = resolution_notes
 
-        return await self.update_one(alert_id, update_data)
+        return await self.update_if(alert_id, {"resolved_at": None}, update_data) is not None
 
     async def has_active_alert(self) -> bool:
         """
@@ -110,10 +107,7 @@ class EmergencyAlertRepository(BaseRepository):
         Returns:
             True if active alert exists
         """
-        return await self.exists({
-            "resolved_at": None,
-            "is_drill": False
-        })
+        return await self.exists(_ACTIVE_ALERT_QUERY)
 
 
 class EmergencyCheckInRepository(BaseRepository):
@@ -143,6 +137,18 @@ class EmergencyCheckInRepository(BaseRepository):
             sort=[("checked_in_at", -1)]
         )
 
+    def iter_check_ins_by_alert(self, alert_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream all check-ins for an alert, newest first.
+
+        Args:
+            alert_id: Alert ID
+
+        Returns:
+            Async iterator of check-in documents
+        """
+        return self.iter_many({"alert_id": alert_id}, sort=[("checked_in_at", -1)])
+
     async def find_check_in_by_user_and_alert(
         self,
         alert_id: str,
@@ -212,29 +218,26 @@ class EmergencyCheckInRepository(BaseRepository):
         Returns:
             Check-in ID
         """
-        # Check if check-in already exists
-        existing = await self.find_check_in_by_user_and_alert(alert_id, user_id)
-
-        if existing:
-            # Update existing check-in
-            await self.update_one(existing["_id"], {
-                "status": "safe",
-                "location": location,
-                "notes": notes,
-                "checked_in_at": datetime.utcnow()
-            })
-            return existing["_id"]
-        else:
-            # Create new check-in
-            check_in_data = {
-                "alert_id": alert_id,
-                "user_id": user_id,
-                "status": "safe",
-                "location": location,
-                "notes": notes,
-                "checked_in_at": datetime.utcnow()
-            }
-            return await self.insert_one(check_in_data)
+        # One atomic upsert on the unique (alert_id, user_id) key, so
+        # concurrent check-ins cannot create duplicates
+        now = request_now()
+        document = await self.collection.find_one_and_update(
+            {"alert_id": alert_id, "user_id": user_id},
+            {
+                "$set": {
+                    "status": "safe",
+                    "location": location,
+                    "notes": notes,
+                    "checked_in_at": now,
+                    "updated_at": now
+                },
+                "$setOnInsert": {"created_at": now}
+            },
+            projection={"_id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return str(document["_id"])
 
     async def get_check_in_stats(self, alert_id: str) -> Dict[str, int]:
         """
@@ -246,9 +249,14 @@ class EmergencyCheckInRepository(BaseRepository):
         Returns:
             Dict with total, checked_in, not_checked_in counts
         """
-        total = await self.count({"alert_id": alert_id})
-        checked_in = await self.count_checked_in_by_alert(alert_id)
-        not_checked_in = await self.count_not_checked_in_by_alert(alert_id)
+        counts = await self.count_facets({"alert_id": alert_id}, {
+            "total": None,
+            "checked_in": {"status": "safe"},
+            "not_checked_in": {"status": "pending"},
+        })
+        total = counts["total"]
+        checked_in = counts["checked_in"]
+        not_checked_in = counts["not_checked_in"]
 
         return {
             "total": total,
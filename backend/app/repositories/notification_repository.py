@@ -1,13 +1,20 @@
 """Notification repository for notification database operations"""
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.repositories.base_repository import BaseRepository
-from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from app.repositories.base_repository import BaseRepository, _oid
+from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fixed filters and sorts, built once rather than per call; never mutate
+_SENT_QUERY = {"status": "sent"}
+_ACTIVE_TEMPLATE_QUERY = {"is_active": True}
+_DUE_FIRST = [("scheduled_at", 1)]
+_NEWEST_SENT_FIRST = [("sent_at", -1)]
+
 
 class NotificationRepository(BaseRepository):
     """Repository for notifications collection operations"""
@@ -31,9 +38,48 @@ class NotificationRepository(BaseRepository):
                 "scheduled_at": {"$lte": datetime.utcnow()}
             },
             limit=limit,
-            sort=[("scheduled_at", 1)]
+            sort=_DUE_FIRST
         )
 
+    async def claim_next_pending(
+        self,
+        worker_id: str,
+        stale_after_minutes: int = 5
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim the next due notification for a worker.
+
+        The read and the claim are one operation, so concurrent workers
+        never pick up the same notification. A claim older than
+        stale_after_minutes was abandoned by a crashed worker and is
+        handed out again, so no separate cleanup job is needed.
+
+        Args:
+            worker_id: Identifier of the claiming dispatch worker
+            stale_after_minutes: Minutes after which a claim is considered abandoned
+
+        Returns:
+            Claimed notification document, or None if nothing is due
+        """
+        now = datetime.utcnow()
+        stale_before = now - timedelta(minutes=stale_after_minutes)
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "scheduled_at": {"$lte": now}},
+                    {"status": "processing", "claimed_at": {"$lt": stale_before}},
+                ]},
+                {"$set": {"status": "processing", "claimed_at": now, "claimed_by": worker_id}},
+                sort=_DUE_FIRST,
+                return_document=ReturnDocument.AFTER
+            )
+            if doc:
+                doc["_id"] = str(doc["_id"])
+            return doc
+        except Exception as e:
+            logger.error(f"Error claiming pending notification for {worker_id}: {e}")
+            return None
+
     async def find_sent_notifications(self, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Find sent notifications.
@@ -44,11 +90,7 @@ class NotificationRepository(BaseRepository):
         Returns:
             List of sent notification documents
         """
-        return await self.find_many(
-            {"status": "sent"},
-            limit=limit,
-            sort=[("sent_at", -1)]
-        )
+        return await self.find_many(_SENT_QUERY, limit=limit, sort=_NEWEST_SENT_FIRST)
 
     async def find_notifications_by_creator(
         self,
@@ -103,6 +145,36 @@ class NotificationRepository(BaseRepository):
             "failed_at": datetime.utcnow()
         })
 
+    async def bulk_mark_status(self, results: Dict[str, Optional[str]]) -> int:
+        """
+        Mark many notifications as sent or failed in one round trip.
+
+        Args:
+            results: Notification ID mapped to its error message, or None if sent
+
+        Returns:
+            Number of notifications updated
+        """
+        if not results:
+            return 0
+
+        now = datetime.utcnow()
+        operations = []
+        for notification_id, error in results.items():
+            if error is None:
+                update = {"status": "sent", "sent_at": now, "updated_at": now}
+            else:
+                update = {"status": "failed", "error_message": error, "failed_at": now, "updated_at": now}
+            operations.append(UpdateOne({"_id": _oid(notification_id)}, {"$set": update}))
+
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            logger.info(f"Marked {result.modified_count} notifications in {self.collection_name}")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error bulk marking notifications: {e}")
+            raise
+
 
 class NotificationReceiptRepository(BaseRepository):
     """Repository for notification_receipts collection operations"""
@@ -130,6 +202,18 @@ class NotificationReceiptRepository(BaseRepository):
             limit=limit
         )
 
+    def iter_receipts_by_notification(self, notification_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream all receipts for a notification.
+
+        Args:
+            notification_id: Notification ID
+
+        Returns:
+            Async iterator of receipt documents
+        """
+        return self.iter_many({"notification_id": notification_id})
+
     async def find_receipts_by_user(
         self,
         user_id: str,
@@ -217,6 +301,44 @@ class NotificationReceiptRepository(BaseRepository):
             "read_at": None
         })
 
+    async def get_unread_bundle(self, user_id: str, limit: int = 100) -> Dict[str, Any]:
+        """
+        Get a user's unread receipts and unread count in one round trip.
+
+        Combines find_unread_by_user and count_unread_for_user; the count
+        covers every unread receipt, not just the returned page.
+
+        Args:
+            user_id: User ID
+            limit: Maximum number of receipts to return
+
+        Returns:
+            Dict with items (newest delivery first) and count
+        """
+        pipeline = [
+            {"$match": {"user_id": user_id, "read_at": None}},
+            {"$facet": {
+                "items": [
+                    {"$sort": {"delivered_at": -1}},
+                    {"$limit": limit},
+                    {"$addFields": {"_id": {"$toString": "$_id"}}}
+                ],
+                "count": [{"$count": "n"}]
+            }}
+        ]
+        try:
+            results = await self.collection.aggregate(pipeline).to_list(length=1)
+        except Exception as e:
+            logger.error(f"Error getting unread receipts for user {user_id}: {e}")
+            return {"items": [], "count": 0}
+
+        bundle = results[0] if results else {}
+        count = bundle.get("count")
+        return {
+            "items": bundle.get("items", []),
+            "count": count[0]["n"] if count else 0
+        }
+
     async def get_delivery_stats(self, notification_id: str) -> Dict[str, int]:
         """
         Get delivery statistics for a notification.
@@ -227,19 +349,16 @@ class NotificationReceiptRepository(BaseRepository):
         Returns:
             Dict with delivered, read, failed counts
         """
-        total = await self.count({"notification_id": notification_id})
-        delivered = await self.count({
-            "notification_id": notification_id,
-            "delivery_status": "delivered"
-        })
-        read = await self.count({
-            "notification_id": notification_id,
-            "read_at": {"$ne": None}
-        })
-        failed = await self.count({
-            "notification_id": notification_id,
-            "delivery_status": "failed"
+        counts = await self.count_facets({"notification_id": notification_id}, {
+            "total": None,
+            "delivered": {"delivery_status": "delivered"},
+            "read": {"read_at": {"$ne": None}},
+            "failed": {"delivery_status": "failed"},
         })
+        total = counts["total"]
+        delivered = counts["delivered"]
+        read = counts["read"]
+        failed = counts["failed"]
 
         return {
             "total": total,
@@ -264,7 +383,7 @@ class NotificationTemplateRepository(BaseRepository):
         Returns:
             List of active template documents
         """
-        return await self.find_many({"is_active": True}, limit=100)
+        return await self.find_many(_ACTIVE_TEMPLATE_QUERY, limit=100)
 
     async def find_by_category(self, category: str) -> List[Dict[str, Any]]:
         """
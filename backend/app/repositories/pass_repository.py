@@ -1,14 +1,115 @@
 """Pass repository for hall pass database operations"""
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Set
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.repositories.base_repository import BaseRepository
+from app.core.performance import (
+    ACTIVE_LOCATIONS_CACHE_KEY,
+    LOCATION_DOC_CACHE_TTL,
+    CacheManager,
+    location_capacity_cache_key,
+    location_doc_cache_key,
+)
+from app.repositories.base_repository import BaseRepository, _lookup_by_id_string, _oid
 from datetime import datetime, timedelta
 from bson import ObjectId
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Statuses that block a student from requesting another pass
+ACTIVE_OR_PENDING_STATUSES = ["active", "pending", "approved"]
+
+CAPACITY_CACHE_TTL = 300  # 5 minutes
+
+# Fixed filters and sorts, built once rather than per call; never mutate
+_ACTIVE_PASS_QUERY = {"status": "active"}
+_NEWEST_DEPARTURE_FIRST = [("departed_at", -1)]
+
+# Minutes allowed when a pass has no time_limit_minutes
+DEFAULT_TIME_LIMIT_MINUTES = 5
+_TIME_LIMIT = {"$ifNull": ["$time_limit_minutes", DEFAULT_TIME_LIMIT_MINUTES]}
+
+
+def _elapsed_minutes(now: Any) -> Dict[str, Any]:
+    """Expression for the minutes since a pass departed, as of now (a datetime or "$$NOW")"""
+    return {"$divide": [{"$subtract": [now, "$departed_at"]}, 60_000]}
+
+
+def _time_remaining_stages(now: Any) -> List[Dict[str, Any]]:
+    """Stages adding time_remaining_minutes and is_overtime to departed passes, as of now"""
+    return [
+        {"$set": {"elapsed_minutes": {"$cond": ["$departed_at", _elapsed_minutes(now), "$$REMOVE"]}}},
+        {"$set": {
+            "time_remaining_minutes": {"$cond": [
+                "$departed_at",
+                {"$max": [0, {"$subtract": [_TIME_LIMIT, "$elapsed_minutes"]}]},
+                "$$REMOVE"
+            ]},
+            "is_overtime": {"$cond": [
+                "$departed_at",
+                {"$gt": ["$elapsed_minutes", _TIME_LIMIT]},
+                "$is_overtime"
+            ]}
+        }},
+        {"$unset": "elapsed_minutes"},
+    ]
+
+
+# As the hall monitor view shows them, computed at the server's clock
+_TIME_REMAINING_STAGES = _time_remaining_stages("$$NOW")
+
+# Fields joined onto passes for the hall monitor and history views
+_STUDENT_JOIN_FIELDS = {"first_name": 1, "last_name": 1, "email": 1}
+_LOCATION_JOIN_FIELDS = {"name": 1}
+
+
+def _if_joined(field: str, value: Any) -> Dict[str, Any]:
+    """Expression yielding value if the joined field exists, else removing the output field"""
+    return {"$cond": [f"${field}", value, "$$REMOVE"]}
+
+
+def _pass_enrichment_stages(with_student: bool) -> List[Dict[str, Any]]:
+    """
+    Build the stages that join location names (and optionally the student) onto passes.
+
+    The output matches what the services used to attach in Python:
+    origin_name, destination_name and, with the student, student_name
+    and student_email. A name is left out when its document is missing.
+
+    Args:
+        with_student: Whether to join the student as well
+
+    Returns:
+        Aggregation pipeline stages
+    """
+    stages = [
+        _lookup_by_id_string("locations", "origin_location_id", "origin", _LOCATION_JOIN_FIELDS),
+        _lookup_by_id_string("locations", "destination_location_id", "destination", _LOCATION_JOIN_FIELDS),
+    ]
+    joined = {
+        "_id": {"$toString": "$_id"},
+        "origin": {"$first": "$origin"},
+        "destination": {"$first": "$destination"},
+    }
+    names = {
+        "origin_name": _if_joined("origin", {"$ifNull": ["$origin.name", "Unknown"]}),
+        "destination_name": _if_joined("destination", {"$ifNull": ["$destination.name", "Unknown"]}),
+    }
+    dropped = ["origin", "destination"]
+
+    if with_student:
+        stages.append(_lookup_by_id_string("users", "student_id", "student", _STUDENT_JOIN_FIELDS))
+        joined["student"] = {"$first": "$student"}
+        names["student_name"] = _if_joined("student", {"$concat": [
+            {"$ifNull": ["$student.first_name", ""]},
+            " ",
+            {"$ifNull": ["$student.last_name", ""]},
+        ]})
+        names["student_email"] = _if_joined("student", {"$ifNull": ["$student.email", ""]})
+        dropped.append("student")
+
+    return stages + [{"$set": joined}, {"$set": names}, {"$unset": dropped}]
+
 
 class PassRepository(BaseRepository):
     """Repository for passes collection operations"""
@@ -58,23 +159,53 @@ class PassRepository(BaseRepository):
         """
         return await self.exists({
             "student_id": student_id,
-            "status": {"$in": ["active", "pending", "approved"]}
+            "status": {"$in": ACTIVE_OR_PENDING_STATUSES}
         })
 
-    async def find_all_active_passes(self, limit: int = 100) -> List[Dict[str, Any]]:
+    async def students_with_active_or_pending(self, student_ids: List[str]) -> Set[str]:
+        """
+        Find which of several students have an active or pending pass.
+
+        Bulk form of has_active_or_pending_pass for listings, answered
+        with one distinct query instead of one query per student.
+
+        Args:
+            student_ids: Student user IDs to check
+
+        Returns:
+            Set of the given student IDs that have an active or pending pass
+        """
+        if not student_ids:
+            return set()
+        try:
+            return set(await self.collection.distinct("student_id", {
+                "student_id": {"$in": student_ids},
+                "status": {"$in": ACTIVE_OR_PENDING_STATUSES}
+            }))
+        except Exception as e:
+            logger.error(f"Error checking active passes for {len(student_ids)} students: {e}")
+            return set()
+
+    async def find_all_active_passes(
+        self,
+        limit: int = 100,
+        projection: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Find all currently active passes (for hall monitor view).
 
         Args:
             limit: Maximum number of passes to return
+            projection: Fields to return (default: whole documents)
 
         Returns:
             List of active pass documents
         """
         return await self.find_many(
-            {"status": "active"},
+            _ACTIVE_PASS_QUERY,
             limit=limit,
-            sort=[("departed_at", -1)]
+            sort=_NEWEST_DEPARTURE_FIRST,
+            projection=projection
         )
 
     async def find_passes_by_student(
@@ -98,6 +229,62 @@ class PassRepository(BaseRepository):
             sort=[("requested_at", -1)]
         )
 
+    async def iter_active_passes_enriched(
+        self,
+        limit: int = 200,
+        batch_size: int = 50
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream active passes with student and location names and time remaining.
+
+        The joins and the time arithmetic run server-side in one
+        aggregation instead of a query per student and location. Like
+        iter_many, errors propagate to the caller, since passes may
+        already have been consumed.
+
+        Args:
+            limit: Maximum number of passes to return
+            batch_size: Passes fetched per round trip
+
+        Yields:
+            Active pass documents, newest departure first
+        """
+        pipeline = [
+            {"$match": _ACTIVE_PASS_QUERY},
+            {"$sort": dict(_NEWEST_DEPARTURE_FIRST)},
+            {"$limit": limit},
+            *_pass_enrichment_stages(with_student=True),
+            *_TIME_REMAINING_STAGES,
+        ]
+        async for pass_doc in self.collection.aggregate(pipeline, batchSize=batch_size):
+            yield pass_doc
+
+    async def find_passes_by_student_enriched(
+        self,
+        student_id: str,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Find a student's passes with location names attached.
+
+        Errors propagate to the caller, so a failed query is not shown
+        as an empty history.
+
+        Args:
+            student_id: Student user ID
+            limit: Maximum number of passes to return
+
+        Returns:
+            List of pass documents sorted by most recent
+        """
+        pipeline = [
+            {"$match": {"student_id": student_id}},
+            {"$sort": {"requested_at": -1}},
+            {"$limit": limit},
+            *_pass_enrichment_stages(with_student=False),
+        ]
+        return await self.collection.aggregate(pipeline).to_list(length=limit)
+
     async def find_passes_by_date_range(
         self,
         start_date: datetime,
@@ -126,6 +313,56 @@ class PassRepository(BaseRepository):
             sort=[("requested_at", -1)]
         )
 
+    async def get_request_preconditions(
+        self,
+        student_id: str,
+        destination_location_id: str,
+        max_capacity: Optional[int]
+    ) -> Dict[str, Any]:
+        """
+        Check a student's daily count and the destination's occupancy together.
+
+        Both are answered by one aggregation: an indexed $or match picks
+        the student's passes today and the passes active at the
+        destination, and a $facet splits them into the two counts.
+
+        Args:
+            student_id: Student user ID
+            destination_location_id: Destination location ID
+            max_capacity: Destination's max capacity (None for unlimited)
+
+        Returns:
+            Dict with "daily_count" (passes the student created today) and
+            "at_capacity" (whether the destination is full)
+        """
+        start_of_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        daily_match = {
+            "student_id": student_id,
+            "requested_at": {"$gte": start_of_day, "$lt": start_of_day + timedelta(days=1)}
+        }
+        branches = [daily_match]
+        facets = {"daily": [{"$match": daily_match}, {"$count": "n"}]}
+
+        # Unlimited or closed destinations need no occupancy count
+        count_occupancy = max_capacity is not None and max_capacity > 0
+        if count_occupancy:
+            occupancy_match = {"destination_location_id": destination_location_id, "status": "active"}
+            branches.append(occupancy_match)
+            # Counting stops at max_capacity passes
+            facets["occupancy"] = [{"$match": occupancy_match}, {"$limit": max_capacity}, {"$count": "n"}]
+
+        pipeline = [{"$match": {"$or": branches}}, {"$facet": facets}]
+        result = (await self.collection.aggregate(pipeline).to_list(length=1))[0]
+
+        def facet_count(name: str) -> int:
+            return result[name][0]["n"] if result.get(name) else 0
+
+        if count_occupancy:
+            at_capacity = facet_count("occupancy") >= max_capacity
+        else:
+            at_capacity = max_capacity is not None
+        return {"daily_count": facet_count("daily"), "at_capacity": at_capacity}
+
     async def count_daily_passes_for_student(
         self,
         student_id: str,
@@ -186,22 +423,44 @@ class PassRepository(BaseRepository):
         """
         return await self.update_one(pass_id, {"is_overtime": True})
 
-    async def end_pass(self, pass_id: str) -> bool:
+    async def mark_overdue_passes_overtime(self, now: datetime) -> int:
         """
-        End a pass (mark as completed).
+        Mark every active pass past its time limit as overtime in one update.
+
+        Args:
+            now: Time to measure elapsed time against
+
+        Returns:
+            Number of passes newly marked overtime
+        """
+        return await self.update_many(
+            {
+                "status": "active",
+                "is_overtime": {"$ne": True},
+                "departed_at": {"$ne": None},
+                "$expr": {"$gt": [_elapsed_minutes(now), _TIME_LIMIT]}
+            },
+            {"is_overtime": True}
+        )
+
+    async def end_pass(self, pass_id: str, student_id: str) -> Optional[Dict[str, Any]]:
+        """
+        End a student's active pass (mark as completed).
 
         Args:
             pass_id: Pass ID
+            student_id: Student user ID the pass must belong to
 
         Returns:
-            True if ended successfully
+            Updated pass, or None if no such active pass for the student
         """
-        return await self.update_one(pass_id, {
-            "status": "completed",
-            "returned_at": datetime.utcnow()
-        })
+        return await self.update_if(
+            pass_id,
+            {"student_id": student_id, "status": "active"},
+            {"status": "completed", "returned_at": datetime.utcnow()}
+        )
 
-    async def approve_pass(self, pass_id: str, approved_by: str) -> bool:
+    async def approve_pass(self, pass_id: str, approved_by: str) -> Optional[Dict[str, Any]]:
         """
         Approve a pending pass.
 
@@ -210,15 +469,20 @@ class PassRepository(BaseRepository):
             approved_by: User ID of approver
 
         Returns:
-            True if approved successfully
+            Updated pass, or None if no such pending pass
         """
-        return await self.update_one(pass_id, {
+        return await self.update_if(pass_id, {"status": "pending"}, {
             "status": "approved",
             "approved_by": approved_by,
             "approved_at": datetime.utcnow()
         })
 
-    async def deny_pass(self, pass_id: str, denied_by: str, reason: str = None) -> bool:
+    async def deny_pass(
+        self,
+        pass_id: str,
+        denied_by: str,
+        reason: str = None
+    ) -> Optional[Dict[str, Any]]:
         """
         Deny a pending pass.
 
@@ -228,7 +492,7 @@ class PassRepository(BaseRepository):
             reason: Optional reason for denial
 
         Returns:
-            True if denied successfully
+            Updated pass, or None if no such pending pass
         """
         update_data = {
             "status": "denied",
@@ -238,7 +502,7 @@ class PassRepository(BaseRepository):
         if reason:
             update_data["denial_reason"] = reason
 
-        return await self.update_one(pass_id, update_data)
+        return await self.update_if(pass_id, {"status": "pending"}, update_data)
 
 
 class LocationRepository(BaseRepository):
@@ -249,12 +513,37 @@ class LocationRepository(BaseRepository):
 
     async def find_active_locations(self) -> List[Dict[str, Any]]:
         """
-        Find all active locations.
+        Find all active locations, cached since locations rarely change.
 
         Returns:
             List of active location documents
         """
-        return await self.find_many({"is_active": True}, limit=200)
+        locations = CacheManager.get(ACTIVE_LOCATIONS_CACHE_KEY)
+        if locations is None:
+            locations = await self.find_many({"is_active": True}, limit=200)
+            CacheManager.set(ACTIVE_LOCATIONS_CACHE_KEY, locations, ttl=LOCATION_DOC_CACHE_TTL)
+        # Callers may modify the documents, so hand out copies
+        return [dict(location) for location in locations]
+
+    async def find_by_id_cached(self, location_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a location by ID, cached since locations rarely change.
+
+        Args:
+            location_id: Location ID
+
+        Returns:
+            Location document or None
+        """
+        cache_key = location_doc_cache_key(location_id)
+        location = CacheManager.get(cache_key)
+        if location is None:
+            location = await self.find_by_id(location_id)
+            if location is None:
+                return None
+            CacheManager.set(cache_key, location, ttl=LOCATION_DOC_CACHE_TTL)
+        # Callers may modify the document, so hand out a copy
+        return dict(location)
 
     async def find_by_type(self, location_type: str) -> List[Dict[str, Any]]:
         """
@@ -288,19 +577,29 @@ class LocationRepository(BaseRepository):
             "status": "active"
         })
 
-    async def is_location_at_capacity(self, location_id: str) -> bool:
+    async def get_max_capacity(self, location_id: str) -> Optional[int]:
         """
-        Check if a location is at max capacity.
+        Get a location's max capacity, cached since it rarely changes.
 
         Args:
             location_id: Location ID
 
         Returns:
-            True if at capacity, False otherwise
+            Max capacity, or None if unlimited or the location doesn't exist
         """
-        location = await self.find_by_id(location_id)
-        if not location or location.get("max_capacity") is None:
-            return False
+        cache_key = location_capacity_cache_key(location_id)
+        cached = CacheManager.get(cache_key)
+        if cached is not None:
+            return cached["max_capacity"]
 
-        active_count = await self.count_active_passes_for_location(location_id)
-        return active_count >= location["max_capacity"]
+        if not ObjectId.is_valid(location_id):
+            return None
+
+        location = await self.collection.find_one(
+            {"_id": _oid(location_id)},
+            {"max_capacity": 1}
+        )
+        max_capacity = location.get("max_capacity") if location else None
+        # Wrapped so an unlimited (None) capacity is still a cache hit
+        CacheManager.set(cache_key, {"max_capacity": max_capacity}, ttl=CAPACITY_CACHE_TTL)
+        return max_capacity
@@ -2,8 +2,8 @@
 
 from typing import Optional, List, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.repositories.base_repository import BaseRepository
-from bson import ObjectId
+from app.core.performance import invalidate_user_cache
+from app.repositories.base_repository import BaseRepository, _oid
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +15,50 @@ class UserRepository(BaseRepository):
     def __init__(self, db: AsyncIOMotorDatabase):
         super().__init__(db, "users")
 
+    async def update_one(
+        self,
+        id: str,
+        data: Dict[str, Any],
+        upsert: bool = False
+    ) -> bool:
+        """
+        Update a user by ID and drop their cached document.
+
+        Args:
+            id: User ID
+            data: Update data
+            upsert: Create document if it doesn't exist
+
+        Returns:
+            True if document was modified, False otherwise
+        """
+        result = await super().update_one(id, data, upsert)
+        invalidate_user_cache(id)
+        return result
+
+    async def update_if(
+        self,
+        id: str,
+        condition: Dict[str, Any],
+        data: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Conditionally update a user by ID and drop their cached document.
+
+        Args:
+            id: User ID
+            condition: Extra filter the user must match
+            data: Update data
+            projection: Fields to return (default: whole document)
+
+        Returns:
+            Updated user, or None if not found or the condition failed
+        """
+        result = await super().update_if(id, condition, data, projection)
+        invalidate_user_cache(id)
+        return result
+
     async def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
         Find a user by email address.
@@ -90,9 +134,10 @@ class UserRepository(BaseRepository):
         """
         try:
             result = await self.collection.update_one(
-                {"_id": ObjectId(user_id)},
+                {"_id": _oid(user_id)},
                 {"$addToSet": {"device_tokens": device_token}}
             )
+            invalidate_user_cache(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating device token for user {user_id}: {e}")
@@ -111,9 +156,10 @@ class UserRepository(BaseRepository):
         """
         try:
             result = await self.collection.update_one(
-                {"_id": ObjectId(user_id)},
+                {"_id": _oid(user_id)},
                 {"$pull": {"device_tokens": device_token}}
             )
+            invalidate_user_cache(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error removing device token for user {user_id}: {e}")
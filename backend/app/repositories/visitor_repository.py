@@ -2,12 +2,42 @@
 
 from typing import Optional, List, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.repositories.base_repository import BaseRepository
+from app.core.clock import request_now
+from app.core.performance import CacheManager
+from app.repositories.base_repository import BaseRepository, _lookup_by_id_string, _oid
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+WATCHLIST_CACHE_TTL = 30  # seconds
+
+# Equality-then-range compound indexes for pending pre-registrations
+_HOST_PENDING_BY_DATE_INDEX = [("host_user_id", 1), ("status", 1), ("expected_date", 1)]
+_PENDING_BY_DATE_INDEX = [("status", 1), ("expected_date", 1)]
+
+# Summary fields returned by the list finders; pass projection=None for
+# whole documents
+WATCHLIST_SUMMARY_PROJECTION = {
+    "first_name": 1, "last_name": 1, "id_number": 1,
+    "watchlist_reason": 1, "watchlist_added_at": 1,
+}
+VISIT_SUMMARY_PROJECTION = {
+    "visitor_id": 1, "host_user_id": 1, "purpose": 1, "badge_number": 1,
+    "checked_in_at": 1, "checked_out_at": 1,
+}
+PRE_REGISTRATION_SUMMARY_PROJECTION = {
+    "first_name": 1, "last_name": 1, "company": 1,
+    "expected_date": 1, "access_code": 1, "status": 1,
+}
+
+# Fields attached to each visit by find_active_visits_joined
+_VISITOR_JOIN_FIELDS = {"first_name": 1, "last_name": 1, "company": 1, "is_on_watchlist": 1}
+_HOST_JOIN_FIELDS = {"first_name": 1, "last_name": 1, "email": 1}
+
 
 class VisitorRepository(BaseRepository):
     """Repository for visitors collection operations"""
@@ -39,14 +69,66 @@ class VisitorRepository(BaseRepository):
         """
         return await self.find_one({"email": email.lower()})
 
-    async def find_watchlist_visitors(self) -> List[Dict[str, Any]]:
+    async def find_watchlist_visitors(
+        self,
+        projection: Optional[Dict[str, Any]] = WATCHLIST_SUMMARY_PROJECTION
+    ) -> List[Dict[str, Any]]:
         """
         Find all visitors on watchlist.
 
+        Args:
+            projection: Fields to return (None for whole documents)
+
         Returns:
             List of watchlist visitor documents
         """
-        return await self.find_many({"is_on_watchlist": True}, limit=500)
+        return await self.find_many({"is_on_watchlist": True}, limit=500, projection=projection)
+
+    async def watchlist_summary(self, recent_limit: int = 20) -> Dict[str, Any]:
+        """
+        Summarize the watchlist in one aggregation.
+
+        Counting by reason and picking the newest entries both happen
+        server-side, so only the summary is returned instead of every
+        watchlist document.
+
+        Args:
+            recent_limit: Number of most recently added visitors to include
+
+        Returns:
+            Dict with "by_reason" (reason -> count) and "recent" (newest
+            watchlist visitors first)
+        """
+        pipeline = [
+            {"$match": {"is_on_watchlist": True}},
+            {"$facet": {
+                "by_reason": [
+                    {"$group": {"_id": "$watchlist_reason", "count": {"$sum": 1}}}
+                ],
+                "recent": [
+                    {"$sort": {"watchlist_added_at": -1}},
+                    {"$limit": recent_limit},
+                    {"$project": {
+                        "_id": {"$toString": "$_id"},
+                        "first_name": 1,
+                        "last_name": 1,
+                        "watchlist_reason": 1,
+                        "watchlist_added_at": 1
+                    }}
+                ]
+            }}
+        ]
+        try:
+            result = await self.collection.aggregate(pipeline).to_list(length=1)
+        except Exception as e:
+            logger.error(f"Error summarizing watchlist: {e}")
+            return {"by_reason": {}, "recent": []}
+
+        facets = result[0] if result else {"by_reason": [], "recent": []}
+        return {
+            "by_reason": {group["_id"]: group["count"] for group in facets["by_reason"]},
+            "recent": facets["recent"]
+        }
 
     async def is_on_watchlist(self, visitor_id: str) -> bool:
         """
@@ -58,8 +140,18 @@ class VisitorRepository(BaseRepository):
         Returns:
             True if on watchlist
         """
-        visitor = await self.find_by_id(visitor_id)
-        return visitor.get("is_on_watchlist", False) if visitor else False
+        # Checked on every gate scan, so only the flag is cached, briefly
+        cache_key = f"watchlist:{visitor_id}"
+        cached = CacheManager.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if not ObjectId.is_valid(visitor_id):
+            return False
+        visitor = await self.find_one({"_id": _oid(visitor_id)}, {"is_on_watchlist": 1})
+        on_watchlist = visitor.get("is_on_watchlist", False) if visitor else False
+        CacheManager.set(cache_key, on_watchlist, ttl=WATCHLIST_CACHE_TTL)
+        return on_watchlist
 
     async def add_to_watchlist(self, visitor_id: str, reason: str) -> bool:
         """
@@ -72,11 +164,13 @@ class VisitorRepository(BaseRepository):
         Returns:
             True if added successfully
         """
-        return await self.update_one(visitor_id, {
+        updated = await self.update_one(visitor_id, {
             "is_on_watchlist": True,
             "watchlist_reason": reason,
-            "watchlist_added_at": datetime.utcnow()
+            "watchlist_added_at": request_now()
         })
+        CacheManager.delete(f"watchlist:{visitor_id}")
+        return updated
 
     async def remove_from_watchlist(self, visitor_id: str) -> bool:
         """
@@ -88,10 +182,12 @@ class VisitorRepository(BaseRepository):
         Returns:
             True if removed successfully
         """
-        return await self.update_one(visitor_id, {
+        updated = await self.update_one(visitor_id, {
             "is_on_watchlist": False,
             "watchlist_reason": None
         })
+        CacheManager.delete(f"watchlist:{visitor_id}")
+        return updated
 
 
 class VisitorLogRepository(BaseRepository):
@@ -100,19 +196,58 @@ class VisitorLogRepository(BaseRepository):
     def __init__(self, db: AsyncIOMotorDatabase):
         super().__init__(db, "visitor_logs")
 
-    async def find_active_visits(self) -> List[Dict[str, Any]]:
+    async def find_active_visits(
+        self,
+        projection: Optional[Dict[str, Any]] = VISIT_SUMMARY_PROJECTION
+    ) -> List[Dict[str, Any]]:
         """
         Find all active visitor visits (not checked out).
 
+        Args:
+            projection: Fields to return (None for whole documents)
+
         Returns:
             List of active visit log documents
         """
         return await self.find_many(
             {"checked_out_at": None},
             limit=200,
-            sort=[("checked_in_at", -1)]
+            sort=[("checked_in_at", -1)],
+            projection=projection
         )
 
+    async def find_active_visits_joined(self, limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        Find active visits with their visitor and host attached.
+
+        The joins run server-side in one aggregation instead of a
+        find_by_id per visit for the visitor and the host.
+
+        Args:
+            limit: Maximum number of visits to return
+
+        Returns:
+            List of visit log documents with "visitor" and "host" sub-documents
+            (None when the referenced document no longer exists)
+        """
+        pipeline = [
+            {"$match": {"checked_out_at": None}},
+            {"$sort": {"checked_in_at": -1}},
+            {"$limit": limit},
+            _lookup_by_id_string("visitors", "visitor_id", "visitor", _VISITOR_JOIN_FIELDS),
+            _lookup_by_id_string("users", "host_user_id", "host", _HOST_JOIN_FIELDS),
+            {"$addFields": {
+                "_id": {"$toString": "$_id"},
+                "visitor": {"$first": "$visitor"},
+                "host": {"$first": "$host"}
+            }}
+        ]
+        try:
+            return await self.collection.aggregate(pipeline).to_list(length=limit)
+        except Exception as e:
+            logger.error(f"Error finding joined active visits: {e}")
+            return []
+
     async def find_visits_by_visitor(
         self,
         visitor_id: str,
@@ -137,7 +272,8 @@ class VisitorLogRepository(BaseRepository):
     async def find_visits_by_host(
         self,
         host_user_id: str,
-        limit: int = 50
+        limit: int = 50,
+        projection: Optional[Dict[str, Any]] = VISIT_SUMMARY_PROJECTION
     ) -> List[Dict[str, Any]]:
         """
         Find visits hosted by a user.
@@ -145,6 +281,7 @@ class VisitorLogRepository(BaseRepository):
         Args:
             host_user_id: Host user ID
             limit: Maximum number of visits to return
+            projection: Fields to return (None for whole documents)
 
         Returns:
             List of visit log documents
@@ -152,7 +289,8 @@ class VisitorLogRepository(BaseRepository):
         return await self.find_many(
             {"host_user_id": host_user_id},
             limit=limit,
-            sort=[("checked_in_at", -1)]
+            sort=[("checked_in_at", -1)],
+            projection=projection
         )
 
     async def find_visits_by_date_range(
@@ -225,11 +363,60 @@ class VisitorLogRepository(BaseRepository):
             "host_user_id": host_user_id,
             "purpose": purpose,
             "badge_number": badge_number,
-            "checked_in_at": datetime.utcnow(),
+            "checked_in_at": request_now(),
             "checked_out_at": None
         }
         return await self.insert_one(visit_data)
 
+    async def check_in_if_absent(
+        self,
+        visitor_id: str,
+        host_user_id: str,
+        purpose: str,
+        badge_number: str = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Check a visitor in unless they already have an open visit.
+
+        The open-visit check and the insert are one upsert, so this replaces
+        find_active_visit_for_visitor followed by check_in_visitor.
+
+        Args:
+            visitor_id: Visitor ID
+            host_user_id: Host user ID
+            purpose: Visit purpose
+            badge_number: Optional badge number
+
+        Returns:
+            Created visit log document, or None if already checked in
+        """
+        now = request_now()
+        # A fresh _id tells our insert apart from an existing open visit
+        new_id = ObjectId()
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"visitor_id": visitor_id, "checked_out_at": None},
+                {"$setOnInsert": {
+                    "_id": new_id,
+                    "host_user_id": host_user_id,
+                    "purpose": purpose,
+                    "badge_number": badge_number,
+                    "checked_in_at": now,
+                    "created_at": now,
+                    "updated_at": now
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent check-in for the same visitor won the race
+            return None
+
+        if doc["_id"] != new_id:
+            return None
+        doc["_id"] = str(doc["_id"])
+        return doc
+
     async def check_out_visitor(self, visit_log_id: str) -> bool:
         """
         Mark visitor as checked out.
@@ -241,7 +428,7 @@ class VisitorLogRepository(BaseRepository):
             True if checked out successfully
         """
         return await self.update_one(visit_log_id, {
-            "checked_out_at": datetime.utcnow()
+            "checked_out_at": request_now()
         })
 
     async def count_active_visitors(self) -> int:
@@ -260,6 +447,35 @@ class VisitorPreRegistrationRepository(BaseRepository):
     def __init__(self, db: AsyncIOMotorDatabase):
         super().__init__(db, "visitor_pre_registrations")
 
+    async def bulk_create(self, pre_registrations: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Insert a group of pre-registrations in one round trip.
+
+        The insert is unordered, so one rejected document does not stop
+        the rest of the group.
+
+        Args:
+            pre_registrations: Pre-registration documents to insert
+
+        Returns:
+            Inserted IDs in input order, with None for any document the
+            server rejected
+        """
+        if not pre_registrations:
+            return []
+
+        now = request_now()
+        documents = [{"created_at": now, "updated_at": now, **doc} for doc in pre_registrations]
+        failed = set()
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            logger.error(f"{len(failed)} of {len(documents)} pre-registrations were rejected")
+
+        # insert_many assigns each document its _id before sending
+        return [None if i in failed else str(doc["_id"]) for i, doc in enumerate(documents)]
+
     async def find_by_access_code(self, access_code: str) -> Optional[Dict[str, Any]]:
         """
         Find pre-registration by access code.
@@ -275,7 +491,8 @@ class VisitorPreRegistrationRepository(BaseRepository):
     async def find_upcoming_by_host(
         self,
         host_user_id: str,
-        limit: int = 50
+        limit: int = 50,
+        projection: Optional[Dict[str, Any]] = PRE_REGISTRATION_SUMMARY_PROJECTION
     ) -> List[Dict[str, Any]]:
         """
         Find upcoming pre-registrations for a host.
@@ -283,6 +500,7 @@ class VisitorPreRegistrationRepository(BaseRepository):
         Args:
             host_user_id: Host user ID
             limit: Maximum number to return
+            projection: Fields to return (None for whole documents)
 
         Returns:
             List of pre-registration documents
@@ -290,11 +508,13 @@ class VisitorPreRegistrationRepository(BaseRepository):
         return await self.find_many(
             {
                 "host_user_id": host_user_id,
-                "expected_date": {"$gte": datetime.utcnow()},
-                "status": "pending"
+                "status": "pending",
+                "expected_date": {"$gte": request_now()}
             },
             limit=limit,
-            sort=[("expected_date", 1)]
+            sort=[("expected_date", 1)],
+            projection=projection,
+            hint=_HOST_PENDING_BY_DATE_INDEX
         )
 
     async def find_by_date(self, date: datetime) -> List[Dict[str, Any]]:
@@ -312,14 +532,15 @@ class VisitorPreRegistrationRepository(BaseRepository):
 
         return await self.find_many(
             {
+                "status": "pending",
                 "expected_date": {
                     "$gte": start_of_day,
                     "$lt": end_of_day
-                },
-                "status": "pending"
+                }
             },
             limit=200,
-            sort=[("expected_date", 1)]
+            sort=[("expected_date", 1)],
+            hint=_PENDING_BY_DATE_INDEX
         )
 
     async def mark_as_arrived(self, pre_reg_id: str, visit_log_id: str) -> bool:
@@ -336,7 +557,7 @@ class VisitorPreRegistrationRepository(BaseRepository):
         return await self.update_one(pre_reg_id, {
             "status": "arrived",
             "visit_log_id": visit_log_id,
-            "arrived_at": datetime.utcnow()
+            "arrived_at": request_now()
         })
 
     async def mark_as_cancelled(self, pre_reg_id: str, reason: str = None) -> bool:
@@ -352,7 +573,7 @@ class VisitorPreRegistrationRepository(BaseRepository):
         """
         update_data = {
             "status": "cancelled",
-            "cancelled_at": datetime.utcnow()
+            "cancelled_at": request_now()
         }
         if reason:
             update_data["cancellation_reason"] = reason
@@ -2,20 +2,25 @@
 
 from typing import Dict, Any, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
 from app.repositories.user_repository import UserRepository
+from app.core.performance import get_user_cached
 from app.core.exceptions import (
     ValidationException,
     UnauthorizedException,
     ConflictException,
     NotFoundException
 )
-from utils.auth import verify_password, get_password_hash, create_access_token
+from utils.auth import verify_password_async, get_password_hash_async, create_access_token
 from datetime import datetime
 import logging
 import re
 
 logger = logging.getLogger(__name__)
 
+# Compiled once; ASCII matching since the pattern only allows ASCII anyway
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', re.ASCII)
+
 
 class AuthService:
     """Service for authentication and user management operations"""
@@ -58,8 +63,8 @@ class AuthService:
             ValidationException: If validation fails
         """
         # Validate email format
-        email = email.lower().strip()
-        if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        email = email.strip().lower()
+        if not EMAIL_RE.match(email):
             raise ValidationException("Invalid email format")
 
         # Validate password strength
@@ -75,7 +80,7 @@ class AuthService:
             raise ValidationException(f"Invalid role. Must be one of: {', '.join(valid_roles)}")
 
         # Hash password
-        password_hash = get_password_hash(password)
+        password_hash = await get_password_hash_async(password)
 
         # Create user document
         user_data = {
@@ -94,15 +99,19 @@ class AuthService:
 
         try:
             user_id = await self.user_repo.insert_one(user_data)
-            logger.info(f"User registered successfully: {email} (role: {role})")
+            logger.info("User registered successfully: %s (role: %s)", email, role)
 
             # Return user without password
             user_data['_id'] = user_id
             user_data.pop('password_hash')
             return user_data
 
+        # A concurrent registration can pass the check above; the unique
+        # email index then rejects the second insert
+        except DuplicateKeyError as e:
+            raise ConflictException("Email already registered") from e
         except Exception as e:
-            logger.error(f"Error registering user {email}: {e}")
+            logger.error("Error registering user %s: %s", email, e)
             raise
 
     async def authenticate_user(self, email: str, password: str) -> Dict[str, Any]:
@@ -119,29 +128,29 @@ class AuthService:
         Raises:
             UnauthorizedException: If credentials are invalid or account is inactive
         """
-        email = email.lower().strip()
+        email = email.strip().lower()
 
         # Find user by email
         user = await self.user_repo.find_by_email(email)
 
         if not user:
-            logger.warning(f"Login attempt with non-existent email: {email}")
+            logger.warning("Login attempt with non-existent email: %s", email)
             raise UnauthorizedException("Invalid email or password")
 
         # Verify password
-        if not verify_password(password, user['password_hash']):
-            logger.warning(f"Failed login attempt for user: {email}")
+        if not await verify_password_async(password, user['password_hash']):
+            logger.warning("Failed login attempt for user: %s", email)
             raise UnauthorizedException("Invalid email or password")
 
         # Check if account is active
         if user.get('status') != 'active':
-            logger.warning(f"Login attempt for inactive account: {email}")
+            logger.warning("Login attempt for inactive account: %s", email)
             raise UnauthorizedException("Account is inactive or suspended")
 
         # Update last login timestamp
         await self.user_repo.update_last_login(user['_id'])
 
-        logger.info(f"User authenticated successfully: {email}")
+        logger.info("User authenticated successfully: %s", email)
 
         # Return user without password
         user.pop('password_hash')
@@ -177,7 +186,7 @@ class AuthService:
         Raises:
             NotFoundException: If user not found
         """
-        user = await self.user_repo.find_by_id(user_id)
+        user = await get_user_cached(self.db, user_id)
 
         if not user:
             raise NotFoundException("User not found")
@@ -205,11 +214,6 @@ class AuthService:
             NotFoundException: If user not found
             ValidationException: If validation fails
         """
-        # Verify user exists
-        user = await self.user_repo.find_by_id(user_id)
-        if not user:
-            raise NotFoundException("User not found")
-
         # Filter allowed fields
         allowed_fields = [
             'first_name', 'last_name', 'phone',
@@ -221,15 +225,16 @@ class AuthService:
         }
 
         if not filtered_data:
-            return user
+            return await self.get_user_by_id(user_id)
 
-        # Update user
-        await self.user_repo.update_one(user_id, filtered_data)
-        logger.info(f"User profile updated: {user_id}")
+        # Update and read back the user in one round trip
+        updated_user = await self.user_repo.update_if(
+            user_id, {}, filtered_data, projection={'password_hash': 0}
+        )
+        if not updated_user:
+            raise NotFoundException("User not found")
 
-        # Return updated user
-        updated_user = await self.user_repo.find_by_id(user_id)
-        updated_user.pop('password_hash', None)
+        logger.info("User profile updated: %s", user_id)
         return updated_user
 
     async def change_password(
@@ -255,22 +260,31 @@ class AuthService:
             ValidationException: If new password is invalid
         """
         # Get user with password hash
-        user = await self.user_repo.collection.find_one({"_id": user_id})
+        user = await self.user_repo.find_by_id(user_id)
         if not user:
             raise NotFoundException("User not found")
 
         # Verify old password
-        if not verify_password(old_password, user['password_hash']):
+        if not await verify_password_async(old_password, user['password_hash']):
             raise UnauthorizedException("Current password is incorrect")
 
         # Validate new password
         self._validate_password(new_password)
 
         # Hash and update password
-        new_password_hash = get_password_hash(new_password)
-        await self.user_repo.update_one(user_id, {'password_hash': new_password_hash})
+        new_password_hash = await get_password_hash_async(new_password)
+        # Only replace the hash that was just verified, so a concurrent
+        # change cannot be overwritten by a stale old password
+        changed = await self.user_repo.update_if(
+            user_id,
+            {'password_hash': user['password_hash']},
+            {'password_hash': new_password_hash},
+            projection={'_id': 1}
+        )
+        if not changed:
+            raise UnauthorizedException("Current password is incorrect")
 
-        logger.info(f"Password changed for user: {user_id}")
+        logger.info("Password changed for user: %s", user_id)
         return True
 
     async def deactivate_user(self, user_id: str) -> bool:
@@ -286,13 +300,14 @@ class AuthService:
         Raises:
             NotFoundException: If user not found
         """
-        user = await self.user_repo.find_by_id(user_id)
-        if not user:
+        deactivated = await self.user_repo.update_if(
+            user_id, {}, {'status': 'inactive'}, projection={'_id': 1}
+        )
+        if not deactivated:
             raise NotFoundException("User not found")
 
-        result = await self.user_repo.deactivate_user(user_id)
-        logger.info(f"User deactivated: {user_id}")
-        return result
+        logger.info("User deactivated: %s", user_id)
+        return True
 
     def _validate_password(self, password: str) -> None:
         """
@@ -307,11 +322,25 @@ class AuthService:
         if len(password) < 8:
             raise ValidationException('Password must be at least 8 characters long')
 
-        if not re.search(r'[A-Z]', password):
+        # One pass over the password instead of a regex search per class
+        has_upper = has_lower = has_digit = False
+        for c in password:
+            if 'A' <= c <= 'Z':
+                has_upper = True
+            elif 'a' <= c <= 'z':
+                has_lower = True
+            elif '0' <= c <= '9':
+                has_digit = True
+            else:
+                continue
+            if has_upper and has_lower and has_digit:
+                break
+
+        if not has_upper:
             raise ValidationException('Password must contain at least one uppercase letter')
 
-        if not re.search(r'[a-z]', password):
+        if not has_lower:
             raise ValidationException('Password must contain at least one lowercase letter')
 
-        if not re.search(r'[0-9]', password):
+        if not has_digit:
             raise ValidationException('Password must contain at least one number')
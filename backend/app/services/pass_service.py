@@ -2,6 +2,9 @@
 
 from typing import Dict, Any, List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from app.core.clock import request_now
+from app.core.performance import get_setting_cached
 from app.repositories.pass_repository import PassRepository, LocationRepository
 from app.repositories.user_repository import UserRepository
 from app.core.exceptions import (
@@ -9,11 +12,19 @@ from app.core.exceptions import (
     NotFoundException,
     BusinessLogicException
 )
-from datetime import datetime, timedelta
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# request_pass only checks that the student exists
+_EXISTS_PROJECTION = {"_id": 1}
+
+_OPEN_PASS_MESSAGE = (
+    "You already have an active or pending pass. "
+    "Please end your current pass before requesting a new one."
+)
+
 
 class PassService:
     """Service for hall pass operations"""
@@ -56,22 +67,36 @@ class PassService:
             NotFoundException: If location not found
             ValidationException: If validation fails
         """
+        # Validate time limit before spending any queries
+        if time_limit_minutes < 1 or time_limit_minutes > 60:
+            raise ValidationException("Time limit must be between 1 and 60 minutes")
+
+        # The precondition lookups are independent, so run them concurrently
+        (
+            student,
+            has_open_pass,
+            origin,
+            destination,
+            pass_checks,
+            max_daily_passes,
+        ) = await asyncio.gather(
+            self.user_repo.find_by_id(student_id, projection=_EXISTS_PROJECTION),
+            self.pass_repo.has_active_or_pending_pass(student_id),
+            self.location_repo.find_by_id_cached(origin_location_id),
+            self.location_repo.find_by_id_cached(destination_location_id),
+            self._get_pass_preconditions(student_id, destination_location_id),
+            self._get_setting('max_daily_passes', 5),
+        )
+
         # Validate student exists
-        student = await self.user_repo.find_by_id(student_id)
         if not student:
             raise NotFoundException("Student not found")
 
         # Check for existing active or pending pass
-        if await self.pass_repo.has_active_or_pending_pass(student_id):
-            raise BusinessLogicException(
-                "You already have an active or pending pass. "
-                "Please end your current pass before requesting a new one."
-            )
+        if has_open_pass:
+            raise BusinessLogicException(_OPEN_PASS_MESSAGE)
 
         # Validate locations exist
-        origin = await self.location_repo.find_by_id(origin_location_id)
-        destination = await self.location_repo.find_by_id(destination_location_id)
-
         if not origin:
             raise NotFoundException("Origin location not found")
         if not destination:
@@ -81,29 +106,24 @@ class PassService:
             raise BusinessLogicException("Destination location is not active")
 
         # Check location capacity
-        if await self.location_repo.is_location_at_capacity(destination_location_id):
+        if pass_checks['at_capacity']:
             raise BusinessLogicException(
                 f"{destination['name']} is currently at capacity. Please try again later."
             )
 
         # Check daily pass limit (default: 5 passes per day)
-        daily_count = await self.pass_repo.count_daily_passes_for_student(student_id)
-        max_daily_passes = await self._get_setting('max_daily_passes', 5)
-        if daily_count >= max_daily_passes:
+        if pass_checks['daily_count'] >= max_daily_passes:
             raise BusinessLogicException(
                 f"You have reached your daily pass limit of {max_daily_passes} passes."
             )
 
-        # Validate time limit
-        if time_limit_minutes < 1 or time_limit_minutes > 60:
-            raise ValidationException("Time limit must be between 1 and 60 minutes")
-
         # Create pass
-        now = datetime.utcnow()
+        now = request_now()
         pass_data = {
             'student_id': student_id,
             'origin_location_id': origin_location_id,
             'destination_location_id': destination_location_id,
+            'location_ids': [origin_location_id, destination_location_id],
             'status': 'active',  # Auto-approve for now
             'requested_at': now,
             'departed_at': now,  # Auto-depart
@@ -119,6 +139,10 @@ class PassService:
             pass_data['_id'] = pass_id
             return pass_data
 
+        # Two concurrent requests can both pass the check above; the
+        # one_open_pass_per_student index then rejects the second insert
+        except DuplicateKeyError as e:
+            raise BusinessLogicException(_OPEN_PASS_MESSAGE) from e
         except Exception as e:
             logger.error(f"Error creating pass for student {student_id}: {e}")
             raise
@@ -150,7 +174,12 @@ class PassService:
             NotFoundException: If pass not found
             BusinessLogicException: If pass doesn't belong to student or already ended
         """
-        # Get pass
+        ended = await self.pass_repo.end_pass(pass_id, student_id)
+        if ended:
+            logger.info(f"Pass ended: {pass_id}")
+            return ended
+
+        # The transition was refused; read the pass only to explain why
         pass_doc = await self.pass_repo.find_by_id(pass_id)
         if not pass_doc:
             raise NotFoundException("Pass not found")
@@ -159,16 +188,7 @@ class PassService:
         if pass_doc['student_id'] != student_id:
             raise BusinessLogicException("This pass does not belong to you")
 
-        # Check if pass is already ended
-        if pass_doc['status'] != 'active':
-            raise BusinessLogicException("This pass has already been ended")
-
-        # End pass
-        await self.pass_repo.end_pass(pass_id)
-        logger.info(f"Pass ended: {pass_id}")
-
-        # Return updated pass
-        return await self.pass_repo.find_by_id(pass_id)
+        raise BusinessLogicException("This pass has already been ended")
 
     async def get_all_active_passes(self) -> List[Dict[str, Any]]:
         """
@@ -177,33 +197,10 @@ class PassService:
         Returns:
             List of active pass documents with student and location info
         """
-        passes = await self.pass_repo.find_all_active_passes(limit=200)
-
-        # Enrich with student and location information
-        for pass_doc in passes:
-            # Get student info
-            student = await self.user_repo.find_by_id(pass_doc['student_id'])
-            if student:
-                pass_doc['student_name'] = f"{student.get('first_name', '')} {student.get('last_name', '')}"
-                pass_doc['student_email'] = student.get('email', '')
-
-            # Get location info
-            origin = await self.location_repo.find_by_id(pass_doc['origin_location_id'])
-            destination = await self.location_repo.find_by_id(pass_doc['destination_location_id'])
-
-            if origin:
-                pass_doc['origin_name'] = origin.get('name', 'Unknown')
-            if destination:
-                pass_doc['destination_name'] = destination.get('name', 'Unknown')
-
-            # Calculate time remaining
-            if pass_doc.get('departed_at'):
-                elapsed = (datetime.utcnow() - pass_doc['departed_at']).total_seconds() / 60
-                time_limit = pass_doc.get('time_limit_minutes', 5)
-                pass_doc['time_remaining_minutes'] = max(0, time_limit - elapsed)
-                pass_doc['is_overtime'] = elapsed > time_limit
-
-        return passes
+        return [
+            pass_doc
+            async for pass_doc in self.pass_repo.iter_active_passes_enriched(limit=200)
+        ]
 
     async def get_pass_history_for_student(
         self,
@@ -220,19 +217,7 @@ class PassService:
         Returns:
             List of pass documents with location info
         """
-        passes = await self.pass_repo.find_passes_by_student(student_id, limit)
-
-        # Enrich with location information
-        for pass_doc in passes:
-            origin = await self.location_repo.find_by_id(pass_doc['origin_location_id'])
-            destination = await self.location_repo.find_by_id(pass_doc['destination_location_id'])
-
-            if origin:
-                pass_doc['origin_name'] = origin.get('name', 'Unknown')
-            if destination:
-                pass_doc['destination_name'] = destination.get('name', 'Unknown')
-
-        return passes
+        return await self.pass_repo.find_passes_by_student_enriched(student_id, limit)
 
     async def approve_pass(self, pass_id: str, approver_id: str) -> Dict[str, Any]:
         """
@@ -249,17 +234,14 @@ class PassService:
             NotFoundException: If pass not found
             BusinessLogicException: If pass is not pending
         """
-        pass_doc = await self.pass_repo.find_by_id(pass_id)
-        if not pass_doc:
-            raise NotFoundException("Pass not found")
+        updated = await self.pass_repo.approve_pass(pass_id, approver_id)
+        if updated:
+            logger.info(f"Pass approved: {pass_id} by {approver_id}")
+            return updated
 
-        if pass_doc['status'] != 'pending':
-            raise BusinessLogicException("Only pending passes can be approved")
-
-        await self.pass_repo.approve_pass(pass_id, approver_id)
-        logger.info(f"Pass approved: {pass_id} by {approver_id}")
-
-        return await self.pass_repo.find_by_id(pass_id)
+        if not await self.pass_repo.find_by_id(pass_id):
+            raise NotFoundException("Pass not found")
+        raise BusinessLogicException("Only pending passes can be approved")
 
     async def deny_pass(
         self,
@@ -282,17 +264,14 @@ class PassService:
             NotFoundException: If pass not found
             BusinessLogicException: If pass is not pending
         """
-        pass_doc = await self.pass_repo.find_by_id(pass_id)
-        if not pass_doc:
-            raise NotFoundException("Pass not found")
+        updated = await self.pass_repo.deny_pass(pass_id, denier_id, reason)
+        if updated:
+            logger.info(f"Pass denied: {pass_id} by {denier_id}")
+            return updated
 
-        if pass_doc['status'] != 'pending':
-            raise BusinessLogicException("Only pending passes can be denied")
-
-        await self.pass_repo.deny_pass(pass_id, denier_id, reason)
-        logger.info(f"Pass denied: {pass_id} by {denier_id}")
-
-        return await self.pass_repo.find_by_id(pass_id)
+        if not await self.pass_repo.find_by_id(pass_id):
+            raise NotFoundException("Pass not found")
+        raise BusinessLogicException("Only pending passes can be denied")
 
     async def get_active_locations(self) -> List[Dict[str, Any]]:
         """
@@ -311,20 +290,35 @@ class PassService:
         Returns:
             Number of passes marked as overtime
         """
-        active_passes = await self.pass_repo.find_all_active_passes(limit=500)
-        overtime_count = 0
+        # One server-side update instead of reading every active pass
+        overtime_count = await self.pass_repo.mark_overdue_passes_overtime(request_now())
+        if overtime_count:
+            logger.warning(f"Passes marked overtime: {overtime_count}")
 
-        for pass_doc in active_passes:
-            if pass_doc.get('departed_at') and not pass_doc.get('is_overtime'):
-                elapsed = (datetime.utcnow() - pass_doc['departed_at']).total_seconds() / 60
-                time_limit = pass_doc.get('time_limit_minutes', 5)
+        return overtime_count
 
-                if elapsed > time_limit:
-                    await self.pass_repo.mark_pass_overtime(pass_doc['_id'])
-                    overtime_count += 1
-                    logger.warning(f"Pass marked overtime: {pass_doc['_id']}")
+    async def _get_pass_preconditions(
+        self,
+        student_id: str,
+        destination_location_id: str
+    ) -> Dict[str, Any]:
+        """
+        Get the student's daily pass count and whether the destination is full.
 
-        return overtime_count
+        Args:
+            student_id: Student user ID
+            destination_location_id: Destination location ID
+
+        Returns:
+            Dict with "daily_count" and "at_capacity"
+        """
+        # Cached, so usually no query before the aggregation
+        max_capacity = await self.location_repo.get_max_capacity(destination_location_id)
+        return await self.pass_repo.get_request_preconditions(
+            student_id,
+            destination_location_id,
+            max_capacity
+        )
 
     async def _get_setting(self, key: str, default: Any) -> Any:
         """
@@ -338,8 +332,7 @@ class PassService:
             Setting value
         """
         try:
-            setting = await self.db.app_settings.find_one({"key": key})
-            return setting.get("value", default) if setting else default
+            return await get_setting_cached(self.db, key, default)
         except Exception as e:
             logger.error(f"Error getting setting {key}: {e}")
             return default
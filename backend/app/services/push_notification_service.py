@@ -1,14 +1,28 @@
 """Push Notification Service for Firebase Cloud Messaging and Apple Push Notifications"""
 
+import asyncio
 import logging
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.batch_writer import notification_log_writer
 
 logger = logging.getLogger(__name__)
 
+# Maximum provider (FCM/APNs) requests in flight at once, to stay within
+# their rate limits
+MAX_CONCURRENT_SENDS = 50
+_send_slots = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+
+# Most tokens FCM accepts in one multicast request
+FCM_MULTICAST_LIMIT = 500
+
+# Users whose tokens send_to_users fetches and sends to in one batch
+USER_FANOUT_CHUNK = 500
+
 
 class NotificationPriority(str, Enum):
     """Notification priority levels"""
@@ -47,6 +61,12 @@ class DeviceToken(BaseModel):
     app_version: Optional[str] = None
 
 
+async def _limited(send, *args):
+    """Await a provider call once one of the MAX_CONCURRENT_SENDS slots is free"""
+    async with _send_slots:
+        return await send(*args)
+
+
 class PushNotificationService:
     """
     Push notification service supporting Firebase Cloud Messaging and APNs.
@@ -222,6 +242,24 @@ class PushNotificationService:
 
         return tokens
 
+    async def _get_tokens_for_users(self, user_ids: List[str]) -> Dict[str, List[dict]]:
+        """
+        Get the active device tokens of several users in one query.
+
+        Args:
+            user_ids: User IDs
+
+        Returns:
+            Token documents grouped by user ID; users without tokens are absent
+        """
+        tokens_by_user: Dict[str, List[dict]] = {}
+        async for token in self.device_tokens_collection.find(
+            {'user_id': {'$in': user_ids}, 'is_active': True},
+            {'user_id': 1, 'token': 1, 'platform': 1}
+        ):
+            tokens_by_user.setdefault(token['user_id'], []).append(token)
+        return tokens_by_user
+
     async def send_to_user(
         self,
         user_id: str,
@@ -245,20 +283,14 @@ class PushNotificationService:
 
         results = {'sent': 0, 'failed': 0, 'errors': []}
 
-        for token_doc in tokens:
-            try:
-                success = await self._send_notification(
-                    token=token_doc['token'],
-                    platform=token_doc['platform'],
-                    notification=notification
-                )
-                if success:
-                    results['sent'] += 1
-                else:
-                    results['failed'] += 1
-            except Exception as e:
+        for outcome in await self._send_to_tokens(tokens, notification):
+            if isinstance(outcome, Exception):
+                results['failed'] += 1
+                results['errors'].append(str(outcome))
+            elif outcome:
+                results['sent'] += 1
+            else:
                 results['failed'] += 1
-                results['errors'].append(str(e))
 
         # Log the notification
         await self._log_notification(
@@ -286,12 +318,43 @@ class PushNotificationService:
         """
         total_results = {'sent': 0, 'failed': 0, 'users_notified': 0}
 
-        for user_id in user_ids:
-            result = await self.send_to_user(user_id, notification)
-            total_results['sent'] += result.get('sent', 0)
-            total_results['failed'] += result.get('failed', 0)
-            if result.get('sent', 0) > 0:
-                total_results['users_notified'] += 1
+        # Chunked so a broadcast never holds more than one chunk of users'
+        # tokens in memory
+        for start in range(0, len(user_ids), USER_FANOUT_CHUNK):
+            chunk = user_ids[start:start + USER_FANOUT_CHUNK]
+            tokens_by_user = await self._get_tokens_for_users(chunk)
+            if not tokens_by_user:
+                continue
+
+            # One token list for the whole chunk, so FCM multicasts span users
+            owners = []
+            tokens = []
+            for user_id, user_tokens in tokens_by_user.items():
+                owners.extend([user_id] * len(user_tokens))
+                tokens.extend(user_tokens)
+
+            results = {'sent': 0, 'failed': 0, 'errors': []}
+            notified = set()
+            outcomes = await self._send_to_tokens(tokens, notification)
+            for user_id, outcome in zip(owners, outcomes):
+                if isinstance(outcome, Exception):
+                    results['failed'] += 1
+                    results['errors'].append(str(outcome))
+                elif outcome:
+                    results['sent'] += 1
+                    notified.add(user_id)
+                else:
+                    results['failed'] += 1
+
+            await self._log_notification(
+                user_ids=list(tokens_by_user),
+                notification=notification,
+                results=results
+            )
+
+            total_results['sent'] += results['sent']
+            total_results['failed'] += results['failed']
+            total_results['users_notified'] += len(notified)
 
         return total_results
 
@@ -351,61 +414,89 @@ class PushNotificationService:
 
         return await self.send_to_users(user_ids, notification)
 
-    async def _send_notification(
+    async def _send_to_tokens(
         self,
-        token: str,
-        platform: str,
+        tokens: List[dict],
         notification: PushNotification
-    ) -> bool:
+    ) -> List[Any]:
         """
-        Send a notification to a specific device.
+        Send a notification to many devices with as few provider calls as possible.
+
+        Android and web tokens go to FCM in multicast batches of up to
+        FCM_MULTICAST_LIMIT. APNs has no batch call, so each iOS token is
+        its own request, multiplexed over the client's HTTP/2 connection.
+        All provider calls run concurrently, at most MAX_CONCURRENT_SENDS
+        at a time.
 
         Args:
-            token: Device token
-            platform: Device platform (ios, android, web)
+            tokens: Device token documents
             notification: Notification payload
 
         Returns:
-            True if sent successfully, False otherwise
+            One outcome per token, in input order: True if sent, False if
+            not, or the exception raised while sending
         """
-        # This is where actual push notification sending would happen
-        # For now, we log the notification as a placeholder
-
-        if platform in [DevicePlatform.ANDROID, DevicePlatform.WEB]:
-            return await self._send_fcm(token, notification)
-        elif platform == DevicePlatform.IOS:
-            return await self._send_apns(token, notification)
-        else:
-            logger.warning(f"Unknown platform: {platform}")
-            return False
-
-    async def _send_fcm(self, token: str, notification: PushNotification) -> bool:
-        """Send notification via Firebase Cloud Messaging"""
+        outcomes: List[Any] = [False] * len(tokens)
+        fcm_positions = []
+        sends = []
+        send_positions = []
+
+        for position, token_doc in enumerate(tokens):
+            platform = token_doc['platform']
+            if platform in [DevicePlatform.ANDROID, DevicePlatform.WEB]:
+                fcm_positions.append(position)
+            elif platform == DevicePlatform.IOS:
+                sends.append(_limited(self._send_apns, token_doc['token'], notification))
+                send_positions.append([position])
+            else:
+                logger.warning(f"Unknown platform: {platform}")
+
+        for start in range(0, len(fcm_positions), FCM_MULTICAST_LIMIT):
+            chunk = fcm_positions[start:start + FCM_MULTICAST_LIMIT]
+            chunk_tokens = [tokens[position]['token'] for position in chunk]
+            sends.append(_limited(self._send_fcm_multicast, chunk_tokens, notification))
+            send_positions.append(chunk)
+
+        sent = await asyncio.gather(*sends, return_exceptions=True)
+        for positions, result in zip(send_positions, sent):
+            if isinstance(result, Exception) or isinstance(result, bool):
+                result = [result] * len(positions)
+            for position, outcome in zip(positions, result):
+                outcomes[position] = outcome
+
+        return outcomes
+
+    async def _send_fcm_multicast(
+        self,
+        tokens: List[str],
+        notification: PushNotification
+    ) -> List[bool]:
+        """Send notification to up to FCM_MULTICAST_LIMIT devices via one FCM request"""
         if not self._fcm_initialized:
             # Log the notification for debugging/testing
             logger.info(
-                f"[FCM - Not Configured] Would send to {token[:20]}...: "
+                f"[FCM - Not Configured] Would send to {len(tokens)} devices: "
                 f"'{notification.title}' - '{notification.body}'"
             )
             # Return True to simulate success for testing
-            return True
+            return [True] * len(tokens)
 
         # Actual FCM sending code would go here:
-        # message = messaging.Message(
+        # message = messaging.MulticastMessage(
         #     notification=messaging.Notification(
         #         title=notification.title,
         #         body=notification.body,
         #         image=notification.image_url
         #     ),
         #     data=notification.data,
-        #     token=token,
+        #     tokens=tokens,
         #     android=messaging.AndroidConfig(
         #         priority='high' if notification.priority in [NotificationPriority.HIGH, NotificationPriority.CRITICAL] else 'normal'
         #     )
         # )
-        # response = messaging.send(message)
-        # return bool(response)
-        return True
+        # batch = await asyncio.to_thread(messaging.send_each_for_multicast, message)
+        # return [response.success for response in batch.responses]
+        return [True] * len(tokens)
 
     async def _send_apns(self, token: str, notification: PushNotification) -> bool:
         """Send notification via Apple Push Notification Service"""
@@ -443,8 +534,8 @@ class PushNotificationService:
         notification: PushNotification,
         results: dict
     ) -> None:
-        """Log a notification for audit purposes"""
-        await self.notification_logs_collection.insert_one({
+        """Log a notification for audit purposes, batched with other log writes"""
+        await notification_log_writer.write(self.db, {
             'user_ids': user_ids,
             'title': notification.title,
             'body': notification.body,
@@ -457,12 +548,32 @@ class PushNotificationService:
 
 # Notification Templates
 
+# Fully static templates, built once
+_EMERGENCY_ENDED = PushNotification(
+    title="Emergency Cleared",
+    body="The emergency situation has been resolved. Resume normal activities.",
+    priority=NotificationPriority.HIGH,
+    data={'type': 'emergency_ended'},
+    category='emergency'
+)
+
+# Distinct parameter sets remembered per parameterized template
+TEMPLATE_CACHE_SIZE = 1024
+
+
 class NotificationTemplates:
-    """Pre-defined notification templates for common events"""
+    """
+    Pre-defined notification templates for common events.
+
+    Templates are built from trusted internal values, so they skip model
+    validation, and repeat calls with the same arguments return the same
+    cached notification. Treat returned notifications as read-only.
+    """
 
     @staticmethod
+    @lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
     def pass_approved(student_name: str, destination: str) -> PushNotification:
-        return PushNotification(
+        return PushNotification.model_construct(
             title="Pass Approved",
             body=f"Your hall pass to {destination} has been approved.",
             priority=NotificationPriority.HIGH,
@@ -471,11 +582,12 @@ class NotificationTemplates:
         )
 
     @staticmethod
+    @lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
     def pass_rejected(reason: Optional[str] = None) -> PushNotification:
         body = "Your hall pass request has been denied."
         if reason:
             body += f" Reason: {reason}"
-        return PushNotification(
+        return PushNotification.model_construct(
             title="Pass Denied",
             body=body,
             priority=NotificationPriority.NORMAL,
@@ -484,8 +596,9 @@ class NotificationTemplates:
         )
 
     @staticmethod
+    @lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
     def pass_overtime(minutes: int) -> PushNotification:
-        return PushNotification(
+        return PushNotification.model_construct(
             title="Pass Overtime",
             body=f"Your hall pass is {minutes} minutes overtime. Please return immediately.",
             priority=NotificationPriority.HIGH,
@@ -494,8 +607,9 @@ class NotificationTemplates:
         )
 
     @staticmethod
+    @lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
     def emergency_alert(alert_type: str, instructions: str) -> PushNotification:
-        return PushNotification(
+        return PushNotification.model_construct(
             title=f"EMERGENCY: {alert_type.upper()}",
             body=instructions,
             priority=NotificationPriority.CRITICAL,
@@ -506,17 +620,12 @@ class NotificationTemplates:
 
     @staticmethod
     def emergency_ended() -> PushNotification:
-        return PushNotification(
-            title="Emergency Cleared",
-            body="The emergency situation has been resolved. Resume normal activities.",
-            priority=NotificationPriority.HIGH,
-            data={'type': 'emergency_ended'},
-            category='emergency'
-        )
+        return _EMERGENCY_ENDED
 
     @staticmethod
+    @lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
     def visitor_arrival(visitor_name: str, purpose: str) -> PushNotification:
-        return PushNotification(
+        return PushNotification.model_construct(
             title="Visitor Arrived",
             body=f"{visitor_name} has arrived. Purpose: {purpose}",
             priority=NotificationPriority.NORMAL,
@@ -526,7 +635,9 @@ class NotificationTemplates:
 
     @staticmethod
     def new_announcement(title: str, preview: str) -> PushNotification:
-        return PushNotification(
+        # Announcements are one-off text, so caching them would only evict
+        # reusable entries
+        return PushNotification.model_construct(
             title=title,
             body=preview[:100] + "..." if len(preview) > 100 else preview,
             priority=NotificationPriority.NORMAL,
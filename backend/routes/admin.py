@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from app.core.database import get_database
+from app.core.performance import invalidate_location_cache
 from utils.dependencies import get_current_active_user, require_role
 from models.users import UserRole
 from models.passes import Location, LocationCreate
@@ -267,6 +268,7 @@ async def create_location(
     
     result = await db.locations.insert_one(new_location)
     new_location['_id'] = str(result.inserted_id)
+    invalidate_location_cache(new_location['_id'])
     
     return new_location
 
@@ -294,6 +296,7 @@ async def update_location(
         {'_id': ObjectId(location_id)},
         {'$set': update_data}
     )
+    invalidate_location_cache(location_id)
     
     location.update(update_data)
     location['_id'] = str(location['_id'])
@@ -319,6 +322,7 @@ async def delete_location(
         {'_id': ObjectId(location_id)},
         {'$set': {'is_active': False, 'updated_at': datetime.utcnow()}}
     )
+    invalidate_location_cache(location_id)
     
     return {"message": "Location deactivated successfully"}
 
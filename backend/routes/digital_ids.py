@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
 from pydantic import BaseModel
 from datetime import datetime
+from app.core.batch_writer import scan_log_writer
 from app.core.database import get_database
 from utils.dependencies import get_current_active_user, require_role
 from models.digital_ids import DigitalID, DigitalIDCreate, PhotoStatus
@@ -158,7 +159,7 @@ async def scan_id(
         'purpose': 'verification',
         'created_at': datetime.utcnow()
     }
-    await db.id_scan_logs.insert_one(scan_log)
+    await scan_log_writer.write(db, scan_log)
 
     return {
         'valid': True,
@@ -4,6 +4,7 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from typing import List, Optional
 from datetime import datetime, time as dt_time
 from app.core.database import get_database
+from app.core.performance import invalidate_location_cache
 from utils.dependencies import require_role, get_current_active_user
 from models.users import UserRole
 from pydantic import BaseModel
@@ -328,6 +329,7 @@ async def update_location_capacity(
             'updated_at': datetime.utcnow()
         }}
     )
+    invalidate_location_cache(location_id)
     
     return {"message": "Location capacity updated successfully"}
 
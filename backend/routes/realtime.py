@@ -47,7 +47,7 @@ async def get_active_rooms(
     Get active rooms and their member counts (Admin only).
     """
     rooms_info = {}
-    for room_name, sessions in manager.rooms.items():
+    for room_name, sessions in manager.get_rooms().items():
         rooms_info[room_name] = {
             'connections': len(sessions),
             'session_ids': list(sessions)[:10]  # Limit for privacy
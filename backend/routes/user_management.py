@@ -4,11 +4,13 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.core.database import get_database
+from app.core.performance import invalidate_user_cache
+from utils.auth import get_password_hash_async
 from utils.dependencies import require_role
 from models.users import UserRole
 from pydantic import BaseModel, EmailStr
 from bson import ObjectId
-import bcrypt
+import asyncio
 
 router = APIRouter(prefix='/admin/users', tags=['User Management'])
 
@@ -140,6 +142,7 @@ async def update_user(
             {'_id': ObjectId(user_id)},
             {'$set': update_data}
         )
+        invalidate_user_cache(user_id)
     
     updated_user = await db.users.find_one({'_id': ObjectId(user_id)})
     
@@ -183,6 +186,7 @@ async def deactivate_user(
         {'_id': ObjectId(user_id)},
         {'$set': {'status': 'inactive', 'updated_at': datetime.utcnow()}}
     )
+    invalidate_user_cache(user_id)
     
     # Also deactivate their digital ID
     await db.digital_ids.update_one(
@@ -213,6 +217,7 @@ async def activate_user(
         {'_id': ObjectId(user_id)},
         {'$set': {'status': 'active', 'updated_at': datetime.utcnow()}}
     )
+    invalidate_user_cache(user_id)
     
     # Also activate their digital ID
     await db.digital_ids.update_one(
@@ -241,10 +246,7 @@ async def reset_user_password(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Hash the new password
-    hashed_password = bcrypt.hashpw(
-        password_data.new_password.encode('utf-8'),
-        bcrypt.gensalt()
-    ).decode('utf-8')
+    hashed_password = await get_password_hash_async(password_data.new_password)
     
     await db.users.update_one(
         {'_id': ObjectId(user_id)},
@@ -253,6 +255,7 @@ async def reset_user_password(
             'updated_at': datetime.utcnow()
         }}
     )
+    invalidate_user_cache(user_id)
     
     return {"message": "Password reset successfully"}
 
@@ -267,20 +270,24 @@ async def get_user_statistics(
     
     Available to: Admin only
     """
-    total_users = await db.users.count_documents({})
-    active_users = await db.users.count_documents({'status': 'active'})
-    inactive_users = await db.users.count_documents({'status': 'inactive'})
-    
-    users_by_role = {}
-    for role in ['student', 'parent', 'staff', 'admin']:
-        count = await db.users.count_documents({'role': role, 'status': 'active'})
-        users_by_role[role] = count
-    
-    # Recent registrations (last 7 days)
+    roles = ['student', 'parent', 'staff', 'admin']
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_registrations = await db.users.count_documents({
-        'created_at': {'$gte': seven_days_ago}
-    })
+
+    # The counts are independent, so run them concurrently over the pool
+    (
+        total_users,  # Collection metadata is enough for an unfiltered total
+        active_users,
+        inactive_users,
+        recent_registrations,  # Recent registrations (last 7 days)
+        *role_counts
+    ) = await asyncio.gather(
+        db.users.estimated_document_count(),
+        db.users.count_documents({'status': 'active'}),
+        db.users.count_documents({'status': 'inactive'}),
+        db.users.count_documents({'created_at': {'$gte': seven_days_ago}}),
+        *(db.users.count_documents({'role': role, 'status': 'active'}) for role in roles)
+    )
+    users_by_role = dict(zip(roles, role_counts))
     
     return {
         'total_users': total_users,
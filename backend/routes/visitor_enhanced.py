@@ -4,10 +4,12 @@ from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.core.database import get_database
+from app.repositories.visitor_repository import VisitorPreRegistrationRepository
 from utils.dependencies import require_role, get_current_active_user
 from models.users import UserRole
 from pydantic import BaseModel, EmailStr
 from bson import ObjectId
+import asyncio
 import base64
 import io
 from reportlab.lib.pagesizes import letter
@@ -17,6 +19,9 @@ import qrcode
 
 router = APIRouter(prefix='/visitors/enhanced', tags=['Visitor Management Enhanced'])
 
+# Largest group accepted by one bulk pre-registration request
+MAX_BULK_PRE_REGISTRATIONS = 500
+
 
 # ============================================
 # MODELS
@@ -100,6 +105,44 @@ async def pre_register_visitor(
     }
 
 
+@router.post('/pre-register/bulk')
+async def pre_register_visitors_bulk(
+    visitors: List[VisitorPreRegistration],
+    current_user: dict = Depends(get_current_active_user),
+    db = Depends(get_database)
+):
+    """
+    Pre-register a group of visitors (a class, a delegation) in one request.
+    
+    Available to: All authenticated users (for their own guests)
+    """
+    if len(visitors) > MAX_BULK_PRE_REGISTRATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_PRE_REGISTRATIONS} visitors can be pre-registered at once"
+        )
+    
+    created_by = str(current_user['_id'])
+    pre_registrations = [
+        {
+            **visitor.dict(),
+            'status': 'pending',
+            'created_by': created_by,
+            'checked_in': False
+        }
+        for visitor in visitors
+    ]
+    ids = await VisitorPreRegistrationRepository(db).bulk_create(pre_registrations)
+    created = [pre_reg_id for pre_reg_id in ids if pre_reg_id]
+    
+    return {
+        "ids": ids,
+        "created": len(created),
+        "failed": len(ids) - len(created),
+        "message": f"{len(created)} visitors pre-registered successfully"
+    }
+
+
 @router.get('/pre-registrations')
 async def get_pre_registrations(
     date: Optional[str] = None,
@@ -441,12 +484,15 @@ async def get_visitor_analytics(
             '$lte': datetime.fromisoformat(end_date)
         }
     
-    total_visitors = await db.visitors.count_documents(query)
-    active_visitors = await db.visitors.count_documents({**query, 'status': 'active'})
-    
-    # Pre-registrations
-    total_pre_reg = await db.visitor_pre_registrations.count_documents({})
-    checked_in_from_pre_reg = await db.visitor_pre_registrations.count_documents({'checked_in': True})
+    # Unfiltered totals come from collection metadata instead of a count scan;
+    # the counts are independent, so run them concurrently
+    total_visitors, active_visitors, total_pre_reg, checked_in_from_pre_reg = await asyncio.gather(
+        db.visitors.count_documents(query) if query else db.visitors.estimated_document_count(),
+        db.visitors.count_documents({**query, 'status': 'active'}),
+        # Pre-registrations
+        db.visitor_pre_registrations.estimated_document_count(),
+        db.visitor_pre_registrations.count_documents({'checked_in': True})
+    )
     
     # Average visit duration
     completed_visits = await db.visitors.find({
@@ -1,6 +1,6 @@
 from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, APIRouter, Request, status
+from fastapi import FastAPI, APIRouter, Depends, Request, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 import logging
@@ -8,16 +8,23 @@ from pathlib import Path
 
 # Import core modules
 from app.core.config import settings
+from app.core.batch_writer import notification_log_writer, scan_log_writer
+from app.core.clock import RequestClockMiddleware
 from app.core.database import db
 from app.core.exceptions import AppException
+from app.core.log_queue import configure_logging
+from app.core.performance import CacheManager
+
+from models.users import UserRole
+from utils.dependencies import require_role
 
 # Import routes
 from routes import auth, digital_ids, passes, emergency, notifications, visitors, admin, user_management, pass_advanced, visitor_enhanced, emergency_checkin
 
 # Configure logging
-logging.basicConfig(
+configure_logging(
     level=logging.DEBUG if settings.DEBUG else logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
@@ -30,6 +37,8 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     try:
         await db.connect()
+        scan_log_writer.start(db.db)
+        notification_log_writer.start(db.db)
         logger.info("API startup complete")
     except Exception as e:
         logger.error(f"Failed to start API: {e}")
@@ -39,6 +48,8 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down API...")
+    await scan_log_writer.stop()
+    await notification_log_writer.stop()
     await db.close()
     logger.info("API shutdown complete")
 
@@ -92,6 +103,18 @@ async def health_check():
         )
 
 
+@api_router.get("/health/cache")
+async def cache_health():
+    """In-process cache occupancy, for sizing the LRU bound"""
+    return CacheManager.stats()
+
+
+@api_router.get("/health/db-pool", dependencies=[Depends(require_role(UserRole.ADMIN))])
+async def db_pool_health():
+    """MongoDB connection pool limits and topology, for pool sizing (admin only)"""
+    return db.pool_stats()
+
+
 # Include all route modules
 api_router.include_router(auth.router)
 api_router.include_router(digital_ids.router)
@@ -117,6 +140,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Give every write in a request the same timestamp
+app.add_middleware(RequestClockMiddleware)
+
 
 # Global exception handler for custom exceptions
 @app.exception_handler(AppException)
@@ -128,7 +154,7 @@ async def app_exception_handler(request: Request, exc: AppException):
         content={
             "error": exc.message,
             "status_code": exc.status_code,
-            "details": exc.details,
+            "details": exc.details or {},
             "timestamp": datetime.utcnow().isoformat()
         }
     )
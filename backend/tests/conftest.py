@@ -21,21 +21,43 @@ class AsyncMockCollection:
         result = self.collection.insert_one(*args, **kwargs)
         return MagicMock(inserted_id=result.inserted_id)
 
+    async def insert_many(self, *args, **kwargs):
+        return self.collection.insert_many(*args, **kwargs)
+
     async def update_one(self, *args, **kwargs):
         return self.collection.update_one(*args, **kwargs)
         
+    async def bulk_write(self, *args, **kwargs):
+        return self.collection.bulk_write(*args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        return self.collection.update_many(*args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return self.collection.find_one_and_update(*args, **kwargs)
+
+    async def distinct(self, *args, **kwargs):
+        return self.collection.distinct(*args, **kwargs)
+
     async def count_documents(self, *args, **kwargs):
         return self.collection.count_documents(*args, **kwargs)
+
+    async def estimated_document_count(self, *args, **kwargs):
+        return self.collection.estimated_document_count(*args, **kwargs)
         
     def find(self, *args, **kwargs):
         cursor = self.collection.find(*args, **kwargs)
         return AsyncMockCursor(cursor)
+
+    def aggregate(self, *args, **kwargs):
+        cursor = self.collection.aggregate(*args, **kwargs)
+        return AsyncMockCursor(cursor)
         
-    def create_indexes(self, *args, **kwargs):
-        # AsyncMock to simulate await
-        async def _create(*a, **kw):
-            pass
-        return _create()
+    async def create_indexes(self, *args, **kwargs):
+        return self.collection.create_indexes(*args, **kwargs)
+
+    async def index_information(self, *args, **kwargs):
+        return self.collection.index_information(*args, **kwargs)
 
 class AsyncMockCursor:
     def __init__(self, cursor):
@@ -50,6 +72,24 @@ class AsyncMockCursor:
         except StopIteration:
             raise StopAsyncIteration
             
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, *args, **kwargs):
+        self.cursor = self.cursor.skip(*args, **kwargs)
+        return self
+
+    def limit(self, *args, **kwargs):
+        self.cursor = self.cursor.limit(*args, **kwargs)
+        return self
+
+    def batch_size(self, *args, **kwargs):
+        return self
+
+    def hint(self, *args, **kwargs):
+        return self
+
     def to_list(self, length=None):
         async def _to_list(*args, **kwargs):
             return list(self.cursor)
@@ -90,3 +130,15 @@ def mock_mongo():
     database.db.close = mock_close
 
     return mock_db_instance
+
+
+@pytest.fixture
+def anyio_backend():
+    """Run async tests on asyncio only."""
+    return "asyncio"
+
+
+@pytest.fixture
+def isolated_db():
+    """A fresh mock database for tests that build their own indexes."""
+    return AsyncMockDatabase(mongomock.MongoClient().aisj_connect)
@@ -5,6 +5,10 @@ Tests for JWT auth, registration, login, and role-based access control.
 
 from fastapi.testclient import TestClient
 from server import app
+from app.core.exceptions import ConflictException, UnauthorizedException, ValidationException
+from app.services.auth_service import AuthService
+from utils.auth import create_access_token, get_password_hash_async, verify_password_async
+from pymongo import ASCENDING, IndexModel
 import pytest
 import uuid
 
@@ -218,3 +222,107 @@ class TestRoleBasedAccess:
         response = client.get("/api/emergency/templates", headers=headers)
         assert response.status_code == 200
         assert isinstance(response.json(), list)
+
+    def test_db_pool_health_requires_admin(self, staff_token, mock_mongo):
+        """Test the pool stats, which list server addresses, are admin only."""
+        assert client.get("/api/health/db-pool").status_code in [401, 403]
+        headers = {"Authorization": f"Bearer {staff_token}"}
+        assert client.get("/api/health/db-pool", headers=headers).status_code == 403
+
+        # Admins cannot self-register, so create one directly
+        admin = mock_mongo.users.collection.insert_one({
+            "email": f"admin_{uuid.uuid4().hex[:8]}@example.com",
+            "role": "admin",
+            "status": "active",
+        })
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(admin.inserted_id)})}"}
+        assert client.get("/api/health/db-pool", headers=headers).status_code == 200
+
+
+class TestPasswordValidation:
+    """Test suite for password strength rules."""
+
+    @pytest.mark.parametrize("password,message", [
+        ("Short1A", "at least 8 characters"),
+        ("lowercase123", "uppercase"),
+        ("UPPERCASE123", "lowercase"),
+        ("NoDigitsHere", "number"),
+    ])
+    def test_weak_passwords_rejected(self, password, message):
+        """Test each missing character class is reported."""
+        with pytest.raises(ValidationException, match=message):
+            AuthService._validate_password(None, password)
+
+    def test_strong_password_accepted(self):
+        """Test a password meeting every rule passes."""
+        AuthService._validate_password(None, "SecurePass123!")
+
+    @pytest.mark.anyio
+    async def test_offloaded_hash_round_trip(self):
+        """Test hashing and verifying on the thread pool agree."""
+        hashed = await get_password_hash_async("SecurePass123!")
+        assert await verify_password_async("SecurePass123!", hashed)
+        assert not await verify_password_async("WrongPass123!", hashed)
+
+
+class TestAuthServiceRegistration:
+    """Test suite for AuthService duplicate email handling."""
+
+    async def _service(self, db):
+        await db.users.create_indexes([IndexModel([("email", ASCENDING)], unique=True)])
+        return AuthService(db)
+
+    @pytest.mark.anyio
+    async def test_duplicate_email_conflicts(self, isolated_db):
+        """Test registering an existing email raises a 409 conflict."""
+        service = await self._service(isolated_db)
+        await service.register_user("dup@example.com", "SecurePass123!", "First", "User", "staff")
+
+        with pytest.raises(ConflictException) as exc_info:
+            await service.register_user("Dup@Example.com", "SecurePass123!", "Second", "User", "staff")
+        assert exc_info.value.status_code == 409
+
+    @pytest.mark.anyio
+    async def test_unique_index_rejects_racing_registration(self, isolated_db, monkeypatch):
+        """Test the unique index catches a duplicate that slipped past the check."""
+        service = await self._service(isolated_db)
+        await service.register_user("race@example.com", "SecurePass123!", "First", "User", "staff")
+
+        async def email_free(_email):
+            return False
+        monkeypatch.setattr(service.user_repo, "email_exists", email_free)
+
+        with pytest.raises(ConflictException) as exc_info:
+            await service.register_user("race@example.com", "SecurePass123!", "Second", "User", "staff")
+        assert exc_info.value.status_code == 409
+        assert await isolated_db.users.count_documents({"email": "race@example.com"}) == 1
+
+
+class TestAuthServiceUpdates:
+    """Test suite for AuthService profile and password updates."""
+
+    @pytest.mark.anyio
+    async def test_update_profile_returns_updated_user(self, mock_mongo):
+        """Test the profile update returns the new values without the hash."""
+        service = AuthService(mock_mongo)
+        user = await service.register_user(
+            f"profile_{uuid.uuid4().hex[:8]}@example.com", "SecurePass123!", "Old", "Name", "staff"
+        )
+
+        updated = await service.update_user_profile(user["_id"], {"first_name": "New", "role": "admin"})
+        assert updated["first_name"] == "New"
+        assert updated["role"] == "staff"
+        assert "password_hash" not in updated
+
+    @pytest.mark.anyio
+    async def test_change_password(self, mock_mongo):
+        """Test the password changes only with the correct current password."""
+        service = AuthService(mock_mongo)
+        email = f"pw_{uuid.uuid4().hex[:8]}@example.com"
+        user = await service.register_user(email, "SecurePass123!", "Pass", "Word", "staff")
+
+        with pytest.raises(UnauthorizedException):
+            await service.change_password(user["_id"], "WrongPass123!", "NewSecure456!")
+
+        assert await service.change_password(user["_id"], "SecurePass123!", "NewSecure456!")
+        assert (await service.authenticate_user(email, "NewSecure456!"))["email"] == email
@@ -0,0 +1,73 @@
+"""
+Batch Loader Tests
+Tests for coalescing concurrent lookups into batched fetches.
+"""
+
+import asyncio
+import pytest
+from app.core.batch_loader import BatchLoader
+
+
+class TestBatchLoader:
+    """Test suite for BatchLoader."""
+
+    @pytest.mark.anyio
+    async def test_concurrent_loads_share_one_fetch(self):
+        """Test loads in the same tick are fetched together, once per key."""
+        calls = []
+
+        async def fetch(keys):
+            calls.append(sorted(keys))
+            return {key: key.upper() for key in keys if key != "missing"}
+
+        loader = BatchLoader(fetch)
+        results = await asyncio.gather(
+            loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing")
+        )
+
+        assert results == ["A", "B", "A", None]
+        assert calls == [["a", "b", "missing"]]
+
+        assert await loader.load("c") == "C"
+        assert len(calls) == 2
+
+    @pytest.mark.anyio
+    async def test_fetch_errors_reach_every_caller(self):
+        """Test a failed fetch raises in each waiting load."""
+        async def fetch(keys):
+            raise RuntimeError("database unavailable")
+
+        loader = BatchLoader(fetch)
+        results = await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    @pytest.mark.anyio
+    async def test_bad_fetch_result_reaches_every_caller(self):
+        """Test an error while settling results does not leave loads waiting."""
+        async def fetch(keys):
+            return [key.upper() for key in keys]
+
+        loader = BatchLoader(fetch)
+        results = await asyncio.wait_for(
+            asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True), timeout=1
+        )
+        assert all(isinstance(result, AttributeError) for result in results)
+        assert not loader._tasks
+
+    @pytest.mark.anyio
+    async def test_cancelled_fetch_cancels_waiting_loads(self):
+        """Test cancelling an in-flight fetch cancels its loads."""
+        started = asyncio.Event()
+
+        async def fetch(keys):
+            started.set()
+            await asyncio.sleep(10)
+
+        loader = BatchLoader(fetch)
+        load = asyncio.ensure_future(loader.load("a"))
+        await started.wait()
+        for task in list(loader._tasks):
+            task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(load, timeout=1)
@@ -0,0 +1,77 @@
+"""
+Batch Writer Tests
+Tests for buffered background inserts.
+"""
+
+import asyncio
+import pytest
+from app.core.batch_writer import BatchWriter
+
+
+class RecordingCollection:
+    """Collection stub that records insert calls."""
+
+    def __init__(self):
+        self.batches = []
+        self.single = []
+
+    async def insert_many(self, documents, ordered=True):
+        self.batches.append(list(documents))
+
+    async def insert_one(self, document):
+        self.single.append(document)
+
+
+class TestBatchWriter:
+    """Test suite for BatchWriter."""
+
+    @pytest.mark.anyio
+    async def test_writes_are_batched(self):
+        """Test buffered documents are inserted together."""
+        collection = RecordingCollection()
+        db = {"logs": collection}
+        writer = BatchWriter("logs", max_batch=10, max_delay=0.05)
+        writer.start(db)
+
+        for i in range(3):
+            await writer.write(db, {"n": i})
+        await asyncio.sleep(0.1)
+
+        assert collection.batches == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+        await writer.stop()
+
+    @pytest.mark.anyio
+    async def test_batches_respect_max_size(self):
+        """Test a full batch is flushed without waiting for the delay."""
+        collection = RecordingCollection()
+        db = {"logs": collection}
+        writer = BatchWriter("logs", max_batch=2, max_delay=10)
+        writer.start(db)
+
+        for i in range(3):
+            await writer.write(db, {"n": i})
+        await writer.stop()
+
+        assert collection.batches == [[{"n": 0}, {"n": 1}], [{"n": 2}]]
+
+    @pytest.mark.anyio
+    async def test_stop_flushes_buffer(self):
+        """Test stopping flushes documents still buffered."""
+        collection = RecordingCollection()
+        db = {"logs": collection}
+        writer = BatchWriter("logs", max_delay=10)
+        writer.start(db)
+
+        await writer.write(db, {"n": 1})
+        await writer.stop()
+
+        assert collection.batches == [[{"n": 1}]]
+        assert not writer.running
+
+    @pytest.mark.anyio
+    async def test_writes_directly_when_not_running(self):
+        """Test documents are inserted immediately if the writer is stopped."""
+        collection = RecordingCollection()
+        await BatchWriter("logs").write({"logs": collection}, {"n": 1})
+        assert collection.single == [{"n": 1}]
+        assert collection.batches == []
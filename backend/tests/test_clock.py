@@ -0,0 +1,54 @@
+"""
+Clock Tests
+Tests for cached and request-scoped UTC timestamps.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from app.core import clock
+from app.core.clock import (
+    RequestClockMiddleware,
+    request_now,
+    reset_request_clock,
+    start_request_clock,
+    utcnow_cached,
+)
+
+
+class TestClock:
+    """Test suite for the timestamp helpers."""
+
+    def test_utcnow_cached_is_naive_utc(self):
+        """Test cached timestamps are naive and match the wall clock."""
+        now = utcnow_cached()
+        assert now.tzinfo is None
+        assert abs(datetime.utcnow() - now) < timedelta(seconds=1)
+
+    def test_request_now_is_fixed_within_request(self):
+        """Test every call in a request sees the time the request started."""
+        token = start_request_clock()
+        try:
+            first = request_now()
+            assert request_now() is first
+        finally:
+            reset_request_clock(token)
+
+    def test_request_now_outside_request(self):
+        """Test request_now falls back to the current time."""
+        assert abs(datetime.utcnow() - request_now()) < timedelta(seconds=1)
+
+    @pytest.mark.anyio
+    async def test_middleware_fixes_clock_for_http_only(self):
+        """Test the middleware sets the request clock for HTTP scopes and resets it."""
+        seen = {}
+
+        async def app(scope, receive, send):
+            seen[scope["type"]] = clock._request_now.get()
+
+        middleware = RequestClockMiddleware(app)
+        await middleware({"type": "http"}, None, None)
+        await middleware({"type": "lifespan"}, None, None)
+
+        assert isinstance(seen["http"], datetime)
+        assert seen["lifespan"] is None
+        assert clock._request_now.get() is None
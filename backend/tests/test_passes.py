@@ -0,0 +1,81 @@
+"""
+Tests for hall pass business rules.
+"""
+import pytest
+
+from app.core.clock import reset_request_clock, start_request_clock
+from app.core.database import ONE_OPEN_PASS_INDEX
+from app.core.exceptions import BusinessLogicException
+from app.services.pass_service import PassService
+
+
+class TestRequestPass:
+    """Test suite for requesting passes."""
+
+    async def _setup(self, db):
+        await db.passes.create_indexes([ONE_OPEN_PASS_INDEX])
+        student = await db.users.insert_one({"first_name": "Pat", "role": "student"})
+        origin = await db.locations.insert_one({"name": "Room 101", "is_active": True})
+        destination = await db.locations.insert_one({"name": "Library", "is_active": True})
+        return str(student.inserted_id), str(origin.inserted_id), str(destination.inserted_id)
+
+    @pytest.mark.anyio
+    async def test_second_open_pass_rejected(self, isolated_db):
+        """Test a student with an open pass cannot request another."""
+        student_id, origin_id, destination_id = await self._setup(isolated_db)
+        service = PassService(isolated_db)
+
+        await service.request_pass(student_id, origin_id, destination_id)
+        with pytest.raises(BusinessLogicException):
+            await service.request_pass(student_id, origin_id, destination_id)
+
+        assert await isolated_db.passes.count_documents({"student_id": student_id}) == 1
+
+    @pytest.mark.anyio
+    async def test_pass_timestamps_share_the_request_clock(self, isolated_db):
+        """Test a new pass's request, departure and creation times are one timestamp."""
+        student_id, origin_id, destination_id = await self._setup(isolated_db)
+        token = start_request_clock()
+        try:
+            await PassService(isolated_db).request_pass(student_id, origin_id, destination_id)
+        finally:
+            reset_request_clock(token)
+
+        stored = await isolated_db.passes.find_one({"student_id": student_id})
+        assert stored["requested_at"] == stored["departed_at"] == stored["created_at"]
+
+    @pytest.mark.anyio
+    async def test_unique_index_rejects_racing_request(self, isolated_db, monkeypatch):
+        """Test the unique index catches a request that slipped past the check."""
+        student_id, origin_id, destination_id = await self._setup(isolated_db)
+        service = PassService(isolated_db)
+        await service.request_pass(student_id, origin_id, destination_id)
+
+        async def no_open_pass(_student_id):
+            return False
+        monkeypatch.setattr(service.pass_repo, "has_active_or_pending_pass", no_open_pass)
+
+        with pytest.raises(BusinessLogicException):
+            await service.request_pass(student_id, origin_id, destination_id)
+
+        assert await isolated_db.passes.count_documents({"student_id": student_id}) == 1
+
+
+class TestActivePasses:
+    """Test suite for the hall monitor's active pass listing."""
+
+    @pytest.mark.anyio
+    async def test_get_all_active_passes_collects_stream(self, isolated_db, monkeypatch):
+        """Test the listing collects the enriched stream, capped at 200."""
+        service = PassService(isolated_db)
+        requested = {}
+
+        async def fake_stream(limit=200, batch_size=50):
+            requested["limit"] = limit
+            for n in range(3):
+                yield {"_id": str(n), "student_name": f"Student {n}"}
+        monkeypatch.setattr(service.pass_repo, "iter_active_passes_enriched", fake_stream)
+
+        passes = await service.get_all_active_passes()
+        assert [pass_doc["_id"] for pass_doc in passes] == ["0", "1", "2"]
+        assert requested["limit"] == 200
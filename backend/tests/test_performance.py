@@ -0,0 +1,270 @@
+"""
+Performance Utilities Tests
+Tests for the in-memory cache, query helpers, and endpoint metrics.
+"""
+
+import pytest
+from unittest.mock import MagicMock
+from cachetools import TLRUCache
+from app.core import database, performance
+from app.core.database import _MISSING_LOCATION_IDS
+from app.core.performance import (
+    CacheManager,
+    PerformanceMonitor,
+    PASS_LIST_PROJECTION,
+    build_pass_filter,
+    build_pass_query,
+    build_user_filter,
+    build_user_query,
+    get_location_name,
+    get_setting_cached,
+    get_user_cached,
+    invalidate_setting_cache,
+    invalidate_user_cache,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Start every test with an empty cache."""
+    CacheManager.clear()
+    yield
+    CacheManager.clear()
+
+
+class TestCacheManager:
+    """Test suite for CacheManager."""
+
+    def test_set_and_get(self):
+        """Test a cached value can be read back."""
+        CacheManager.set("key", {"a": 1})
+        assert CacheManager.get("key") == {"a": 1}
+
+    def test_missing_key_returns_none(self):
+        """Test reading an unknown key returns None."""
+        assert CacheManager.get("missing") is None
+
+    def test_delete(self):
+        """Test deleting a cached value."""
+        CacheManager.set("key", "value")
+        CacheManager.delete("key")
+        assert CacheManager.get("key") is None
+
+    def test_stats_report_size_and_bound(self):
+        """Test stats report entry count and the LRU bound."""
+        CacheManager.set("a", 1)
+        CacheManager.set("b", 2)
+        assert CacheManager.stats() == {"size": 2, "maxsize": performance._cache.maxsize}
+
+    def test_evicts_beyond_maxsize(self, monkeypatch):
+        """Test the cache evicts entries instead of growing without bound."""
+        monkeypatch.setattr(
+            performance,
+            "_cache",
+            TLRUCache(maxsize=2, ttu=performance._entry_expiry)
+        )
+        for key in ("a", "b", "c"):
+            CacheManager.set(key, key)
+        assert CacheManager.stats()["size"] == 2
+        assert CacheManager.get("c") == "c"
+
+    def test_per_key_ttl_is_honored(self, monkeypatch):
+        """Test each entry expires after its own TTL."""
+        now = [1000.0]
+        monkeypatch.setattr(
+            performance,
+            "_cache",
+            TLRUCache(maxsize=100, ttu=performance._entry_expiry, timer=lambda: now[0])
+        )
+
+        CacheManager.set("short", "s", ttl=10)
+        CacheManager.set("default", "d")
+
+        now[0] += 11
+        assert CacheManager.get("short") is None
+        assert CacheManager.get("default") == "d"
+
+        now[0] += CacheManager.DEFAULT_TTL
+        assert CacheManager.get("default") is None
+
+
+class TestPerformanceMonitor:
+    """Test suite for PerformanceMonitor."""
+
+    def test_stats_for_recorded_endpoint(self):
+        """Test aggregate statistics for one endpoint."""
+        for duration in (10.0, 20.0, 30.0):
+            PerformanceMonitor.record("/stats-test", duration)
+
+        stats = PerformanceMonitor.get_stats("/stats-test")
+        assert stats["count"] == 3
+        assert stats["avg_ms"] == 20.0
+        assert stats["min_ms"] == 10.0
+        assert stats["max_ms"] == 30.0
+
+    def test_aggregates_cover_all_samples(self):
+        """Test aggregates are exact while percentile samples stay bounded."""
+        for i in range(PerformanceMonitor.MAX_SAMPLES + 50):
+            PerformanceMonitor.record("/bounded-test", float(i))
+
+        stats = PerformanceMonitor.get_stats("/bounded-test")
+        assert stats["count"] == PerformanceMonitor.MAX_SAMPLES + 50
+        assert stats["min_ms"] == 0.0
+        assert stats["max_ms"] == float(PerformanceMonitor.MAX_SAMPLES + 49)
+        # Percentiles come from the most recent MAX_SAMPLES values (50..1049)
+        assert stats["p50_ms"] == 549.0
+        assert stats["p95_ms"] == 999.0
+
+    def test_reset(self):
+        """Test reset discards recorded metrics."""
+        PerformanceMonitor.record("/reset-test", 5.0)
+        PerformanceMonitor.reset()
+        assert PerformanceMonitor.get_stats() == {}
+
+    def test_unknown_endpoint(self):
+        """Test statistics for an endpoint with no samples."""
+        assert PerformanceMonitor.get_stats("/never-called") == {
+            "endpoint": "/never-called",
+            "count": 0,
+        }
+
+
+class TestLocationCache:
+    """Test suite for cached location name lookups."""
+
+    @pytest.mark.anyio
+    async def test_get_location_name_caches_single_location(self, mock_mongo):
+        """Test a location name is fetched once and then served from cache."""
+        result = await mock_mongo.locations.insert_one({"name": "Cache Test Room"})
+        location_id = str(result.inserted_id)
+
+        assert await get_location_name(mock_mongo, location_id) == "Cache Test Room"
+
+        mock_mongo.locations.collection.update_one(
+            {"_id": result.inserted_id}, {"$set": {"name": "Renamed"}}
+        )
+        assert await get_location_name(mock_mongo, location_id) == "Cache Test Room"
+
+    @pytest.mark.anyio
+    async def test_get_location_name_invalid_id(self, mock_mongo):
+        """Test an invalid location ID returns None without querying."""
+        assert await get_location_name(mock_mongo, "not-an-id") is None
+
+
+class TestUserCache:
+    """Test suite for cached user lookups."""
+
+    @pytest.mark.anyio
+    async def test_user_is_cached_until_invalidated(self, mock_mongo):
+        """Test a user is read once and re-read after invalidation."""
+        result = await mock_mongo.users.insert_one({"first_name": "Cached", "status": "active"})
+        user_id = str(result.inserted_id)
+
+        user = await get_user_cached(mock_mongo, user_id)
+        assert user["_id"] == user_id
+
+        mock_mongo.users.collection.update_one(
+            {"_id": result.inserted_id}, {"$set": {"status": "inactive"}}
+        )
+        assert (await get_user_cached(mock_mongo, user_id))["status"] == "active"
+
+        invalidate_user_cache(user_id)
+        assert (await get_user_cached(mock_mongo, user_id))["status"] == "inactive"
+
+    @pytest.mark.anyio
+    async def test_callers_get_independent_copies(self, mock_mongo):
+        """Test modifying a returned user does not change the cached one."""
+        result = await mock_mongo.users.insert_one({"first_name": "Copy", "password_hash": "x"})
+        user_id = str(result.inserted_id)
+
+        (await get_user_cached(mock_mongo, user_id)).pop("password_hash")
+        assert (await get_user_cached(mock_mongo, user_id))["password_hash"] == "x"
+
+    @pytest.mark.anyio
+    async def test_unknown_or_invalid_user(self, mock_mongo):
+        """Test missing and malformed IDs return None."""
+        assert await get_user_cached(mock_mongo, "not-an-id") is None
+        assert await get_user_cached(mock_mongo, "0" * 24) is None
+
+
+class TestSettingCache:
+    """Test suite for cached app setting lookups."""
+
+    @pytest.mark.anyio
+    async def test_setting_is_cached_until_invalidated(self, mock_mongo):
+        """Test a setting is read once and re-read after invalidation."""
+        await mock_mongo.app_settings.insert_one({"key": "cache_test_limit", "value": 5})
+        assert await get_setting_cached(mock_mongo, "cache_test_limit", 1) == 5
+
+        mock_mongo.app_settings.collection.update_one(
+            {"key": "cache_test_limit"}, {"$set": {"value": 8}}
+        )
+        assert await get_setting_cached(mock_mongo, "cache_test_limit", 1) == 5
+
+        invalidate_setting_cache("cache_test_limit")
+        assert await get_setting_cached(mock_mongo, "cache_test_limit", 1) == 8
+
+    @pytest.mark.anyio
+    async def test_missing_setting_uses_callers_default(self, mock_mongo):
+        """Test a missing setting is cached but each caller gets its own default."""
+        assert await get_setting_cached(mock_mongo, "cache_test_missing", 3) == 3
+        assert await get_setting_cached(mock_mongo, "cache_test_missing", 4) == 4
+
+
+class TestQueryFilters:
+    """Test suite for query filter builders."""
+
+    def test_user_search_is_escaped_prefix_match(self):
+        """Test user search input is escaped and anchored."""
+        query = build_user_filter(role="student", search="a.b+")
+        assert query["role"] == "student"
+        assert query["$or"][0] == {"first_name": {"$regex": r"^a\.b\+", "$options": "i"}}
+        assert len(query["$or"]) == 3
+
+    def test_pass_location_filter_uses_location_ids(self):
+        """Test filtering passes by location matches either endpoint."""
+        query = build_pass_filter(status="active", location_id="loc1")
+        assert query == {"status": "active", "location_ids": "loc1"}
+
+    @pytest.mark.anyio
+    async def test_location_ids_backfill(self, mock_mongo, monkeypatch):
+        """Test the startup backfill updates only passes without location_ids."""
+        marker = "location-ids-backfill"
+        await mock_mongo.passes.insert_many([
+            {"marker": marker, "origin_location_id": "old-o", "destination_location_id": "old-d"},
+            {"marker": marker, "origin_location_id": "new-o", "destination_location_id": "new-d",
+             "location_ids": ["new-o", "new-d"]},
+        ])
+        old = await mock_mongo.passes.find({**_MISSING_LOCATION_IDS, "marker": marker}).to_list(None)
+        assert [doc["origin_location_id"] for doc in old] == ["old-o"]
+
+        # mongomock cannot evaluate array expressions, so check the update sent
+        calls = []
+
+        async def record_update_many(query, update):
+            calls.append((query, update))
+            return MagicMock(modified_count=1)
+        monkeypatch.setattr(mock_mongo.passes, "update_many", record_update_many)
+
+        await database.db._backfill_pass_location_ids()
+        assert calls == [(
+            {"location_ids": {"$exists": False}},
+            [{"$set": {"location_ids": ["$origin_location_id", "$destination_location_id"]}}],
+        )]
+
+    def test_pass_list_query_projects_and_hints(self):
+        """Test listing queries project fields and hint the compound index."""
+        spec = build_pass_query(student_id="s1", status="active", for_list=True)
+        assert spec.filter == {"student_id": "s1", "status": "active"}
+        assert spec.projection == PASS_LIST_PROJECTION
+        assert spec.hint == [("student_id", 1), ("status", 1)]
+
+        spec = build_pass_query(status="active")
+        assert spec.projection is None
+        assert spec.hint is None
+
+    def test_user_query_strips_secrets(self):
+        """Test user queries exclude password hashes and refresh tokens."""
+        spec = build_user_query(role="student")
+        assert spec.filter == {"role": "student"}
+        assert spec.projection == {"password_hash": 0, "refresh_tokens": 0}
@@ -0,0 +1,537 @@
+"""
+Repository Tests
+Tests for the shared repository data-access layer.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from pymongo.errors import OperationFailure
+from app.repositories.base_repository import BaseRepository, _lookup_by_id_string, _oid
+from app.repositories.emergency_repository import EmergencyCheckInRepository
+from app.repositories.notification_repository import NotificationReceiptRepository, NotificationRepository
+from app.core.performance import CacheManager, invalidate_location_cache
+from app.repositories.pass_repository import (
+    LocationRepository,
+    PassRepository,
+    _TIME_LIMIT,
+    _elapsed_minutes,
+    _pass_enrichment_stages,
+    _time_remaining_stages,
+)
+from app.repositories.visitor_repository import (
+    VisitorLogRepository,
+    VisitorPreRegistrationRepository,
+    VisitorRepository,
+)
+
+
+class TestBaseRepository:
+    """Test suite for BaseRepository."""
+
+    @pytest.mark.anyio
+    async def test_find_by_id(self, mock_mongo):
+        """Test a document is found by its string ID."""
+        result = await mock_mongo.repo_items.insert_one({"name": "Item"})
+        repo = BaseRepository(mock_mongo, "repo_items")
+
+        document = await repo.find_by_id(str(result.inserted_id))
+        assert document["name"] == "Item"
+        assert document["_id"] == str(result.inserted_id)
+
+    @pytest.mark.anyio
+    async def test_find_by_invalid_id_returns_none(self, mock_mongo):
+        """Test an invalid ID returns None without querying."""
+        repo = BaseRepository(mock_mongo, "repo_items")
+        assert await repo.find_by_id("not-an-id") is None
+
+    @pytest.mark.anyio
+    async def test_find_by_ids(self, mock_mongo):
+        """Test several documents are fetched by ID in one call."""
+        first = await mock_mongo.by_ids.insert_one({"name": "first"})
+        second = await mock_mongo.by_ids.insert_one({"name": "second"})
+
+        repo = BaseRepository(mock_mongo, "by_ids")
+        found = await repo.find_by_ids([str(first.inserted_id), str(second.inserted_id), "bad-id"])
+        assert {doc_id: doc["name"] for doc_id, doc in found.items()} == {
+            str(first.inserted_id): "first",
+            str(second.inserted_id): "second",
+        }
+        assert await repo.find_by_ids([]) == {}
+
+    def test_oid_conversions_are_reused(self):
+        """Test repeated conversions of one ID share an ObjectId."""
+        assert _oid("5f43a1b2c3d4e5f6a7b8c9d0") is _oid("5f43a1b2c3d4e5f6a7b8c9d0")
+
+
+class TestCheckInStats:
+    """Test suite for aggregated check-in statistics."""
+
+    @pytest.mark.anyio
+    async def test_check_in_stats_single_aggregation(self, mock_mongo):
+        """Test check-in counts come from one faceted aggregation."""
+        for user_id, status in (("u1", "safe"), ("u2", "safe"), ("u3", "pending")):
+            await mock_mongo.emergency_check_ins.insert_one(
+                {"alert_id": "stats-alert", "user_id": user_id, "status": status}
+            )
+        await mock_mongo.emergency_check_ins.insert_one(
+            {"alert_id": "other-alert", "user_id": "u1", "status": "safe"}
+        )
+
+        stats = await EmergencyCheckInRepository(mock_mongo).get_check_in_stats("stats-alert")
+        assert stats == {
+            "total": 3,
+            "checked_in": 2,
+            "not_checked_in": 1,
+            "percentage": 66.67,
+        }
+
+    @pytest.mark.anyio
+    async def test_check_in_stats_empty_alert(self, mock_mongo):
+        """Test an alert without check-ins reports zero counts."""
+        stats = await EmergencyCheckInRepository(mock_mongo).get_check_in_stats("no-alert")
+        assert stats["total"] == 0
+        assert stats["percentage"] == 0
+
+    @pytest.mark.anyio
+    async def test_iter_check_ins_by_alert(self, mock_mongo):
+        """Test check-ins stream newest first with string ids."""
+        for minute in (1, 3, 2):
+            await mock_mongo.emergency_check_ins.insert_one({
+                "alert_id": "iter-alert",
+                "checked_in_at": datetime(2024, 1, 1, 8, minute),
+            })
+
+        repo = EmergencyCheckInRepository(mock_mongo)
+        check_ins = [doc async for doc in repo.iter_check_ins_by_alert("iter-alert")]
+        assert [doc["checked_in_at"].minute for doc in check_ins] == [3, 2, 1]
+        assert all(isinstance(doc["_id"], str) for doc in check_ins)
+
+    @pytest.mark.anyio
+    async def test_check_in_user_upserts(self, mock_mongo):
+        """Test repeated check-ins update one document for the user."""
+        repo = EmergencyCheckInRepository(mock_mongo)
+        first_id = await repo.check_in_user("upsert-alert", "u1", location="Gym")
+        second_id = await repo.check_in_user("upsert-alert", "u1", location="Library")
+
+        assert first_id == second_id
+        check_ins = await mock_mongo.emergency_check_ins.find(
+            {"alert_id": "upsert-alert"}
+        ).to_list(length=None)
+        assert len(check_ins) == 1
+        assert check_ins[0]["location"] == "Library"
+        assert check_ins[0]["status"] == "safe"
+
+
+class TestPassRepository:
+    """Test suite for PassRepository."""
+
+    def test_lookup_by_id_string(self):
+        """Test the join converts the ID string and tolerates bad IDs."""
+        stage = _lookup_by_id_string("users", "student_id", "student", {"first_name": 1})["$lookup"]
+        assert stage["from"] == "users"
+        assert stage["as"] == "student"
+        convert = stage["let"]["ref"]["$convert"]
+        assert convert["input"] == "$student_id"
+        assert convert["onError"] is None and convert["onNull"] is None
+        assert stage["pipeline"][1]["$project"] == {"first_name": 1, "_id": {"$toString": "$_id"}}
+
+    @pytest.mark.anyio
+    async def test_pass_enrichment_names(self, mock_mongo):
+        """Test joined documents become names, and missing joins add no name."""
+        stages = _pass_enrichment_stages(with_student=True)
+        assert [next(iter(stage)) for stage in stages] == ["$lookup"] * 3 + ["$set", "$set", "$unset"]
+        assert stages[-1]["$unset"] == ["origin", "destination", "student"]
+        assert [next(iter(stage)) for stage in _pass_enrichment_stages(with_student=False)] == (
+            ["$lookup"] * 2 + ["$set", "$set", "$unset"]
+        )
+
+        # mongomock cannot run the correlated $lookup, so feed it the
+        # arrays the joins would produce and run the $set stages
+        marker = "enrich-names"
+        await mock_mongo.passes.insert_many([
+            {"marker": marker, "n": 1, "origin": [{"name": "Gym"}], "destination": [],
+             "student": [{"first_name": "Ana", "last_name": "Lee", "email": "ana@example.com"}]},
+            {"marker": marker, "n": 2, "origin": [{}], "destination": [{"name": "Library"}], "student": []},
+        ])
+        docs = await mock_mongo.passes.aggregate(
+            [{"$match": {"marker": marker}}, {"$sort": {"n": 1}}, *stages[3:5]]
+        ).to_list(None)
+
+        assert isinstance(docs[0]["_id"], str)
+        assert docs[0]["origin_name"] == "Gym"
+        assert "destination_name" not in docs[0]
+        assert docs[0]["student_name"] == "Ana Lee"
+        assert docs[0]["student_email"] == "ana@example.com"
+        assert docs[1]["origin_name"] == "Unknown"
+        assert docs[1]["destination_name"] == "Library"
+        assert "student_name" not in docs[1] and "student_email" not in docs[1]
+
+    @pytest.mark.anyio
+    async def test_overdue_expression(self, mock_mongo):
+        """Test elapsed minutes against the time limit, defaulting to 5."""
+        now = datetime(2002, 6, 1, 12, 0)
+        marker = "overdue-expr"
+        await mock_mongo.passes.insert_many([
+            {"marker": marker, "n": 1, "departed_at": now - timedelta(minutes=3)},
+            {"marker": marker, "n": 2, "departed_at": now - timedelta(minutes=6)},
+            {"marker": marker, "n": 3, "departed_at": now - timedelta(minutes=8), "time_limit_minutes": 10},
+            {"marker": marker, "n": 4, "departed_at": now - timedelta(minutes=12), "time_limit_minutes": 10},
+        ])
+
+        docs = await mock_mongo.passes.aggregate([
+            {"$match": {"marker": marker, "$expr": {"$gt": [_elapsed_minutes(now), _TIME_LIMIT]}}},
+            {"$sort": {"n": 1}},
+        ]).to_list(None)
+        assert [doc["n"] for doc in docs] == [2, 4]
+
+    @pytest.mark.anyio
+    async def test_time_remaining_stages(self, mock_mongo):
+        """Test time remaining and overtime as of a fixed time."""
+        now = datetime(2002, 7, 1, 12, 0)
+        marker = "time-remaining"
+        await mock_mongo.passes.insert_many([
+            {"marker": marker, "n": 1, "departed_at": now - timedelta(minutes=3), "is_overtime": True},
+            {"marker": marker, "n": 2, "departed_at": now - timedelta(minutes=12), "time_limit_minutes": 10},
+            {"marker": marker, "n": 3, "is_overtime": False},
+        ])
+
+        # mongomock has no $unset stage; the last stage only drops elapsed_minutes
+        stages = _time_remaining_stages(now)
+        assert stages[-1] == {"$unset": "elapsed_minutes"}
+        docs = await mock_mongo.passes.aggregate(
+            [{"$match": {"marker": marker}}, {"$sort": {"n": 1}}, *stages[:-1]]
+        ).to_list(None)
+
+        assert docs[0]["time_remaining_minutes"] == 2
+        assert docs[0]["is_overtime"] is False
+        assert docs[1]["time_remaining_minutes"] == 0
+        assert docs[1]["is_overtime"] is True
+        assert "time_remaining_minutes" not in docs[2]
+        assert "elapsed_minutes" not in docs[2]
+        assert docs[2]["is_overtime"] is False
+
+    @pytest.mark.anyio
+    async def test_find_passes_by_student_enriched_propagates_errors(self, mock_mongo, monkeypatch):
+        """Test a failed history query raises instead of returning no passes."""
+        repo = PassRepository(mock_mongo)
+
+        def failing_aggregate(*args, **kwargs):
+            raise RuntimeError("aggregation failed")
+        monkeypatch.setattr(repo.collection, "aggregate", failing_aggregate)
+
+        with pytest.raises(RuntimeError):
+            await repo.find_passes_by_student_enriched("history-student")
+
+    @pytest.mark.anyio
+    async def test_students_with_active_or_pending(self, mock_mongo):
+        """Test one query reports which students have open passes."""
+        for student_id, status in (("bulk-s1", "active"), ("bulk-s2", "completed"), ("bulk-s3", "pending")):
+            await mock_mongo.passes.insert_one({"student_id": student_id, "status": status})
+
+        repo = PassRepository(mock_mongo)
+        result = await repo.students_with_active_or_pending(["bulk-s1", "bulk-s2", "bulk-s3", "bulk-s4"])
+        assert result == {"bulk-s1", "bulk-s3"}
+        assert await repo.students_with_active_or_pending([]) == set()
+
+    @pytest.mark.anyio
+    async def test_end_pass_only_from_active(self, mock_mongo):
+        """Test ending a pass is refused for other students or ended passes."""
+        result = await mock_mongo.passes.insert_one({"student_id": "end-s1", "status": "active"})
+        pass_id = str(result.inserted_id)
+        repo = PassRepository(mock_mongo)
+
+        assert await repo.end_pass(pass_id, "someone-else") is None
+
+        ended = await repo.end_pass(pass_id, "end-s1")
+        assert ended["_id"] == pass_id
+        assert ended["status"] == "completed"
+
+        assert await repo.end_pass(pass_id, "end-s1") is None
+        assert await repo.end_pass("not-an-id", "end-s1") is None
+
+    @pytest.mark.anyio
+    async def test_get_request_preconditions(self, mock_mongo):
+        """Test the daily count and destination occupancy come from one aggregation."""
+        now = datetime.utcnow()
+        for student_id, destination, status in (
+            ("facet-s1", "facet-dest", "completed"),
+            ("facet-s1", "facet-other", "completed"),
+            ("facet-s2", "facet-dest", "active"),
+            ("facet-s3", "facet-dest", "active"),
+        ):
+            await mock_mongo.passes.insert_one({
+                "student_id": student_id,
+                "destination_location_id": destination,
+                "status": status,
+                "requested_at": now
+            })
+        repo = PassRepository(mock_mongo)
+
+        checks = await repo.get_request_preconditions("facet-s1", "facet-dest", 3)
+        assert checks == {"daily_count": 2, "at_capacity": False}
+
+        checks = await repo.get_request_preconditions("facet-s1", "facet-dest", 2)
+        assert checks["at_capacity"] is True
+
+        assert (await repo.get_request_preconditions("facet-s4", "facet-dest", None)) == {
+            "daily_count": 0,
+            "at_capacity": False
+        }
+        assert (await repo.get_request_preconditions("facet-s4", "facet-dest", 0))["at_capacity"] is True
+
+    @pytest.mark.anyio
+    async def test_mark_overdue_passes_overtime(self, mock_mongo):
+        """Test one update marks exactly the active passes past their limit."""
+        # Other tests leave active passes departed at the real clock; as of
+        # this earlier time they have negative elapsed time, so only the
+        # passes below can be overdue
+        now = datetime(2001, 1, 1, 12, 0)
+        passes = {
+            "late": {"departed_at": now - timedelta(minutes=10), "time_limit_minutes": 5},
+            "on-time": {"departed_at": now - timedelta(minutes=2), "time_limit_minutes": 5},
+            "late-default-limit": {"departed_at": now - timedelta(minutes=7)},
+            "not-departed": {"departed_at": None, "time_limit_minutes": 5},
+        }
+        ids = {}
+        for name, fields in passes.items():
+            result = await mock_mongo.passes.insert_one(
+                {"student_id": f"overtime-{name}", "status": "active", **fields}
+            )
+            ids[name] = result.inserted_id
+
+        repo = PassRepository(mock_mongo)
+        assert await repo.mark_overdue_passes_overtime(now) == 2
+
+        docs = {name: await mock_mongo.passes.find_one({"_id": id}) for name, id in ids.items()}
+        assert docs["late"]["is_overtime"] is True
+        assert docs["late-default-limit"]["is_overtime"] is True
+        assert "is_overtime" not in docs["on-time"]
+        assert "is_overtime" not in docs["not-departed"]
+
+        # Already-marked passes are not counted again
+        assert await repo.mark_overdue_passes_overtime(now) == 0
+
+
+class TestLocationRepository:
+    """Test suite for LocationRepository."""
+
+    @pytest.mark.anyio
+    async def test_max_capacity_is_cached_until_invalidated(self, mock_mongo):
+        """Test capacity is read once and refreshed after invalidation."""
+        CacheManager.clear()
+        result = await mock_mongo.locations.insert_one({"name": "Library", "max_capacity": 2})
+        location_id = str(result.inserted_id)
+        repo = LocationRepository(mock_mongo)
+
+        assert await repo.get_max_capacity(location_id) == 2
+
+        mock_mongo.locations.collection.update_one(
+            {"_id": result.inserted_id}, {"$set": {"max_capacity": None}}
+        )
+        assert await repo.get_max_capacity(location_id) == 2
+
+        invalidate_location_cache(location_id)
+        assert await repo.get_max_capacity(location_id) is None
+
+    @pytest.mark.anyio
+    async def test_location_doc_is_cached_until_invalidated(self, mock_mongo):
+        """Test a location is read once and re-read after invalidation."""
+        CacheManager.clear()
+        result = await mock_mongo.locations.insert_one({"name": "Gym", "is_active": True})
+        location_id = str(result.inserted_id)
+        repo = LocationRepository(mock_mongo)
+
+        location = await repo.find_by_id_cached(location_id)
+        assert location["_id"] == location_id
+        location["name"] = "Changed by caller"
+
+        mock_mongo.locations.collection.update_one(
+            {"_id": result.inserted_id}, {"$set": {"is_active": False}}
+        )
+        assert (await repo.find_by_id_cached(location_id)) == {
+            "_id": location_id, "name": "Gym", "is_active": True
+        }
+
+        invalidate_location_cache(location_id)
+        assert (await repo.find_by_id_cached(location_id))["is_active"] is False
+        assert await repo.find_by_id_cached("not-an-id") is None
+
+
+class TestNotificationRepository:
+    """Test suite for NotificationRepository."""
+
+    @pytest.mark.anyio
+    async def test_bulk_mark_status(self, mock_mongo):
+        """Test sent and failed outcomes are written in one batch."""
+        sent = await mock_mongo.notifications.insert_one({"status": "pending"})
+        failed = await mock_mongo.notifications.insert_one({"status": "pending"})
+
+        repo = NotificationRepository(mock_mongo)
+        modified = await repo.bulk_mark_status({
+            str(sent.inserted_id): None,
+            str(failed.inserted_id): "device unreachable",
+        })
+        assert modified == 2
+
+        sent_doc = await mock_mongo.notifications.find_one({"_id": sent.inserted_id})
+        failed_doc = await mock_mongo.notifications.find_one({"_id": failed.inserted_id})
+        assert sent_doc["status"] == "sent" and "sent_at" in sent_doc
+        assert failed_doc["status"] == "failed"
+        assert failed_doc["error_message"] == "device unreachable"
+        assert await repo.bulk_mark_status({}) == 0
+
+
+    @pytest.mark.anyio
+    async def test_claim_next_pending_hands_out_each_once(self, mock_mongo):
+        """Test due notifications are claimed oldest first, once until the claim goes stale."""
+        now = datetime.utcnow()
+        await mock_mongo.notifications.insert_one({"status": "pending", "scheduled_at": now - timedelta(minutes=1)})
+        await mock_mongo.notifications.insert_one({"status": "pending", "scheduled_at": now - timedelta(minutes=5)})
+        await mock_mongo.notifications.insert_one({"status": "pending", "scheduled_at": now + timedelta(hours=1)})
+
+        repo = NotificationRepository(mock_mongo)
+        first = await repo.claim_next_pending("worker-a")
+        second = await repo.claim_next_pending("worker-b")
+        assert first["scheduled_at"] < second["scheduled_at"]
+        assert first["claimed_by"] == "worker-a"
+        assert second["status"] == "processing"
+        assert await repo.claim_next_pending("worker-a") is None
+
+        await mock_mongo.notifications.update_one(
+            {"claimed_by": "worker-a"},
+            {"$set": {"claimed_at": now - timedelta(minutes=10)}}
+        )
+        reclaimed = await repo.claim_next_pending("worker-c", stale_after_minutes=5)
+        assert reclaimed["_id"] == first["_id"]
+        assert reclaimed["claimed_by"] == "worker-c"
+        assert await repo.claim_next_pending("worker-c", stale_after_minutes=5) is None
+
+
+class TestNotificationReceiptRepository:
+    """Test suite for NotificationReceiptRepository."""
+
+    @pytest.mark.anyio
+    async def test_unread_bundle(self, mock_mongo):
+        """Test unread receipts and their count come back together."""
+        for hour, read_at in ((1, None), (2, None), (3, datetime(2024, 1, 1))):
+            await mock_mongo.notification_receipts.insert_one({
+                "user_id": "bundle-user",
+                "delivered_at": datetime(2024, 1, 1, hour),
+                "read_at": read_at,
+            })
+
+        bundle = await NotificationReceiptRepository(mock_mongo).get_unread_bundle("bundle-user", limit=1)
+        assert bundle["count"] == 2
+        assert len(bundle["items"]) == 1
+        assert bundle["items"][0]["delivered_at"] == datetime(2024, 1, 1, 2)
+        assert isinstance(bundle["items"][0]["_id"], str)
+
+
+class TestVisitorRepository:
+    """Test suite for VisitorRepository."""
+
+    @pytest.mark.anyio
+    async def test_watchlist_flag_cached_and_evicted(self, mock_mongo):
+        """Test the watchlist flag is cached and refreshed on watchlist changes."""
+        CacheManager.clear()
+        result = await mock_mongo.visitors.insert_one({"first_name": "Wanda", "is_on_watchlist": False})
+        visitor_id = str(result.inserted_id)
+        repo = VisitorRepository(mock_mongo)
+
+        assert await repo.is_on_watchlist(visitor_id) is False
+        mock_mongo.visitors.collection.update_one(
+            {"_id": result.inserted_id}, {"$set": {"is_on_watchlist": True}}
+        )
+        assert await repo.is_on_watchlist(visitor_id) is False
+
+        await repo.add_to_watchlist(visitor_id, "Trespass")
+        assert await repo.is_on_watchlist(visitor_id) is True
+
+    @pytest.mark.anyio
+    async def test_watchlist_summary(self, mock_mongo):
+        """Test watchlist counts by reason and the newest entries come back together."""
+        added = datetime(2030, 1, 1)
+        for i, reason in enumerate(["Loitering", "Loitering", "Custody order"]):
+            await mock_mongo.visitors.insert_one({
+                "first_name": f"Summary{i}",
+                "is_on_watchlist": True,
+                "watchlist_reason": reason,
+                "watchlist_added_at": added + timedelta(days=i),
+                "id_number": "secret"
+            })
+        await mock_mongo.visitors.insert_one({"first_name": "Cleared", "is_on_watchlist": False})
+
+        summary = await VisitorRepository(mock_mongo).watchlist_summary(recent_limit=2)
+        assert summary["by_reason"]["Loitering"] == 2
+        assert summary["by_reason"]["Custody order"] == 1
+        assert [v["first_name"] for v in summary["recent"]] == ["Summary2", "Summary1"]
+        assert "id_number" not in summary["recent"][0]
+        assert isinstance(summary["recent"][0]["_id"], str)
+
+
+class TestVisitorLogRepository:
+    """Test suite for VisitorLogRepository."""
+
+    @pytest.mark.anyio
+    async def test_check_in_if_absent(self, mock_mongo):
+        """Test a visitor with an open visit cannot be checked in again."""
+        repo = VisitorLogRepository(mock_mongo)
+
+        visit = await repo.check_in_if_absent("absent-v1", "host-1", "Meeting")
+        assert visit["visitor_id"] == "absent-v1"
+        assert visit["checked_out_at"] is None
+        assert isinstance(visit["_id"], str)
+
+        assert await repo.check_in_if_absent("absent-v1", "host-2", "Again") is None
+
+        await repo.check_out_visitor(visit["_id"])
+        again = await repo.check_in_if_absent("absent-v1", "host-2", "Again")
+        assert again["_id"] != visit["_id"]
+
+    @pytest.mark.anyio
+    async def test_count_active_visitors(self, mock_mongo):
+        """Test open visits count whether checked_out_at is null or missing."""
+        repo = VisitorLogRepository(mock_mongo)
+        before = await repo.count_active_visitors()
+
+        await mock_mongo.visitor_logs.insert_many([
+            {"visitor_id": "count-v1", "checked_out_at": None},
+            {"visitor_id": "count-v2"},
+            {"visitor_id": "count-v3", "checked_out_at": datetime(2030, 1, 1)},
+        ])
+
+        assert await repo.count_active_visitors() == before + 2
+
+
+class TestVisitorPreRegistrationRepository:
+    """Test suite for VisitorPreRegistrationRepository."""
+
+    @pytest.mark.anyio
+    async def test_bulk_create(self, mock_mongo):
+        """Test a group is inserted at once with IDs in input order."""
+        repo = VisitorPreRegistrationRepository(mock_mongo)
+        group = [{"first_name": f"Delegate{i}", "status": "pending"} for i in range(3)]
+
+        ids = await repo.bulk_create(group)
+        assert len(ids) == 3
+        for i, pre_reg_id in enumerate(ids):
+            doc = await repo.find_by_id(pre_reg_id)
+            assert doc["first_name"] == f"Delegate{i}"
+            assert doc["created_at"] is not None
+
+        assert await repo.bulk_create([]) == []
+
+    @pytest.mark.anyio
+    async def test_find_by_date_falls_back_without_hint(self, mock_mongo, monkeypatch):
+        """Test a rejected index hint is retried without the hint."""
+        repo = VisitorPreRegistrationRepository(mock_mongo)
+        await repo.bulk_create([
+            {"first_name": "Hinted", "status": "pending", "expected_date": datetime(2031, 3, 3, 9, 0)},
+        ])
+
+        def reject_hint(cursor, hint):
+            raise OperationFailure("hint provided does not correspond to an existing index")
+        monkeypatch.setattr(type(mock_mongo.visitor_pre_registrations.find({})), "hint", reject_hint)
+
+        found = await repo.find_by_date(datetime(2031, 3, 3))
+        assert [doc["first_name"] for doc in found] == ["Hinted"]
@@ -0,0 +1,167 @@
+"""
+WebSocket Tests
+Tests for socket authentication and connection bookkeeping.
+"""
+
+import time
+import pytest
+import socketio
+from bson import ObjectId
+from jose import jwt
+from app.core import websocket
+from app.core.config import settings
+from app.core.websocket import verify_socket_token
+
+
+def make_token(exp_offset: int = 60) -> str:
+    """Create a signed socket token expiring exp_offset seconds from now."""
+    return jwt.encode(
+        {"sub": "user1", "role": "STUDENT", "exp": int(time.time()) + exp_offset},
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    """Start every test with an empty verification cache."""
+    websocket._verified_tokens.clear()
+    yield
+    websocket._verified_tokens.clear()
+
+
+class TestVerifySocketToken:
+    """Test suite for socket token verification."""
+
+    def test_valid_token_is_cached(self, monkeypatch):
+        """Test a verified token is served from cache on the next call."""
+        token = make_token()
+        assert verify_socket_token(token)["sub"] == "user1"
+
+        def fail_decode(*args, **kwargs):
+            raise AssertionError("token decoded twice")
+
+        monkeypatch.setattr(websocket.jwt, "decode", fail_decode)
+        assert verify_socket_token(token)["sub"] == "user1"
+
+    def test_cache_is_not_keyed_by_raw_token(self):
+        """Test raw tokens are not stored in the cache."""
+        token = make_token()
+        verify_socket_token(token)
+        assert token not in websocket._verified_tokens
+        assert len(websocket._verified_tokens) == 1
+
+    def test_cached_token_expiry_is_rechecked(self):
+        """Test an expired cached payload is rejected."""
+        token = make_token()
+        key = websocket._token_cache_key(token)
+        websocket._verified_tokens[key] = {"sub": "user1", "exp": time.time() - 1}
+        assert verify_socket_token(token) is None
+        assert key not in websocket._verified_tokens
+
+    def test_invalid_token(self):
+        """Test an invalid token is rejected and not cached."""
+        assert verify_socket_token("not-a-token") is None
+        assert len(websocket._verified_tokens) == 0
+
+
+class TestConnectionManager:
+    """Test suite for connection bookkeeping."""
+
+    @pytest.mark.anyio
+    async def test_rooms_come_from_socketio(self, monkeypatch):
+        """Test room membership is read from Socket.IO's room index."""
+        manager = websocket.ConnectionManager()
+        await manager.connect("sid1", "user1")
+        monkeypatch.setattr(websocket.sio.manager, "rooms", {
+            "/": {
+                None: {"sid1": "eio1"},
+                "sid1": {"sid1": "eio1"},
+                "hall_monitor": {"sid1": "eio1"},
+            }
+        })
+        assert manager.get_rooms() == {"hall_monitor": {"sid1"}}
+
+        await manager.disconnect("sid1")
+        assert not manager.is_user_online("user1")
+
+    @pytest.mark.anyio
+    async def test_multiple_sessions_per_user(self):
+        """Test a user stays online until their last session disconnects."""
+        manager = websocket.ConnectionManager()
+        await manager.connect("sid1", "user1")
+        await manager.connect("sid2", "user1")
+        assert manager.get_user_sessions("user1") == {"sid1", "sid2"}
+
+        assert await manager.disconnect("sid1") == "user1"
+        assert manager.get_user_sessions("user1") == {"sid2"}
+        assert manager.is_user_online("user1")
+
+        await manager.disconnect("sid2")
+        assert manager.get_online_user_count() == 0
+
+    @pytest.mark.anyio
+    async def test_join_rooms(self, monkeypatch):
+        """Test a session joins every requested room."""
+        joined = []
+
+        async def enter_room(sid, room, namespace=None):
+            joined.append((sid, room))
+
+        monkeypatch.setattr(websocket.sio, "enter_room", enter_room)
+        await websocket.ConnectionManager().join_rooms("sid1", ["role:STAFF", "hall_monitor"])
+        assert joined == [("sid1", "role:STAFF"), ("sid1", "hall_monitor")]
+
+
+class TestTimestamps:
+    """Test suite for shared event timestamps."""
+
+    def test_timestamp_reused_within_tick(self, monkeypatch):
+        """Test events in the same tick share one formatted timestamp."""
+        now = [1_700_000_000.0]
+        monkeypatch.setattr(websocket.time, "time", lambda: now[0])
+        monkeypatch.setattr(websocket, "_timestamp_cache", {"t": 0.0, "s": ""})
+
+        first = websocket._now_iso()
+        now[0] += 0.005
+        assert websocket._now_iso() == first
+
+        now[0] += 1
+        assert websocket._now_iso() != first
+
+
+class TestEmitters:
+    """Test suite for real-time event emitters."""
+
+    @pytest.mark.anyio
+    async def test_pass_overtime_emits_once_to_all_rooms(self, monkeypatch):
+        """Test a multi-room event is emitted in a single call."""
+        calls = []
+
+        async def emit(event, data, room=None, **kwargs):
+            calls.append((event, room))
+
+        monkeypatch.setattr(websocket.sio, "emit", emit)
+        await websocket.emit_pass_overtime({"_id": "p1", "student_id": "s1"}, 3)
+        assert calls == [("pass_overtime", ["hall_monitor", "user:s1", "role:ADMIN"])]
+
+
+class TestSerializer:
+    """Test suite for the Socket.IO packet serializer."""
+
+    def test_round_trip(self):
+        """Test packets encode compactly and decode back."""
+        data = {"type": "pass_created", "pass": {"_id": "p1"}, "n": [1, 2]}
+        encoded = websocket._OrjsonSerializer.dumps(data, separators=(",", ":"))
+        assert encoded == '{"type":"pass_created","pass":{"_id":"p1"},"n":[1,2]}'
+        assert websocket._OrjsonSerializer.loads(encoded) == data
+
+    def test_unknown_types_fall_back_to_str(self):
+        """Test values stdlib json rejects are encoded as strings."""
+        oid = ObjectId()
+        assert websocket._OrjsonSerializer.dumps({"id": oid}) == f'{{"id":"{oid}"}}'
+
+    def test_non_str_keys_are_stringified(self):
+        """Test an emitted payload with int keys encodes as stdlib json did."""
+        packet = socketio.packet.Packet(socketio.packet.EVENT, data=["stats", {1: "a", "b": {2: 3}}])
+        assert packet.encode() == '2["stats",{"1":"a","b":{"2":3}}]'
@@ -1,12 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from passlib.context import CryptContext
+import asyncio
+import os
 from jose import JWTError, jwt
 from app.core.config import settings
 
 # Password hashing context
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
+# bcrypt takes tens of milliseconds per call and releases the GIL, so
+# hashing runs here instead of blocking the event loop; bounded to the
+# core count so a login burst cannot spawn unbounded threads
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix='password-hash')
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -35,6 +43,35 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password on the hashing thread pool.
+
+    Args:
+        plain_password: The plain text password to verify
+        hashed_password: The hashed password to compare against
+
+    Returns:
+        True if the password matches, False otherwise
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_HASH_POOL, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hash a password on the hashing thread pool.
+
+    Args:
+        password: The plain text password to hash
+
+    Returns:
+        The hashed password
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_HASH_POOL, get_password_hash, password)
+
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token.
@@ -46,14 +83,12 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     Returns:
         The encoded JWT token
     """
-    to_encode = data.copy()
-
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    # One clock read, so exp - iat is exactly the requested lifetime
+    issued_at = datetime.utcnow()
+    if not expires_delta:
+        expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({'exp': expire, 'iat': datetime.utcnow()})
+    to_encode = {**data, 'exp': issued_at + expires_delta, 'iat': issued_at}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -3,7 +3,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from utils.auth import decode_access_token
 from app.core.database import get_database
-from bson import ObjectId
+from app.core.performance import get_user_cached
 
 security = HTTPBearer()
 
@@ -27,8 +27,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={'WWW-Authenticate': 'Bearer'},
         )
     
-    # Fetch user from database
-    user = await db.users.find_one({'_id': ObjectId(user_id)})
+    # Fetch user, briefly cached since every authenticated request needs it
+    user = await get_user_cached(db, user_id)
     
     if user is None:
         raise HTTPException(
@@ -36,9 +36,6 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail='User not found',
         )
     
-    # Convert ObjectId to string for JSON serialization
-    user['_id'] = str(user['_id'])
-    
     return user
 
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):